@@ -5,7 +5,14 @@ from datetime import datetime as dt_now # Alias for convenience if needed, or ju
 import logging
 import traceback # For detailed error logging
 import re # For stripping markdown and sanitizing filenames
-from flask import Flask, request, url_for, send_from_directory, g, jsonify
+import functools
+import unicodedata
+from urllib.parse import quote
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from flask import Flask, request, url_for, send_file, g, jsonify
+from werkzeug.wsgi import ClosingIterator
 import mysql.connector
 from mysql.connector import errorcode
 from docx import Document
@@ -24,14 +31,29 @@ try:
         from db_config import EXTERNAL_HOSTNAME
     except ImportError:
         EXTERNAL_HOSTNAME = None
+    try:
+        from db_config import DOWNLOAD_CACHE_DIR, DOWNLOAD_CACHE_MAX_BYTES, DOWNLOAD_CACHE_FRESH_SECONDS
+    except ImportError:
+        DOWNLOAD_CACHE_DIR = os.path.join(UPLOAD_FOLDER, 'download_cache')
+        DOWNLOAD_CACHE_MAX_BYTES = 2 * 1024 * 1024 * 1024
+        DOWNLOAD_CACHE_FRESH_SECONDS = 0
+    try:
+        from db_config import COM_WORKER_PROCESSES, ENDPOINT_CONCURRENCY_LIMITS, ENDPOINT_QUEUE_TIMEOUT
+    except ImportError:
+        COM_WORKER_PROCESSES, ENDPOINT_CONCURRENCY_LIMITS, ENDPOINT_QUEUE_TIMEOUT = 2, {}, 30
+    try:
+        from db_config import USE_X_SENDFILE, ADVICE_X_ACCEL_PREFIX, ADVICE_PATH_CACHE_TTL
+    except ImportError:
+        USE_X_SENDFILE, ADVICE_X_ACCEL_PREFIX, ADVICE_PATH_CACHE_TTL = False, None, 300
 except ImportError:
     print("Error: Critical configurations missing from db_config.py. Please ensure it's in the same directory.")
     exit(1)
 
 # Import functions from other project files
-from extractWordElement_web import run_extraction # Added for Word parsing
-# 解析word文件的教材信息
-from word_parser_for_material import parse_word_to_db
+# Word COM 重任务 (审校文档解析 / 教材信息解析)，生产模式下在独立进程中执行
+from com_tasks import extract_word_elements_task, flattern_material_task
+# 源 Word 文件的下载缓存 (连接池 + 条件请求 + LRU 淘汰)
+from word_file_cache import WordFileCache
 
 import requests # Added for downloading files
 
@@ -71,11 +93,126 @@ app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['GENERATED_DOCS_DIR'] = GENERATED_DOCS_DIR
 app.config['WORD_FILE_BASE_URL'] = WORD_FILE_BASE_URL
 app.config['IMAGE_OUTPUT_DIR_FLASK'] = IMAGE_OUTPUT_DIR_FLASK
+app.config['USE_X_SENDFILE'] = USE_X_SENDFILE # 由前置服务器 (Apache mod_xsendfile / lighttpd) 直接发送文件
 
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 os.makedirs(app.config['GENERATED_DOCS_DIR'], exist_ok=True)
 os.makedirs(app.config['IMAGE_OUTPUT_DIR_FLASK'], exist_ok=True)
 
+word_file_cache = WordFileCache(DOWNLOAD_CACHE_DIR, DOWNLOAD_CACHE_MAX_BYTES, fresh_seconds=DOWNLOAD_CACHE_FRESH_SECONDS)
+
+# --- 重任务执行器与接口并发限制 ---
+# 开发模式 (python app.py) 下重任务直接在请求线程中执行；
+# serve.py 调用 configure_heavy_task_executor() 后改为提交到有界进程池，避免 COM 解析阻塞其他请求。
+heavy_task_executor = None
+
+def configure_heavy_task_executor(max_workers=COM_WORKER_PROCESSES):
+    global heavy_task_executor
+    if heavy_task_executor is None:
+        heavy_task_executor = ProcessPoolExecutor(max_workers=max_workers)
+        logger.info(f"Heavy task executor started with {max_workers} worker processes.")
+    return heavy_task_executor
+
+def shutdown_heavy_task_executor(wait=True, timeout=None):
+    """
+    停止重任务进程池，尚未开始的任务直接取消。
+    wait 时最多等待 timeout 秒 (None 为不限)，超时仍未结束的工作进程 (如卡住的 Word COM 调用) 被强制结束。
+    """
+    global heavy_task_executor
+    executor, heavy_task_executor = heavy_task_executor, None
+    if executor is None:
+        return
+    processes = list((getattr(executor, "_processes", None) or {}).values())
+    executor.shutdown(wait=False, cancel_futures=True)
+    if wait:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for process in processes:
+            process.join(None if deadline is None else max(0, deadline - time.monotonic()))
+        hung = [process for process in processes if process.is_alive()]
+        if hung:
+            logger.warning(f"Heavy task workers still running after {timeout}s, terminating {len(hung)} process(es).")
+            for process in hung:
+                process.terminate()
+    logger.info("Heavy task executor shut down.")
+
+def run_heavy_task(func, *args):
+    """执行 COM/CPU 重任务，配置了进程池时在池中执行并等待结果，异常原样抛出。"""
+    if heavy_task_executor is None:
+        return func(*args)
+    return heavy_task_executor.submit(func, *args).result()
+
+_endpoint_semaphores = {name: threading.BoundedSemaphore(limit) for name, limit in ENDPOINT_CONCURRENCY_LIMITS.items() if limit}
+
+def concurrency_limited(view_func):
+    """
+    按 ENDPOINT_CONCURRENCY_LIMITS 限制接口的同时处理数，排队超时返回 503。
+    名额在响应关闭 (send_file 等流式响应体发送完毕) 时才释放，因此同时限制了进行中的文件传输数。
+    """
+    semaphore = _endpoint_semaphores.get(view_func.__name__)
+    if semaphore is None:
+        return view_func
+
+    @functools.wraps(view_func)
+    def wrapper(*args, **kwargs):
+        if not semaphore.acquire(timeout=ENDPOINT_QUEUE_TIMEOUT):
+            logger.warning(f"API {request.path}: concurrency limit reached, rejecting request.")
+            return jsonify({"code": 503, "message": "服务器繁忙，请稍后重试"}), 503
+        try:
+            response = app.make_response(view_func(*args, **kwargs))
+        except BaseException:
+            semaphore.release()
+            raise
+        _call_on_response_close(response, semaphore.release)
+        return response
+    return wrapper
+
+def _call_on_response_close(response, callback):
+    """
+    响应关闭时调用一次 callback。send_file 的文件流 (direct_passthrough) 直接交给服务器，
+    不经过 Response.close()，因此同时挂到文件流的 close() 上。
+    """
+    done = []
+    def callback_once():
+        if not done:
+            done.append(True)
+            callback()
+    response.call_on_close(callback_once)
+    if response.direct_passthrough:
+        body = response.response
+        original_close = getattr(body, "close", None)
+        def close():
+            try:
+                if original_close:
+                    original_close()
+            finally:
+                callback_once()
+        try:
+            body.close = close
+        except AttributeError:
+            response.response = ClosingIterator(body, close)
+
+# --- 审校清单下载路径缓存 ---
+# file_id -> (清单文件完整路径, 缓存时间)。重复下载时不再查询数据库；
+# 重新解析或重新生成清单时失效，同时设置 ADVICE_PATH_CACHE_TTL 以兼容多实例部署。
+_advice_path_cache = {}
+_advice_path_cache_lock = threading.Lock()
+
+def get_cached_advice_path(file_id):
+    with _advice_path_cache_lock:
+        entry = _advice_path_cache.get(file_id)
+        if entry and (not ADVICE_PATH_CACHE_TTL or dt_now.now().timestamp() - entry[1] < ADVICE_PATH_CACHE_TTL):
+            return entry[0]
+        _advice_path_cache.pop(file_id, None)
+        return None
+
+def cache_advice_path(file_id, full_disk_filepath):
+    with _advice_path_cache_lock:
+        _advice_path_cache[file_id] = (full_disk_filepath, dt_now.now().timestamp())
+
+def invalidate_advice_path(file_id):
+    with _advice_path_cache_lock:
+        _advice_path_cache.pop(file_id, None)
+
 def get_db_connection():
     try:
         config_to_use = app.config['DB_CONFIG'].copy()
@@ -512,6 +649,7 @@ def _generate_advice_document_core(file_id_str, config, db_conn_optional=None):
 
 # 解析审校需要的word文档
 @app.route('/extract_word_element', methods=['POST'])
+@concurrency_limited
 def extract_word_element_api():
     content_type = request.headers.get('Content-Type')
     if not content_type or 'application/json' not in content_type.lower():
@@ -558,6 +696,7 @@ def extract_word_element_api():
         
         logger.info(f"API /extract_word_element: Cleaning up previous data for file_id: {file_id}")
         cursor.execute("UPDATE file_records SET proof_list_filepath = NULL, error_message = NULL WHERE id = %s", (file_id,))
+        invalidate_advice_path(file_id)
         cursor.execute("DELETE FROM document_contents WHERE file_record_id = %s", (file_id,))
         cursor.execute("DELETE FROM document_content_chunks WHERE file_record_id = %s", (file_id,))
         conn.commit()
@@ -579,32 +718,23 @@ def extract_word_element_api():
         
         sanitized_base_name = "".join(c if c.isalnum() or c in ('_', '-') else '_' for c in base_name_orig)
         safe_local_filename_with_ext = f"{sanitized_base_name}{current_ext_to_use}"
-        
-        original_doc_local_path = os.path.join(app.config['UPLOAD_FOLDER'], f"api_dl_{file_id}_{safe_local_filename_with_ext}")
 
         update_file_status_in_db(file_id, "processing: downloading", f"API: 开始下载原始Word文档: {safe_local_filename_with_ext}")
-        logger.info(f"API /extract_word_element: Downloading {remote_file_url} to {original_doc_local_path}")
+        logger.info(f"API /extract_word_element: Fetching {remote_file_url} via download cache")
         
         try:
-            response = requests.get(remote_file_url, stream=True, timeout=180)
-            response.raise_for_status()
-            with open(original_doc_local_path, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=32768):
-                    f.write(chunk)
-            logger.info(f"API /extract_word_element: File downloaded successfully: {original_doc_local_path}")
+            original_doc_local_path = word_file_cache.acquire(remote_file_url, suffix=current_ext_to_use)
+            logger.info(f"API /extract_word_element: File ready in cache: {original_doc_local_path}")
         except requests.exceptions.RequestException as e_req:
             error_msg = f"下载原始Word文件失败: {e_req}"
             logger.error(f"API /extract_word_element: Download failed for {remote_file_url}: {e_req}", exc_info=True)
             update_file_status_in_db(file_id, "error: download failed", f"API DownloadErr: {type(e_req).__name__} - {str(e_req)[:100]}")
-            if original_doc_local_path and os.path.exists(original_doc_local_path):
-                try: os.remove(original_doc_local_path)
-                except OSError: pass 
             return jsonify({"code": 500, "message": error_msg}), 500
 
         update_file_status_in_db(file_id, "processing: extracting content", "API: 开始解析Word文档内容")
         logger.info(f"API /extract_word_element: Calling run_extraction for {original_doc_local_path}, file_id: {file_id}")
         try:
-            run_extraction(original_doc_local_path, file_id, app.config['IMAGE_OUTPUT_DIR_FLASK'])
+            run_heavy_task(extract_word_elements_task, original_doc_local_path, file_id, app.config['IMAGE_OUTPUT_DIR_FLASK'])
             
             update_file_status_in_db(file_id, "completed: content extracted", "API: Word文档内容解析与数据库存储完成。")
             logger.info(f"API /extract_word_element: Content extraction successful for file_id: {file_id}")
@@ -642,15 +772,12 @@ def extract_word_element_api():
             cursor.close()
         if conn:
             conn.close()
-        if original_doc_local_path and os.path.exists(original_doc_local_path):
-            try:
-                os.remove(original_doc_local_path)
-                logger.info(f"API /extract_word_element: Cleaned up temporary file: {original_doc_local_path}")
-            except OSError as e_remove:
-                logger.warning(f"API /extract_word_element: Failed to clean up temporary file {original_doc_local_path}: {e_remove}")
+        if original_doc_local_path:
+            word_file_cache.release(original_doc_local_path)
 
 # 解析word格式的教材信息
 @app.route('/flattern_word_element', methods=['POST'])
+@concurrency_limited
 def flattern_word_element_api():
     # 1. --- Validate Request ---
     content_type = request.headers.get('Content-Type')
@@ -692,42 +819,24 @@ def flattern_word_element_api():
         return jsonify({"code": 400, "message": f"解析JSON数据时出错: {e}"}), 400
 
     # 2. --- Download File ---
-    conn, cursor = None, None
     local_doc_path = None
     try:
-        # Sanitize filename from URL
-        filename_from_url = os.path.basename(file_path_url)
-        safe_filename = re.sub(r'[^\w\.\-]', '_', filename_from_url)
-        local_doc_path = os.path.join(app.config['UPLOAD_FOLDER'], f"flattern_{doc_id}_{safe_filename}")
-
-        logger.info(f"API /flattern_word_element: Downloading from {file_path_url} to {local_doc_path}")
-        response = requests.get(file_path_url, stream=True, timeout=180)
-        response.raise_for_status()
-        with open(local_doc_path, 'wb') as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                f.write(chunk)
-        logger.info(f"API /flattern_word_element: File downloaded successfully.")
-
-        # 3. --- Process and Insert into DB ---
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        # Keep the extension from the URL so Word recognises the cached file
+        _, ext_from_url = os.path.splitext(os.path.basename(file_path_url))
+        safe_ext = re.sub(r'[^\w\.]', '', ext_from_url) or ".docx"
 
-        # Clear old data for this material_id to ensure idempotency
-        logger.info(f"Clearing previous entries for material_id: {material_id}")
-        cursor.execute("DELETE FROM material_contents WHERE material_id = %s", (material_id,))
-        logger.info(f"Deleted {cursor.rowcount} old rows for material_id: {material_id}")
+        logger.info(f"API /flattern_word_element: Fetching {file_path_url} via download cache")
+        local_doc_path = word_file_cache.acquire(file_path_url, suffix=safe_ext)
+        logger.info(f"API /flattern_word_element: File ready in cache: {local_doc_path}")
 
-        # Call the core parsing logic
-        logger.info(f"Starting Word parsing for material_id: {material_id}")
-        result = parse_word_to_db(local_doc_path, material_id, parse_level, cursor)
+        # 3. --- Process and Insert into DB (old rows are replaced in one transaction) ---
+        result = run_heavy_task(flattern_material_task, local_doc_path, material_id, parse_level)
 
         if result["success"]:
-            conn.commit()
             logger.info(f"API /flattern_word_element: Successfully processed and committed for material_id: {material_id}")
             return jsonify({"code": 200, "message": result["message"]}), 200
         else:
             # This case might happen if parsing runs but finds nothing; it's still a success.
-            conn.commit() # Commit the deletion of old data
             return jsonify({"code": 200, "message": result.get("message", "处理完成，但未生成任何内容。")}), 200
 
     except requests.exceptions.RequestException as e:
@@ -737,24 +846,14 @@ def flattern_word_element_api():
     
     except Exception as e:
         logger.error(f"API /flattern_word_element: An error occurred for material_id {material_id}: {e}", exc_info=True)
-        if conn:
-            conn.rollback() # Rollback transaction on any error
-            logger.info(f"Database transaction rolled back for material_id: {material_id}")
         return jsonify({"code": 500, "message": f"处理失败: {str(e)}"}), 500
         
     finally:
         # 4. --- Cleanup ---
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
-        if local_doc_path and os.path.exists(local_doc_path):
-            try:
-                os.remove(local_doc_path)
-                logger.info(f"API /flattern_word_element: Cleaned up temporary file: {local_doc_path}")
-            except OSError as e_remove:
-                logger.warning(f"API /flattern_word_element: Failed to clean up temp file {local_doc_path}: {e_remove}")
+        if local_doc_path:
+            word_file_cache.release(local_doc_path)
 @app.route('/gen_proof_advice', methods=['POST'])
+@concurrency_limited
 def gen_proof_advice_api():
     content_type = request.headers.get('Content-Type')
     if not content_type or 'application/json' not in content_type.lower():
@@ -793,7 +892,8 @@ def gen_proof_advice_api():
         if conn_check: conn_check.close()
 
     app_config_paths = {'GENERATED_DOCS_DIR': app.config['GENERATED_DOCS_DIR']}
-    result = _generate_advice_document_core(file_id_str, app_config_paths)
+    result = run_heavy_task(_generate_advice_document_core, file_id_str, app_config_paths)
+    invalidate_advice_path(file_id_str)
 
     if result["success"]:
         with app.app_context():
@@ -809,8 +909,57 @@ def gen_proof_advice_api():
     else:
         return jsonify({"code": 500, "message": result["message"]}), 500
 
+def _attachment_filename_params(filename):
+    """
+    Content-Disposition 的文件名参数，与 send_file(download_name=...) 的处理一致：
+    非 ASCII 文件名 (如中文清单名) 给出 ASCII 近似的 filename 和 RFC 5987 编码的 filename*，响应头只能是 latin-1。
+    """
+    try:
+        filename.encode('ascii')
+        return {'filename': filename}
+    except UnicodeEncodeError:
+        simple = unicodedata.normalize('NFKD', filename).encode('ascii', 'ignore').decode('ascii')
+        return {'filename': simple, 'filename*': f"UTF-8''{quote(filename, safe='!#$&+-.^_`|~')}"}
+
+def _send_advice_file(full_disk_filepath, file_stat):
+    """
+    发送清单文件：ETag 由文件修改时间和大小决定，支持 304 与 Range 请求；
+    配置了 ADVICE_X_ACCEL_PREFIX 时只返回 X-Accel-Redirect 头，由 nginx 直接发送文件。
+    """
+    filename = os.path.basename(full_disk_filepath)
+    etag = f"{file_stat.st_mtime_ns:x}-{file_stat.st_size:x}"
+    if ADVICE_X_ACCEL_PREFIX:
+        if request.if_none_match.contains(etag):
+            response = app.response_class(status=304)
+        else:
+            response = app.response_class()
+            response.headers['X-Accel-Redirect'] = f"{ADVICE_X_ACCEL_PREFIX.rstrip('/')}/{quote(filename)}"
+            response.headers['Content-Type'] = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+        response.set_etag(etag)
+        response.last_modified = file_stat.st_mtime
+        response.headers.set('Content-Disposition', 'attachment', **_attachment_filename_params(filename))
+        return response
+    return send_file(
+        full_disk_filepath,
+        as_attachment=True,
+        download_name=filename,
+        conditional=True, # If-None-Match / If-Modified-Since / Range
+        etag=etag,
+        last_modified=file_stat.st_mtime,
+        max_age=0,
+    )
+
 @app.route('/download_advice_list/<string:file_id>')
+@concurrency_limited
 def download_advice_list(file_id):
+    # 命中路径缓存时只需一次 stat，不访问数据库
+    cached_path = get_cached_advice_path(file_id)
+    if cached_path:
+        try:
+            return _send_advice_file(cached_path, os.stat(cached_path))
+        except FileNotFoundError:
+            invalidate_advice_path(file_id)
+
     conn, cursor = None, None
     try:
         conn = get_db(); cursor = conn.cursor(dictionary=True)
@@ -822,17 +971,14 @@ def download_advice_list(file_id):
             filename_component_from_db = os.path.basename(filepath_from_db)
             full_disk_filepath = os.path.join(actual_server_directory, filename_component_from_db)
 
-            if os.path.exists(full_disk_filepath):
-                return send_from_directory(
-                    directory=actual_server_directory,
-                    path=filename_component_from_db,
-                    as_attachment=True,
-                    download_name=filename_component_from_db
-                )
-            else:
+            try:
+                file_stat = os.stat(full_disk_filepath)
+            except FileNotFoundError:
                 logger.error(f"File not found: {full_disk_filepath}. (DB path: {filepath_from_db}, ID: {file_id})")
                 update_file_status_in_db(file_id, "error: file path missing", f"清单文件未找到: {filename_component_from_db}")
                 return jsonify({"code": 404, "message": "清单文件丢失，请重试生成。"}), 404
+            cache_advice_path(file_id, full_disk_filepath)
+            return _send_advice_file(full_disk_filepath, file_stat)
         else:
             logger.warning(f"No proof list path for {file_id} or record missing.")
             if record and not record['proof_list_filepath']:
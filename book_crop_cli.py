@@ -0,0 +1,75 @@
+# book_crop_cli.py
+# 书籍扫描图片裁剪的命令行版本 (无界面，可在 Linux 服务器上批量运行)
+#
+# 用法: python book_crop_cli.py 参数配置.json 图片目录 [--output-dir 输出目录] [--workers N] [--recursive] [--debug] [--no-resume]
+# 参数配置为界面中“保存配置”写出的 JSON；处理日志输出到 stderr，结束后向 stdout 输出一行 JSON 汇总。
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+from book_crop_core import params_from_profile, list_images, build_job, run_batch
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="按参数配置批量裁剪书籍扫描图片")
+    parser.add_argument("profile", help="参数配置 JSON 文件")
+    parser.add_argument("input_dir", help="图片所在目录")
+    parser.add_argument("--output-dir", help="输出目录 (默认输出到图片所在目录，忽略配置中的 output_dir)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="并行进程数 (默认: CPU 核心数)")
+    parser.add_argument("--recursive", action="store_true", help="同时处理子目录中的图片")
+    parser.add_argument("--debug", action="store_true", help="生成 debug_output 调试图片")
+    parser.add_argument("--no-resume", action="store_true", help="重新处理已有 _cropped 输出的图片 (默认跳过)")
+    args = parser.parse_args(argv)
+
+    try:
+        with open(args.profile, 'r', encoding='utf-8') as f:
+            params, active_colors, options = params_from_profile(json.load(f))
+    except (OSError, ValueError) as e:
+        print(f"错误: 无法加载参数配置 {args.profile}: {e}", file=sys.stderr)
+        return 2
+    if not os.path.isdir(args.input_dir):
+        print(f"错误: 图片目录不存在: {args.input_dir}", file=sys.stderr)
+        return 2
+
+    started = time.time()
+    jobs, skipped = [], 0
+    for image_path in list_images(args.input_dir, args.recursive):
+        output_dir = args.output_dir
+        if output_dir and args.recursive: # 保持子目录结构，避免同名文件互相覆盖
+            output_dir = os.path.join(output_dir, os.path.relpath(os.path.dirname(image_path), args.input_dir))
+        job = build_job(image_path, output_dir, args.debug)
+        if not args.no_resume and os.path.exists(job[1]):
+            skipped += 1
+            continue
+        jobs.append(job)
+    print(f"共 {len(jobs) + skipped} 张图片，跳过已处理 {skipped} 张，使用 {args.workers} 个进程。", file=sys.stderr)
+
+    succeeded, failures = 0, []
+    for done_count, result in enumerate(run_batch(jobs, params, active_colors, options, max(1, args.workers)), 1):
+        print(f"({done_count}/{len(jobs)}) {os.path.basename(result['path'])}: {'成功' if result['success'] else '失败'}", file=sys.stderr)
+        if result["success"]:
+            succeeded += 1
+        else:
+            # 以最后一条显示在状态栏的消息作为失败原因
+            reasons = [message for message, to_status in result["logs"] if to_status]
+            failures.append({"path": result["path"], "error": reasons[-1].strip(" >") if reasons else "未知错误"})
+
+    summary = {
+        "total": len(jobs) + skipped,
+        "processed": len(jobs),
+        "succeeded": succeeded,
+        "failed": len(failures),
+        "skipped": skipped,
+        "elapsed_seconds": round(time.time() - started, 2),
+        "failures": failures,
+    }
+    print(json.dumps(summary, ensure_ascii=False))
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    multiprocessing.freeze_support()
+    sys.exit(main())
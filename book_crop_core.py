@@ -0,0 +1,573 @@
+# book_crop_core.py
+# 书籍扫描图片裁剪的核心算法 (不依赖 Tk)，供 书籍扫描图片裁剪.py 调用
+
+import os
+import traceback
+import functools
+import math
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+import cv2
+import numpy as np
+
+IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".bmp", ".tiff"}
+CROPPED_SUFFIX = "_cropped"
+
+
+# --- 倾斜校正 ---
+DESKEW_ANGLE_RANGE = 5.0 # 搜索范围 ±5°
+DESKEW_MIN_ANGLE = 0.1 # 小于此角度时不旋转
+
+
+def _binarize_for_deskew(img):
+    img_gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+    _, img_binary = cv2.threshold(img_gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    return img_binary
+
+
+def _downsample(img_binary, max_side):
+    """按最长边缩小二值图 (INTER_AREA 保留灰度作为权重)，返回缩小后的图像和缩放比例。"""
+    h, w = img_binary.shape[:2]
+    scale = min(1.0, max_side / float(max(h, w)))
+    if scale >= 1.0:
+        return img_binary, 1.0
+    small = cv2.resize(img_binary, (max(1, round(w * scale)), max(1, round(h * scale))), interpolation=cv2.INTER_AREA)
+    return small, scale
+
+
+class _ProjectionProfiler:
+    """
+    对前景像素坐标直接计算旋转 (或行错切) 后的水平投影方差，
+    与 warpAffine 旋转整幅图后按行求和等价，但只处理前景点，不产生新图像。
+    """
+
+    def __init__(self, img_binary, method="rotate"):
+        self.h, self.w = img_binary.shape[:2]
+        ys, xs = np.nonzero(img_binary)
+        self.weights = img_binary[ys, xs].astype(np.float64)
+        self.cx, self.cy = self.w // 2, self.h // 2
+        self.dx = xs.astype(np.float64) - self.cx
+        self.dy = ys.astype(np.float64) - self.cy
+        self.method = method
+
+    def score(self, angle):
+        if self.weights.size == 0:
+            return 0.0
+        theta = np.deg2rad(angle)
+        if self.method == "shear":
+            # 行错切：y' = y - tan(θ)·(x - cx)，小角度下与旋转的投影几乎相同
+            rows = self.dy - np.tan(theta) * self.dx + self.cy
+        else:
+            # 与 cv2.getRotationMatrix2D(center, angle, 1.0) 相同的旋转：y' = -sinθ·(x-cx) + cosθ·(y-cy) + cy
+            rows = np.cos(theta) * self.dy - np.sin(theta) * self.dx + self.cy
+        rows = np.rint(rows).astype(np.int64)
+        inside = (rows >= 0) & (rows < self.h) # 旋转出画面的像素不计入，与 warpAffine 一致
+        profile = np.bincount(rows[inside], weights=self.weights[inside], minlength=self.h)
+        return float(np.var(profile))
+
+
+def _parabolic_peak(angles, scores, best_index, step):
+    """用最佳角度及其左右两点拟合抛物线，返回亚步长精度的峰值位置。"""
+    if best_index <= 0 or best_index >= len(angles) - 1:
+        return float(angles[best_index])
+    s_left, s_mid, s_right = scores[best_index - 1], scores[best_index], scores[best_index + 1]
+    denom = s_left - 2 * s_mid + s_right
+    if denom >= 0: # 不是极大值，无法插值
+        return float(angles[best_index])
+    offset = 0.5 * (s_left - s_right) / denom
+    return float(angles[best_index] + np.clip(offset, -0.5, 0.5) * step)
+
+
+def estimate_skew_angle(img, angle_range=DESKEW_ANGLE_RANGE, coarse_step=0.5, fine_step=0.1,
+                        coarse_max_side=1000, fine_max_side=2500, method="rotate"):
+    """
+    投影剖面法检测倾斜角 (度，与 cv2.getRotationMatrix2D 的方向一致)。
+    先在缩小的二值图上以 coarse_step 粗搜，再在较高分辨率上围绕粗搜结果以 fine_step 细搜，
+    最后用抛物线插值得到亚步长精度的角度。method 为 "rotate" (精确旋转) 或 "shear" (行错切)。
+    """
+    img_binary = _binarize_for_deskew(img)
+
+    coarse_img, _ = _downsample(img_binary, coarse_max_side)
+    coarse = _ProjectionProfiler(coarse_img, method)
+    coarse_angles = np.arange(-angle_range, angle_range + coarse_step / 2, coarse_step)
+    coarse_scores = [coarse.score(a) for a in coarse_angles]
+    coarse_best = float(coarse_angles[int(np.argmax(coarse_scores))])
+
+    fine_img, _ = _downsample(img_binary, fine_max_side)
+    fine = _ProjectionProfiler(fine_img, method)
+    n = int(round(coarse_step / fine_step))
+    fine_angles = coarse_best + fine_step * np.arange(-n, n + 1)
+    fine_angles = fine_angles[(fine_angles >= -angle_range - 1e-9) & (fine_angles <= angle_range + 1e-9)]
+    fine_scores = [fine.score(a) for a in fine_angles]
+    best_index = int(np.argmax(fine_scores))
+    best_angle = _parabolic_peak(fine_angles, fine_scores, best_index, fine_step)
+    return float(np.clip(best_angle, -angle_range, angle_range))
+
+
+def deskew_angle(img, log=None, **estimate_kwargs):
+    """检测需要校正的角度；角度过小 (< DESKEW_MIN_ANGLE) 时返回 0.0。"""
+    log = log or (lambda message: None)
+    log("  > 使用投影剖面法进行倾斜校正...")
+    angle_range = estimate_kwargs.get("angle_range", DESKEW_ANGLE_RANGE)
+    best_angle = estimate_skew_angle(img, **estimate_kwargs)
+    log(f"  > 投影法检测到最佳倾斜角: {best_angle:.2f}°")
+    if abs(best_angle) < DESKEW_MIN_ANGLE:
+        log(f"  > 倾斜角度 {best_angle:.2f}° 过小，跳过旋转。")
+        return 0.0
+    if abs(best_angle) >= angle_range:
+        log(f"  > 警告: 倾斜角度达到搜索边界 ({best_angle:.2f}°), 可能校正不准确。")
+    return best_angle
+
+
+def rotate_image(img, angle, fill_color=(255, 255, 255)):
+    """绕中心旋转 angle 度 (INTER_CUBIC)，空出的区域用 fill_color 填充；angle 为 0 时返回原图。"""
+    if not angle:
+        return img
+    center = (img.shape[1] // 2, img.shape[0] // 2)
+    M_final = cv2.getRotationMatrix2D(center, angle, 1.0)
+    return cv2.warpAffine(img, M_final, (img.shape[1], img.shape[0]), flags=cv2.INTER_CUBIC,
+                          borderMode=cv2.BORDER_CONSTANT, borderValue=list(fill_color))
+
+
+def deskew_image(img, fill_color=(255, 255, 255), log=None, **estimate_kwargs):
+    """检测并校正倾斜，返回 (校正后的图像, 角度)；角度过小时返回原图和 0.0。"""
+    angle = deskew_angle(img, log, **estimate_kwargs)
+    if angle:
+        (log or (lambda message: None))(f"  > 进行校正...")
+    return rotate_image(img, angle, fill_color), angle
+
+
+# --- 内容检测与裁剪 ---
+def clear_edges(image, edge_width, color_bgr):
+    """用背景色填充图像四周 edge_width 像素 (原地修改)，返回实际使用的宽度。"""
+    img_h, img_w = image.shape[:2]
+    ew = min(edge_width, img_h // 2, img_w // 2)
+    cv2.rectangle(image, (0, 0), (img_w - 1, ew - 1), color_bgr, -1); cv2.rectangle(image, (0, img_h - ew), (img_w - 1, img_h - 1), color_bgr, -1)
+    cv2.rectangle(image, (0, 0), (ew - 1, img_h - 1), color_bgr, -1); cv2.rectangle(image, (img_w - ew, 0), (img_w - 1, img_h - 1), color_bgr, -1)
+    return ew
+
+
+def _color_key(active_colors):
+    """把背景色列表转换为可哈希的键，用于缓存查找表。"""
+    return tuple((tuple(int(v) for v in np.asarray(ac["color"]).tolist()), int(ac["tolerance"])) for ac in active_colors)
+
+
+@functools.lru_cache(maxsize=32)
+def _background_luts(color_key):
+    """
+    为背景色生成按通道的位掩码查找表：每 8 个颜色一组，每组 B/G/R 各一张 256 项的表，
+    第 k 位表示该通道取值落在组内第 k 个颜色的 ±容差范围内。三个通道查表后按位与，结果非零即属于某个背景色。
+    inRange 的判定区域是三个通道区间的乘积，因此这与完整的 256³ 颜色表完全等价，但每组只占 768 字节。
+    """
+    values = np.arange(256, dtype=np.int16)
+    groups = []
+    for group_start in range(0, len(color_key), 8):
+        channel_luts = [np.zeros(256, dtype=np.uint8) for _ in range(3)]
+        for bit, (color, tolerance) in enumerate(color_key[group_start:group_start + 8]):
+            for channel in range(3):
+                channel_luts[channel][np.abs(values - color[channel]) <= tolerance] |= np.uint8(1 << bit)
+        groups.append(channel_luts)
+    return groups
+
+
+MASK_STRIP_ROWS = 64 # 按行分条处理，每条的中间结果留在 CPU 缓存中
+
+
+def build_content_mask(image, active_colors):
+    """不属于任何背景色 (颜色 ± 容差) 的像素为 255。"""
+    if len(active_colors) == 1: # 单个颜色时一次 inRange 最快
+        ac = active_colors[0]
+        lower = np.clip(np.asarray(ac["color"]).astype(np.int16) - ac["tolerance"], 0, 255).astype(np.uint8)
+        upper = np.clip(np.asarray(ac["color"]).astype(np.int16) + ac["tolerance"], 0, 255).astype(np.uint8)
+        return cv2.bitwise_not(cv2.inRange(image, lower, upper))
+
+    # 多个颜色：每个像素只查表一次，取代逐色的整图 inRange + bitwise_or
+    groups = _background_luts(_color_key(active_colors))
+    img_h, img_w = image.shape[:2]
+    content_mask = np.empty((img_h, img_w), dtype=np.uint8)
+    for y in range(0, img_h, MASK_STRIP_ROWS):
+        planes = cv2.split(image[y:y + MASK_STRIP_ROWS])
+        background_bits = None
+        for lut_b, lut_g, lut_r in groups:
+            bits = cv2.LUT(planes[0], lut_b)
+            cv2.bitwise_and(bits, cv2.LUT(planes[1], lut_g), dst=bits)
+            cv2.bitwise_and(bits, cv2.LUT(planes[2], lut_r), dst=bits)
+            if background_bits is None: background_bits = bits
+            else: cv2.bitwise_or(background_bits, bits, dst=background_bits)
+        cv2.compare(background_bits, 0, cv2.CMP_EQ, dst=content_mask[y:y + MASK_STRIP_ROWS])
+    return content_mask
+
+
+def dilate_mask(content_mask, expansion):
+    if expansion <= 0:
+        return content_mask
+    kernel = np.ones((expansion, expansion), np.uint8)
+    return cv2.dilate(content_mask, kernel, iterations=1)
+
+
+def find_significant_contours(content_mask, params, exclude_aspect_ratio):
+    """按最小面积 (‱) 和宽高比过滤外轮廓。"""
+    img_h, img_w = content_mask.shape[:2]
+    contours, _ = cv2.findContours(content_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    min_area = (img_h * img_w) * (params["min_area_ratio"] / 10000.0)
+    significant_contours = []
+    for c in contours:
+        if cv2.contourArea(c) < min_area: continue
+        if exclude_aspect_ratio:
+            x, y, w, h = cv2.boundingRect(c)
+            if w == 0 or h == 0 or max(w/h, h/w) > params["aspect_ratio_limit"]: continue
+        significant_contours.append(c)
+    return significant_contours
+
+
+def make_detection_proxy(image, proxy_scale):
+    """
+    按 proxy_scale 缩小用于内容检测 (掩码、膨胀、轮廓) 的图像，返回 (图像, 实际水平缩放比例)。
+    INTER_AREA 会把细笔画与背景混合成非背景色，缩小后笔画不会丢失。
+    缩放比例取最接近的 1/2ⁿ，逐级减半 (OpenCV 对 2 倍 INTER_AREA 有专门的快速实现)；proxy_scale >= 1 时返回原图。
+    """
+    halvings = max(0, round(math.log2(1.0 / proxy_scale))) if proxy_scale and proxy_scale < 1.0 else 0
+    small = image
+    for _ in range(halvings):
+        small_h, small_w = small.shape[:2]
+        if small_w < 2 or small_h < 2: break
+        small = cv2.resize(small, (small_w // 2, small_h // 2), interpolation=cv2.INTER_AREA)
+    return small, small.shape[1] / image.shape[1]
+
+
+def proxy_expansion(expansion, scale):
+    """缩小检测时的选区扩展 (膨胀核) 大小。"""
+    return max(1, round(expansion * scale)) if expansion > 0 else 0
+
+
+def scale_contours(contours, factor):
+    return [np.round(c * factor).astype(np.int32) for c in contours]
+
+
+def compute_crop_box(significant_contours, params, img_w, img_h, scale=1.0):
+    """
+    根据内容轮廓计算裁剪框，返回 ((x1, y1, x2, y2), 是否采用居中策略, 内容宽度)。
+    内容宽度接近裁剪宽度时居中，否则按左边距对齐。
+    轮廓来自缩小的检测图像时传入 scale，裁剪框按原图 (img_w, img_h) 的坐标返回。
+    """
+    all_points = np.vstack(significant_contours)
+    content_box_x_min, _, content_width, _ = cv2.boundingRect(all_points)
+    if scale != 1.0:
+        content_box_x_min, content_width = content_box_x_min / scale, round(content_width / scale)
+    centered = content_width >= params["crop_w"] * 0.9
+    if centered:
+        content_center_x = content_box_x_min + content_width / 2
+        x1 = content_center_x - (params["crop_w"] / 2)
+    else:
+        x1 = content_box_x_min - params["left_margin"]
+    x1 = max(0, x1); y1 = max(0, params["offset_y"]); x2 = min(img_w, x1 + params["crop_w"]); y2 = min(img_h, y1 + params["crop_h"])
+    return (x1, y1, x2, y2), centered, content_width
+
+
+def save_image_robust(file_path, image_data, extension=".png", log=None):
+    """用 imencode + 二进制写入保存图片，支持中文路径。失败时记录警告并返回 False。"""
+    log = log or (lambda message: None)
+    try:
+        if not file_path.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp', '.tiff')):
+            file_ext = extension
+        else:
+            file_ext = os.path.splitext(file_path)[1]
+        is_success, buffer = cv2.imencode(file_ext, image_data)
+        if is_success:
+            # 先写临时文件再替换，中断时不会留下不完整的输出 (断点续跑依赖输出文件是否存在)
+            tmp_path = f"{file_path}.part"
+            with open(tmp_path, "wb") as f: f.write(buffer)
+            os.replace(tmp_path, file_path)
+            return True
+        log(f"  > 警告: 无法编码图片 {os.path.basename(file_path)}")
+    except Exception as e: log(f"  > 警告: 保存图片失败 {file_path}: {e}")
+    return False
+
+
+def process_image(image_path, output_path, params, active_colors, clear_edges_enabled=True,
+                  exclude_aspect_ratio=True, debug_base_path=None, fill_color=(255, 255, 255)):
+    """
+    单张图片的完整处理流程：解码、倾斜校正、清除边缘、背景掩码、膨胀、轮廓、裁剪、编码保存。
+    只接收可序列化参数、不访问界面，可在进程池中执行。
+    返回 {"path", "output", "success", "angle", "logs"}，logs 为 (消息, 是否显示在状态栏) 列表。
+    """
+    logs = []
+    def log(message, to_status=False): logs.append((message, to_status))
+    result = {"path": image_path, "output": None, "success": False, "angle": 0.0, "logs": logs}
+    basename = os.path.basename(image_path)
+    ext = os.path.splitext(output_path)[1]
+    try:
+        os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+        if debug_base_path:
+            os.makedirs(os.path.dirname(debug_base_path), exist_ok=True); log(f"  > 调试模式开启")
+        with open(image_path, 'rb') as f: image_data = np.frombuffer(f.read(), np.uint8)
+        original_image = cv2.imdecode(image_data, cv2.IMREAD_COLOR)
+        if original_image is None: log(f"  > 警告: 无法解码图片 {basename}", True); return result
+        img_h, img_w = original_image.shape[:2]; log(f"  > 图片加载成功: {img_w}x{img_h}")
+        if debug_base_path: save_image_robust(f"{debug_base_path}_01_original.png", original_image, log=log)
+        working_image, result["angle"] = deskew_image(original_image, fill_color, log=log)
+        if debug_base_path: save_image_robust(f"{debug_base_path}_02_rotated.png", working_image, log=log)
+        img_h, img_w = working_image.shape[:2]
+        if clear_edges_enabled and params["edge_width"] > 0:
+            clear_edges(working_image, params["edge_width"], np.asarray(active_colors[0]['color']).tolist())
+            if debug_base_path: save_image_robust(f"{debug_base_path}_03_edges_cleared.png", working_image, log=log)
+        # 内容检测只需要轮廓的外接框，可在缩小的图像上进行 (proxy_scale < 1)
+        detect_image, scale = make_detection_proxy(working_image, params.get("proxy_scale", 1.0))
+        if scale != 1.0: log(f"  > 在 {detect_image.shape[1]}x{detect_image.shape[0]} 的缩小图像上检测内容。")
+        content_mask = build_content_mask(detect_image, active_colors)
+        if debug_base_path: save_image_robust(f"{debug_base_path}_04_content_mask.png", content_mask, log=log)
+        if params["expansion"] > 0:
+            content_mask = dilate_mask(content_mask, proxy_expansion(params["expansion"], scale))
+            if debug_base_path: save_image_robust(f"{debug_base_path}_05_dilated_mask.png", content_mask, log=log)
+        significant_contours = find_significant_contours(content_mask, params, exclude_aspect_ratio)
+        if debug_base_path:
+            dbg_img_contours = working_image.copy()
+            cv2.drawContours(dbg_img_contours, scale_contours(significant_contours, 1 / scale), -1, (0, 0, 255), 3)
+            save_image_robust(f"{debug_base_path}_06_filtered_contours.png", dbg_img_contours, log=log)
+        if not significant_contours: log(f"  > 警告: 未找到有效内容。", True); return result
+        (x1, y1, x2, y2), centered, content_width = compute_crop_box(significant_contours, params, img_w, img_h, scale)
+        if centered:
+            log(f"  > 内容宽度({content_width}px)较大，采用居中策略。")
+        else:
+            log(f"  > 采用左边距策略 (边距: {params['left_margin']}px)。")
+        if debug_base_path:
+            dbg_img_crop_box = working_image.copy()
+            cv2.rectangle(dbg_img_crop_box, (int(x1), int(y1)), (int(x2), int(y2)), (0, 255, 0), 5)
+            save_image_robust(f"{debug_base_path}_07_crop_area.png", dbg_img_crop_box, log=log)
+        cropped_image = working_image[int(y1):int(y2), int(x1):int(x2)]
+        if debug_base_path:
+            save_image_robust(f"{debug_base_path}_08_final_cropped.png", cropped_image, log=log)
+        if not save_image_robust(output_path, cropped_image, ext, log=log): return result
+        log(f"  > 保存成功: {os.path.basename(output_path)}")
+        result["output"], result["success"] = output_path, True
+    except Exception as e:
+        log(f"  > 错误: 处理文件 {basename} 时发生异常: {e}", True)
+        log(traceback.format_exc())
+    return result
+
+
+# --- 参数配置与批处理 ---
+def params_from_profile(config):
+    """
+    将参数配置 (界面 _get_parameters_as_dict / “保存配置” 写出的 JSON) 转换为处理参数。
+    返回 (params, active_colors, options)，参数无效时抛出 ValueError。
+    """
+    try:
+        params = {
+            "crop_w": int(config.get("crop_width", "1780")), "crop_h": int(config.get("crop_height", "2550")),
+            "offset_y": int(config.get("top_offset", "50")), "left_margin": int(config.get("left_margin", "160")),
+            "expansion": int(config.get("expansion", "6")), "aspect_ratio_limit": float(config.get("aspect_ratio_threshold", "6")),
+            "edge_width": int(config.get("edge_width", "30")), "min_area_ratio": float(config.get("min_area_ratio", "1.0")),
+            "proxy_scale": float(config.get("proxy_scale", "1.0"))
+        }
+    except (TypeError, ValueError):
+        raise ValueError("所有数值参数必须是有效的正数（部分可为0）！")
+    if any(v < 0 for k, v in params.items() if k != "aspect_ratio_limit") or params["aspect_ratio_limit"] <= 0:
+        raise ValueError("所有数值参数必须是有效的正数（部分可为0）！")
+    if not 0 < params["proxy_scale"] <= 1:
+        raise ValueError("检测缩放比例必须在 0 到 1 之间 (1 表示按原图检测)！")
+
+    colors_config = config.get("background_colors_v6_2", [])
+    active_colors = [{"color": np.array(c["color"], dtype=np.uint8), "tolerance": int(c.get("tolerance", 25))}
+                     for c in colors_config if c.get("color") and c.get("enabled", True)]
+    if not active_colors:
+        raise ValueError("请至少设置并启用一个有效的背景色！")
+    # 旋转后的填充色始终取第一个颜色槽 (即使未启用)，与界面一致
+    fill_color = list(colors_config[0]["color"]) if colors_config and colors_config[0].get("color") else [255, 255, 255]
+    options = {
+        "clear_edges_enabled": bool(config.get("clear_edges", True)),
+        "exclude_aspect_ratio": bool(config.get("exclude_aspect_ratio", True)),
+        "fill_color": fill_color,
+    }
+    return params, active_colors, options
+
+
+def list_images(directory, recursive=False):
+    """列出目录下的图片 (按路径排序)，跳过已生成的 *_cropped 输出和 debug_output 目录。"""
+    found = []
+    for dirpath, dirnames, filenames in os.walk(directory):
+        dirnames[:] = sorted(d for d in dirnames if d != "debug_output")
+        for filename in filenames:
+            name, ext = os.path.splitext(filename)
+            if ext.lower() in IMAGE_EXTENSIONS and not name.endswith(CROPPED_SUFFIX):
+                found.append(os.path.join(dirpath, filename))
+        if not recursive:
+            break
+    return sorted(found)
+
+
+def build_job(image_path, output_dir=None, debug=False):
+    """返回 (图片路径, 裁剪输出路径, 调试图片前缀)；output_dir 为空时输出到图片所在目录。"""
+    source_dir, filename = os.path.split(image_path); name, ext = os.path.splitext(filename)
+    final_output_dir = output_dir or source_dir
+    final_cropped_path = os.path.join(final_output_dir, f"{name}{CROPPED_SUFFIX}{ext}")
+    debug_base_path = os.path.join(final_output_dir, "debug_output", name) if debug else None
+    return image_path, final_cropped_path, debug_base_path
+
+
+def run_batch(jobs, params, active_colors, options, workers, cancel_event=None):
+    """
+    在进程池中处理 build_job() 生成的任务，同时在途的任务不超过 workers * 2 个，
+    按完成顺序逐个产出 process_image 的结果。cancel_event 置位后不再提交新任务。
+    """
+    max_in_flight = workers * 2
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = set()
+        job_iter = iter(jobs)
+        while True:
+            while len(pending) < max_in_flight and not (cancel_event and cancel_event.is_set()):
+                job = next(job_iter, None)
+                if job is None: break
+                image_path, output_path, debug_base_path = job
+                pending.add(executor.submit(process_image, image_path, output_path, params, active_colors,
+                                            debug_base_path=debug_base_path, **options))
+            if not pending: break
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+
+
+# --- 交互预览的分阶段缓存 ---
+def _estimate_nbytes(value):
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (list, tuple)):
+        return sum(_estimate_nbytes(v) for v in value) + 64
+    if isinstance(value, dict):
+        return sum(_estimate_nbytes(v) for v in value.values()) + 64
+    return 64
+
+
+class PipelineStageCache:
+    """
+    按 (图片, 阶段, 参数) 缓存处理流程的中间结果，所有图片共享一个总内存上限，按最近使用淘汰。
+    每个阶段的键包含其上游所有阶段依赖的参数，因此参数变化时只有其下游阶段需要重新计算。
+    缓存的数组供多处读取，调用方不得原地修改。
+    可被多个线程 (界面与预取线程) 同时使用；同一个键正在计算时，其他线程等待其结果而不重复计算。
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._entries = OrderedDict() # key -> (value, nbytes)
+        self._lock = threading.Lock()
+        self._pending = {} # key -> threading.Event，正在计算的键
+
+    def get_or_compute(self, key, compute):
+        while True:
+            with self._lock:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    return self._entries[key][0]
+                pending = self._pending.get(key)
+                if pending is None:
+                    self._pending[key] = threading.Event()
+                    break
+            pending.wait() # 另一线程正在计算；完成后重新查找 (计算失败或结果过大时由本线程重新计算)
+
+        try:
+            value = compute()
+            nbytes = _estimate_nbytes(value)
+            with self._lock:
+                if nbytes <= self.max_bytes:
+                    self._entries[key] = (value, nbytes)
+                    self.total_bytes += nbytes
+                    while self.total_bytes > self.max_bytes:
+                        _, (_, evicted_bytes) = self._entries.popitem(last=False)
+                        self.total_bytes -= evicted_bytes
+            return value
+        finally:
+            with self._lock:
+                self._pending.pop(key).set()
+
+    def contains(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def discard_image(self, image_key):
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == image_key]:
+                self.total_bytes -= self._entries.pop(key)[1]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.total_bytes = 0
+
+
+def image_cache_key(image_path):
+    """图片路径 + 修改时间 + 大小，文件被替换后旧的缓存自然失效。"""
+    st = os.stat(image_path)
+    return (os.path.abspath(image_path), st.st_mtime_ns, st.st_size)
+
+
+def decode_image_file(image_path):
+    with open(image_path, 'rb') as f: image_data = np.frombuffer(f.read(), np.uint8)
+    image = cv2.imdecode(image_data, cv2.IMREAD_COLOR)
+    if image is None: raise IOError("无法解码图像")
+    return image
+
+
+def cached_decoded_image(cache, image_path):
+    """解码图片 (与 compute_detection_stages 的 decoded 阶段共用缓存)。"""
+    return cache.get_or_compute((image_cache_key(image_path), "decoded", ()), lambda: decode_image_file(image_path))
+
+
+def cached_display_image(cache, image_path, max_side):
+    """
+    解码后缩小到显示分辨率的副本，返回 (图像, 缩放比例)。
+    预览缩放比例不超过该比例时，用它代替原图缩放显示，避免每次都缩放整幅扫描图。
+    """
+    def compute():
+        decoded = cached_decoded_image(cache, image_path)
+        img_h, img_w = decoded.shape[:2]
+        scale = min(1.0, max_side / float(max(img_h, img_w)))
+        if scale >= 1.0: return (decoded, 1.0)
+        small = cv2.resize(decoded, (max(1, round(img_w * scale)), max(1, round(img_h * scale))), interpolation=cv2.INTER_AREA)
+        return (small, small.shape[1] / img_w)
+    return cache.get_or_compute((image_cache_key(image_path), "display", max_side), compute)
+
+
+def compute_detection_stages(cache, image_path, params, active_colors, options, log=None, until=None):
+    """
+    使用 cache 计算预览所需的各阶段结果：
+    decoded → angle → deskewed → edge_cleared → content_mask → dilated_mask → contours。
+    返回包含各阶段结果的字典 (另含 edge_width 和 detect_scale)，其中的数组不得原地修改。
+    until="deskewed" 时只计算到倾斜校正为止，此时只需 options["fill_color"]，params/active_colors 可为 None (用于预取)。
+    """
+    image_key = image_cache_key(image_path)
+    stage_key = ()
+    def stage(name, param_key, compute):
+        nonlocal stage_key
+        stage_key = stage_key + (name, param_key)
+        return cache.get_or_compute((image_key,) + stage_key, compute)
+
+    stages = {}
+    stages["decoded"] = stage("decoded", (), lambda: decode_image_file(image_path))
+    # 角度只取决于原图；填充色变化时只需重新旋转
+    stages["angle"] = stage("angle", (), lambda: deskew_angle(stages["decoded"], log))
+    fill_color = tuple(int(v) for v in options["fill_color"])
+    stages["deskewed"] = stage("deskewed", fill_color, lambda: rotate_image(stages["decoded"], stages["angle"], fill_color))
+    if until == "deskewed":
+        return stages
+
+    edge_color = tuple(int(v) for v in np.asarray(active_colors[0]["color"]).tolist())
+    clear = options["clear_edges_enabled"] and params["edge_width"] > 0
+    def compute_edge_cleared():
+        if not clear: return (stages["deskewed"], 0)
+        image = stages["deskewed"].copy()
+        return (image, clear_edges(image, params["edge_width"], list(edge_color)))
+    stages["edge_cleared"], stages["edge_width"] = stage("edge_cleared", (clear, params["edge_width"], edge_color), compute_edge_cleared)
+
+    def compute_mask():
+        detect_image, scale = make_detection_proxy(stages["edge_cleared"], params.get("proxy_scale", 1.0))
+        return (build_content_mask(detect_image, active_colors), scale)
+    stages["content_mask"], stages["detect_scale"] = stage("content_mask", (params.get("proxy_scale", 1.0), _color_key(active_colors)), compute_mask)
+
+    expansion = proxy_expansion(params["expansion"], stages["detect_scale"])
+    stages["dilated_mask"] = stage("dilated_mask", expansion, lambda: dilate_mask(stages["content_mask"], expansion))
+    contour_key = (params["min_area_ratio"], options["exclude_aspect_ratio"], params["aspect_ratio_limit"])
+    stages["contours"] = stage("contours", contour_key, lambda: find_significant_contours(stages["dilated_mask"], params, options["exclude_aspect_ratio"]))
+    return stages
@@ -0,0 +1,82 @@
+# book_crop_proxy_benchmark.py
+# 比较“缩小检测 (proxy_scale)”与原图检测得到的裁剪框和耗时
+#
+# 用法: python book_crop_proxy_benchmark.py 参数配置.json 图片目录 [--scales 0.5,0.25,0.125] [--limit 50]
+import argparse
+import json
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from book_crop_core import (params_from_profile, list_images, deskew_image, clear_edges, make_detection_proxy,
+                            proxy_expansion, build_content_mask, dilate_mask, find_significant_contours, compute_crop_box)
+
+
+def detect_box(working_image, params, active_colors, exclude_aspect_ratio, proxy_scale):
+    """与 process_image 相同的内容检测步骤，返回 (裁剪框或 None, 是否居中, 耗时秒)。"""
+    started = time.perf_counter()
+    img_h, img_w = working_image.shape[:2]
+    detect_image, scale = make_detection_proxy(working_image, proxy_scale)
+    content_mask = build_content_mask(detect_image, active_colors)
+    content_mask = dilate_mask(content_mask, proxy_expansion(params["expansion"], scale))
+    significant_contours = find_significant_contours(content_mask, params, exclude_aspect_ratio)
+    box, centered = None, None
+    if significant_contours:
+        box, centered, _ = compute_crop_box(significant_contours, params, img_w, img_h, scale)
+    return box, centered, time.perf_counter() - started
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="缩小检测与原图检测的精度/速度对比")
+    parser.add_argument("profile", help="参数配置 JSON 文件")
+    parser.add_argument("input_dir", help="图片所在目录")
+    parser.add_argument("--scales", default="0.5,0.25,0.125", help="要比较的缩放比例，逗号分隔 (按最接近的 1/2ⁿ 处理)")
+    parser.add_argument("--limit", type=int, default=0, help="最多处理的图片数 (0 表示全部)")
+    args = parser.parse_args(argv)
+
+    with open(args.profile, 'r', encoding='utf-8') as f:
+        params, active_colors, options = params_from_profile(json.load(f))
+    scales = [float(s) for s in args.scales.split(",") if s.strip()]
+    images = list_images(args.input_dir)
+    if args.limit: images = images[:args.limit]
+
+    stats = {scale: {"dx": [], "time": [], "strategy_mismatch": 0, "missing": 0} for scale in [1.0] + scales}
+    for image_path in images:
+        with open(image_path, 'rb') as f: image_data = np.frombuffer(f.read(), np.uint8)
+        image = cv2.imdecode(image_data, cv2.IMREAD_COLOR)
+        if image is None:
+            print(f"跳过无法解码的图片: {image_path}", file=sys.stderr); continue
+        working_image, _ = deskew_image(image, options["fill_color"])
+        if options["clear_edges_enabled"] and params["edge_width"] > 0:
+            clear_edges(working_image, params["edge_width"], np.asarray(active_colors[0]["color"]).tolist())
+
+        reference_box, reference_centered, reference_time = detect_box(working_image, params, active_colors, options["exclude_aspect_ratio"], 1.0)
+        stats[1.0]["time"].append(reference_time)
+        for scale in scales:
+            box, centered, elapsed = detect_box(working_image, params, active_colors, options["exclude_aspect_ratio"], scale)
+            entry = stats[scale]
+            entry["time"].append(elapsed)
+            if (box is None) != (reference_box is None):
+                entry["missing"] += 1; continue
+            if box is None: continue
+            entry["strategy_mismatch"] += centered != reference_centered
+            # 裁剪框的高度只由参数决定，比较左右边界即可
+            entry["dx"].append(max(abs(box[0] - reference_box[0]), abs(box[2] - reference_box[2])))
+
+    reference_ms = np.mean(stats[1.0]["time"]) * 1000 if stats[1.0]["time"] else 0.0
+    print(f"图片数: {len(stats[1.0]['time'])}，原图检测平均耗时: {reference_ms:.1f} ms")
+    print(f"{'缩放':>6} {'平均耗时(ms)':>12} {'加速':>6} {'平均偏差(px)':>12} {'最大偏差(px)':>12} {'≤2px占比':>9} {'策略不同':>8} {'结果缺失':>8}")
+    for scale in scales:
+        entry = stats[scale]
+        if not entry["time"]: continue
+        mean_ms = np.mean(entry["time"]) * 1000
+        dx = np.array(entry["dx"]) if entry["dx"] else np.zeros(1)
+        print(f"{scale:>6.3g} {mean_ms:>12.1f} {reference_ms / mean_ms:>5.1f}x {dx.mean():>12.2f} {dx.max():>12.2f} "
+              f"{np.mean(dx <= 2):>9.1%} {entry['strategy_mismatch']:>8} {entry['missing']:>8}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,49 @@
+# com_tasks.py
+# 需要驱动 Word (COM) 的重任务。这些函数位于模块顶层且只接收可序列化参数，
+# 生产模式下 (serve.py) 由 app.py 提交到独立的进程池执行，开发模式下直接在请求线程中调用。
+import logging
+
+import mysql.connector
+
+from db_config import DB_CONFIG
+from extractWordElement_web import run_extraction
+from word_parser_for_material import parse_word_to_db
+
+logger = logging.getLogger(__name__)
+
+
+def extract_word_elements_task(doc_path, file_id, image_dir):
+    """解析审校用 Word 文档并写入 document_contents。"""
+    run_extraction(doc_path, file_id, image_dir)
+
+
+def flattern_material_task(doc_path, material_id, parse_level):
+    """
+    解析教材 Word 文档并写入 material_contents。
+    旧数据的删除与新数据的插入在同一事务中完成，出错时整体回滚。
+    """
+    conn, cursor = None, None
+    try:
+        conn = mysql.connector.connect(**DB_CONFIG)
+        cursor = conn.cursor()
+
+        # Clear old data for this material_id to ensure idempotency
+        logger.info(f"Clearing previous entries for material_id: {material_id}")
+        cursor.execute("DELETE FROM material_contents WHERE material_id = %s", (material_id,))
+        logger.info(f"Deleted {cursor.rowcount} old rows for material_id: {material_id}")
+
+        logger.info(f"Starting Word parsing for material_id: {material_id}")
+        result = parse_word_to_db(doc_path, material_id, parse_level, cursor)
+        # 解析成功但未生成内容时同样提交，以保留对旧数据的删除
+        conn.commit()
+        return result
+    except Exception:
+        if conn:
+            conn.rollback()
+            logger.info(f"Database transaction rolled back for material_id: {material_id}")
+        raise
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
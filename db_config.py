@@ -25,8 +25,40 @@ EXTERNAL_HOSTNAME = "127.0.0.1"  # <<< YOUR ACTUAL PUBLIC IP or DOMAIN
 # 上传文件临时存储目录 (当从Django下载Word文件时，会先存到这里)
 UPLOAD_FOLDER = os.path.join(APP_ROOT, 'uploads')
 
+# 源 Word 文件的下载缓存目录 (位于 UPLOAD_FOLDER 下)，同一本书重复处理时不再重复下载
+DOWNLOAD_CACHE_DIR = os.path.join(UPLOAD_FOLDER, 'download_cache')
+# 下载缓存的总大小上限 (字节)，超出后按最近访问时间淘汰
+DOWNLOAD_CACHE_MAX_BYTES = 2 * 1024 * 1024 * 1024
+# 在此秒数内重复获取同一文件时直接使用缓存，不向服务器发送校验请求 (0 表示每次都用 ETag/Last-Modified 校验)
+DOWNLOAD_CACHE_FRESH_SECONDS = 300
+
 # 生成的审校清单 (.docx 文件) 的存放目录
 GENERATED_DOCS_DIR = os.path.join(APP_ROOT, 'generated_proof_lists')
 
 # 从Word文档解析出来的图片存放目录 (当前配置下，extractWordElement_web.py 不再提取图片，但保留此配置项以备将来使用)
-IMAGE_OUTPUT_DIR_FLASK = os.path.join(APP_ROOT, 'parsed_word_images_flask')
\ No newline at end of file
+IMAGE_OUTPUT_DIR_FLASK = os.path.join(APP_ROOT, 'parsed_word_images_flask')
+
+# --- 生产部署 (python serve.py) ---
+# 处理请求的线程数，I/O 型接口 (如 /download_advice_list) 直接在这些线程中执行
+SERVE_THREADS = 16
+# 执行 Word COM 解析和清单生成等重任务的独立进程数 (每个进程使用自己的 Word 实例)
+COM_WORKER_PROCESSES = 2
+# 各接口同时处理的请求数上限，未列出的接口不限制
+ENDPOINT_CONCURRENCY_LIMITS = {
+    'extract_word_element_api': 2,
+    'flattern_word_element_api': 2,
+    'gen_proof_advice_api': 4,
+    'download_advice_list': 32,
+}
+# 达到并发上限时请求最多排队等待的秒数，超时返回 503
+ENDPOINT_QUEUE_TIMEOUT = 30
+# 收到停止信号后等待进行中请求完成的最长秒数
+SHUTDOWN_DRAIN_TIMEOUT = 300
+
+# --- 审校清单下载 (/download_advice_list) ---
+# 前置 Apache (mod_xsendfile) / lighttpd 时设为 True，由前置服务器直接发送文件
+USE_X_SENDFILE = False
+# 前置 nginx 时设置为指向 GENERATED_DOCS_DIR 的 internal location (如 '/protected_advice/')，None 表示由本服务发送文件
+ADVICE_X_ACCEL_PREFIX = None
+# file_id -> 清单路径 的内存缓存有效秒数 (0 表示直到重新生成前一直有效)
+ADVICE_PATH_CACHE_TTL = 300
@@ -0,0 +1,358 @@
+# delete_engine.py
+# 批量删除文件的处理引擎 (无界面)，供 删除指定的文件.py 使用
+#
+# - 输入每行一项：文件路径、目录 (删除其中的全部文件及子目录) 或通配符 (如 D:/扫描/**/*.tmp)；
+#   通配符中 * 和 ? 不跨越目录，** 匹配任意层目录；
+# - 目录和通配符用 DirectoryScanner 并行展开，可再用正则表达式按完整路径过滤；
+# - 删除在线程池中进行，按完成顺序逐个产出结果，失败按错误类型汇总；
+# - 隔离模式 (QuarantineBatch)：不删除文件，而是用 os.rename 移到隔离目录下的批次目录 (只修改目录项，不复制数据，
+#   因此文件须与隔离目录在同一磁盘)。批次目录中的 manifest.jsonl 只追加，每行记录 [编号, 原路径]，
+#   之后可整批恢复 (restore_batch) 或在后台彻底清除 (purge_batch)。
+import errno
+import json
+import os
+import re
+import shutil
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime
+
+from dir_scanner import DirectoryScanner, DEFAULT_WORKERS
+
+WILDCARD_CHARS = "*?["
+MAX_EXAMPLES = 5 # 每种错误类型保留的示例路径数
+QUARANTINE_ROOT = os.path.join(os.path.expanduser("~"), ".delete_quarantine") # 默认隔离目录 (用户目录所在磁盘)，每批一个子目录
+MANIFEST_NAME = "manifest.jsonl"
+FILES_PER_SHARD = 1000 # 批次目录中每个子目录存放的文件数
+
+
+def is_pattern(text):
+    return any(c in text for c in WILDCARD_CHARS)
+
+
+def glob_to_regex(pattern):
+    """把以 / 分隔的相对通配符转为正则表达式：* ? 不跨越 /，** 匹配任意层目录。"""
+    parts = []
+    i = 0
+    while i < len(pattern):
+        if pattern.startswith("**/", i):
+            parts.append("(?:.*/)?"); i += 3; continue
+        if pattern.startswith("**", i):
+            parts.append(".*"); i += 2; continue
+        c = pattern[i]
+        if c == "*":
+            parts.append("[^/]*")
+        elif c == "?":
+            parts.append("[^/]")
+        elif c == "[" and pattern.find("]", i + 2) != -1:
+            end = pattern.find("]", i + 2) # [] 中第一个字符可以是 ]
+            body = pattern[i + 1:end].replace("\\", "\\\\")
+            parts.append("[" + ("^" + body[1:] if body.startswith("!") else body) + "]")
+            i = end + 1
+            continue
+        else:
+            parts.append(re.escape(c))
+        i += 1
+    flags = re.IGNORECASE if os.name == "nt" else 0
+    return re.compile("".join(parts) + r"\Z", flags | re.DOTALL)
+
+
+def split_glob(pattern):
+    """把通配符拆分为 (不含通配符的起始目录, 相对通配符, 最大深度或 None)。"""
+    components = pattern.replace(os.sep, "/").split("/")
+    for index, component in enumerate(components):
+        if is_pattern(component): break
+    base = "/".join(components[:index])
+    if not base:
+        base = "/" if index > 0 else "." # 以 / 开头的绝对路径，或相对于当前目录的通配符
+    if base.endswith(":"): base += "/" # Windows 盘符根目录，如 D:/
+    rest = components[index:]
+    max_depth = None if any("**" in component for component in rest) else len(rest) - 1
+    return os.path.normpath(base), "/".join(rest), max_depth
+
+
+class DeletePlan:
+    """
+    展开后的删除计划：
+        files        待删除的文件 (已去重)
+        missing      不存在的路径或没有匹配任何文件的通配符
+        dirs         以目录形式给出的删除对象，文件删除后再删除其中的空目录
+        scan_errors  展开时无法访问的目录/文件 [(路径, 错误信息)]
+    """
+
+    def __init__(self):
+        self.files = []
+        self.missing = []
+        self.dirs = []
+        self.scan_errors = []
+        self._seen = set()
+
+    def add_file(self, path):
+        key = os.path.normcase(os.path.abspath(path))
+        if key not in self._seen:
+            self._seen.add(key)
+            self.files.append(path)
+            return True
+        return False
+
+
+def expand_targets(lines, path_regex=None, workers=DEFAULT_WORKERS, progress=None, cancel_event=None):
+    """
+    展开输入的路径、目录和通配符，返回 DeletePlan。
+    path_regex (已编译的正则表达式) 只过滤由目录和通配符展开得到的文件 (search 完整路径)，明确列出的文件不受影响。
+    每展开一项调用 progress(已处理项数, 总项数, 已找到文件数)。
+    """
+    plan = DeletePlan()
+    for index, line in enumerate(lines, 1):
+        if cancel_event and cancel_event.is_set(): break
+        if os.path.isfile(line) or os.path.islink(line):
+            plan.add_file(line)
+        elif os.path.isdir(line):
+            scanner = DirectoryScanner(workers=workers)
+            _collect(plan, scanner.scan(line, cancel_event), None, None, path_regex)
+            plan.scan_errors.extend(scanner.errors)
+            if path_regex is None:
+                plan.dirs.append(line)
+        elif is_pattern(line):
+            base, relative_pattern, max_depth = split_glob(line)
+            scanner = DirectoryScanner(max_depth=max_depth, workers=workers)
+            found = _collect(plan, scanner.scan(base, cancel_event), os.path.join(base, ""), glob_to_regex(relative_pattern),
+                             path_regex) if os.path.isdir(base) else 0
+            plan.scan_errors.extend(scanner.errors)
+            if not found:
+                plan.missing.append(line)
+        else:
+            plan.missing.append(line)
+        if progress: progress(index, len(lines), len(plan.files))
+    return plan
+
+
+def _collect(plan, entries, prefix, relative_regex, path_regex):
+    found = 0
+    for entry in entries:
+        if relative_regex is not None:
+            relative = entry.path[len(prefix):].replace(os.sep, "/")
+            if not relative_regex.match(relative): continue
+        if path_regex is not None and not path_regex.search(entry.path): continue
+        plan.add_file(entry.path)
+        found += 1
+    return found
+
+
+def error_type(exc):
+    """按异常给出错误类型 (用于汇总)。"""
+    if isinstance(exc, FileNotFoundError): return "文件不存在"
+    if getattr(exc, "errno", None) == errno.EXDEV or getattr(exc, "winerror", None) == 17:
+        return "与隔离目录不在同一磁盘"
+    if isinstance(exc, PermissionError): return "权限不足或文件被占用"
+    if isinstance(exc, IsADirectoryError): return "是目录"
+    if isinstance(exc, OSError) and getattr(exc, "winerror", None) == 32: return "权限不足或文件被占用"
+    return f"其他错误 ({type(exc).__name__})"
+
+
+def _delete_one(path, remove):
+    try:
+        remove(path)
+        return {"path": path, "status": "deleted", "error_type": None, "error": None}
+    except OSError as e:
+        return {"path": path, "status": "failed", "error_type": error_type(e), "error": str(e)}
+
+
+def _run_in_pool(function, arg_tuples, workers, cancel_event):
+    """
+    在线程池中执行 function(*args)，同时在途的任务不超过 workers * 2 个，按完成顺序逐个产出结果。
+    cancel_event 置位后不再提交新任务。
+    """
+    max_in_flight = workers * 2
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = set()
+        args_iter = iter(arg_tuples)
+        while True:
+            while len(pending) < max_in_flight and not (cancel_event and cancel_event.is_set()):
+                args = next(args_iter, None)
+                if args is None: break
+                pending.add(executor.submit(function, *args))
+            if not pending: break
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+
+
+def run_delete(paths, workers=DEFAULT_WORKERS, cancel_event=None, remove=os.remove):
+    """
+    在线程池中对 paths 逐个调用 remove (默认 os.remove，隔离模式为 QuarantineBatch.move)，
+    按完成顺序产出 {"path", "status": deleted/failed, "error_type", "error"}。cancel_event 置位后不再提交新任务。
+    """
+    return _run_in_pool(_delete_one, ((path, remove) for path in paths), workers, cancel_event)
+
+
+def remove_empty_dirs(directories):
+    """自下而上删除目录中 (含目录本身) 已经为空的子目录，返回删除的目录数。"""
+    removed = 0
+    for top in directories:
+        for current, _, _ in os.walk(top, topdown=False):
+            try:
+                os.rmdir(current)
+                removed += 1
+            except OSError:
+                pass # 仍有文件 (删除失败或被过滤) 的目录保留
+    return removed
+
+
+class DeleteSummary:
+    """按错误类型汇总删除结果，每种类型保留少量示例路径。"""
+
+    def __init__(self):
+        self.deleted = 0
+        self.errors = Counter()
+        self.examples = {}
+        self.failed_paths = []
+
+    def add(self, result):
+        if result["status"] == "deleted":
+            self.deleted += 1
+            return
+        self.add_failure(result["path"], result["error_type"], result["error"])
+
+    def add_failure(self, path, kind, message=None):
+        self.errors[kind] += 1
+        self.failed_paths.append(path)
+        examples = self.examples.setdefault(kind, [])
+        if len(examples) < MAX_EXAMPLES:
+            examples.append(f"{path} ({message})" if message else path)
+
+    def format(self):
+        lines = []
+        for kind, count in self.errors.most_common():
+            lines.append(f"{kind}: {count} 个")
+            lines.extend(f"    {example}" for example in self.examples[kind])
+            if count > len(self.examples[kind]):
+                lines.append("    ...")
+        return "\n".join(lines)
+
+
+class QuarantineBatch:
+    """
+    一批被隔离的文件。用法:
+        batch = QuarantineBatch.create()
+        for result in run_delete(paths, remove=batch.move): ...
+        batch.close()
+    先追加清单再移动文件：中途出错时清单中可能有未移动的条目，恢复和清除时按文件是否存在处理。
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._manifest = open(os.path.join(directory, MANIFEST_NAME), 'a', encoding='utf-8')
+        self._lock = threading.Lock()
+        self._next_index = 0
+        self._shards = set()
+        self.moved_count = 0
+
+    @classmethod
+    def create(cls, root=QUARANTINE_ROOT):
+        directory = os.path.join(root, datetime.now().strftime("%Y%m%d_%H%M%S_%f"))
+        os.makedirs(directory)
+        return cls(directory)
+
+    def move(self, path):
+        """把文件移入本批次 (可在线程池中并行调用)。"""
+        source = os.path.abspath(path)
+        with self._lock:
+            index = self._next_index
+            self._next_index += 1
+            self._manifest.write(json.dumps([index, source], ensure_ascii=False, separators=(",", ":")) + "\n")
+            self._manifest.flush()
+            target = stored_path(self.directory, index, source)
+            shard = os.path.dirname(target)
+            if shard not in self._shards:
+                os.makedirs(shard, exist_ok=True)
+                self._shards.add(shard)
+        os.rename(source, target)
+        with self._lock:
+            self.moved_count += 1
+
+    def close(self):
+        self._manifest.close()
+        if not self.moved_count:
+            shutil.rmtree(self.directory, ignore_errors=True) # 没有移入任何文件的批次不保留
+
+
+def stored_path(directory, index, source):
+    """被隔离文件在批次目录中的位置：编号分组的子目录 + 编号_原文件名 (过长时截断)。"""
+    name = os.path.basename(source)
+    return os.path.join(directory, f"{index // FILES_PER_SHARD:05d}", f"{index:08d}_{name[-100:]}")
+
+
+def read_manifest(directory):
+    """逐条产出批次清单中的 (编号, 原路径)，忽略写了一半的行。"""
+    with open(os.path.join(directory, MANIFEST_NAME), 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                index, source = json.loads(line)
+            except ValueError:
+                continue
+            yield index, source
+
+
+def list_quarantine_batches(root=QUARANTINE_ROOT):
+    """返回隔离目录中的批次 [{"directory", "name", "count"}]，最新的在前。count 为清单中的条目数。"""
+    batches = []
+    try:
+        names = sorted(os.listdir(root), reverse=True)
+    except OSError:
+        return batches
+    for name in names:
+        directory = os.path.join(root, name)
+        manifest = os.path.join(directory, MANIFEST_NAME)
+        if not os.path.isfile(manifest): continue
+        with open(manifest, 'rb') as f:
+            count = sum(1 for _ in f)
+        batches.append({"directory": directory, "name": name, "count": count})
+    return batches
+
+
+def _restore_one(directory, index, source):
+    target = stored_path(directory, index, source)
+    if not os.path.lexists(target):
+        return {"path": source, "status": "missing", "error": None} # 未移入、已恢复或已清除
+    if os.path.lexists(source):
+        return {"path": source, "status": "conflict", "error": "原位置已有同名文件"}
+    try:
+        os.makedirs(os.path.dirname(source), exist_ok=True) # 整目录删除时原目录可能已被删除
+        os.rename(target, source)
+        return {"path": source, "status": "restored", "error": None}
+    except OSError as e:
+        return {"path": source, "status": "failed", "error": str(e)}
+
+
+def restore_batch(directory, workers=DEFAULT_WORKERS, cancel_event=None):
+    """
+    把批次中的文件移回原位置，按完成顺序产出 {"path", "status", "error"}，
+    status 为 restored / conflict (原位置已有文件，保留在隔离区) / missing / failed。
+    批次中不再有文件时删除批次目录。
+    """
+    yield from _run_in_pool(_restore_one, ((directory, index, source) for index, source in read_manifest(directory)),
+                            workers, cancel_event)
+    if not (cancel_event and cancel_event.is_set()) and not _has_stored_files(directory):
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def purge_batch(directory, workers=DEFAULT_WORKERS, cancel_event=None):
+    """
+    彻底删除批次中的文件 (不可恢复)，按完成顺序产出 run_delete 的结果，全部删除后删除批次目录 (含清单)。
+    """
+    scanner = DirectoryScanner(workers=workers)
+    stored = (entry.path for entry in scanner.scan(directory, cancel_event)
+              if entry.directory != directory) # 清单在批次目录的顶层，最后随目录一起删除
+    yield from run_delete(stored, workers, cancel_event)
+    if not (cancel_event and cancel_event.is_set()) and not _has_stored_files(directory):
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def _has_stored_files(directory):
+    """批次目录中是否还有被隔离的文件 (清单除外)。"""
+    for current, _, files in os.walk(directory):
+        if current != directory and files:
+            return True
+    return False
@@ -0,0 +1,164 @@
+# dir_scanner.py
+# 并行递归目录扫描 (无界面)，供 导出目录下文件信息.py 使用
+#
+# - 使用 os.scandir 遍历目录，类型判断直接使用 DirEntry 缓存的结果 (Windows 上 stat 信息也已随目录列表返回)；
+# - 每个目录作为一个任务交给线程池，多个子目录 (网络共享盘上尤其明显) 的列表请求并行进行；
+# - 扫描结果以生成器逐目录产出，调用方可边扫描边写出，内存占用与文件总数无关；
+# - 支持包含/排除通配符 (fnmatch 语法) 和最大递归深度；不进入指向目录的符号链接，避免循环；
+# - 可选的 snapshot (见 inventory_snapshot.py)：目录的修改时间与上次扫描相同时不再列出和 stat 其中的文件，
+#   直接使用快照中的记录。
+import fnmatch
+import os
+import re
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime
+
+DEFAULT_WORKERS = min(32, (os.cpu_count() or 1) + 4) # 与 ThreadPoolExecutor 的默认值一致
+
+# path: 完整路径；directory: 所在目录；name: 文件名；size: 字节数；mtime: 修改时间 (时间戳)
+FileEntry = namedtuple("FileEntry", "path directory name size mtime")
+
+_LIST_FAILED = object() # _scan_directory 的返回值：使用快照时目录无法列出
+
+EXPORT_COLUMNS = ['目录名', '文件名', '文件大小(KB)', '文件类型', '修改日期']
+EXPORT_COLUMN_TYPES = {'文件大小(KB)': float, '文件类型': str} # 没有扩展名的文件类型为空
+
+
+def format_size_kb(size):
+    return round(size / 1024, 2)
+
+
+def format_mtime(mtime):
+    return datetime.fromtimestamp(mtime).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def to_export_row(entry):
+    """把 FileEntry 转为导出表格的一行 (与 EXPORT_COLUMNS 顺序一致)。"""
+    return [
+        entry.directory,
+        entry.name,
+        format_size_kb(entry.size),
+        os.path.splitext(entry.name)[1],
+        format_mtime(entry.mtime),
+    ]
+
+
+def split_patterns(text):
+    """把界面上输入的通配符 (以分号、逗号或空白分隔) 拆分为列表。"""
+    return [pattern for pattern in re.split(r"[;,；，\s]+", text or "") if pattern]
+
+
+def compile_patterns(patterns):
+    """
+    把通配符列表编译为一个正则表达式，没有通配符时返回 None。
+    通配符同时与文件名/目录名和相对于扫描根目录的路径 (以 / 分隔) 比较，任一匹配即可，如 "*.tmp"、"备份/*"。
+    """
+    if not patterns: return None
+    flags = re.IGNORECASE if os.name == "nt" else 0 # 与 fnmatch 在 Windows 上不区分大小写一致
+    return re.compile("|".join(fnmatch.translate(pattern) for pattern in patterns), flags)
+
+
+class DirectoryScanner:
+    """
+    用法:
+        scanner = DirectoryScanner(include=["*.docx"], exclude=[".git", "~$*"], max_depth=None)
+        for entry in scanner.scan(root, cancel_event):
+            ...
+        scanner.errors  # [(路径, 错误信息)]，无法访问的目录/文件不会中断扫描
+    max_depth 为 0 时只扫描根目录本身，None 表示不限深度。
+    include 只作用于文件；exclude 同时作用于文件和目录，被排除的目录不会进入。
+    snapshot 需提供 is_unchanged(目录, mtime_ns) (在线程池中调用)、load_directory(目录) -> (FileEntry 列表, 子目录名列表)、
+    carry_directory(目录) (无法列出的目录，返回值同 load_directory) 和 record_directory(目录, mtime_ns, FileEntry 列表, 子目录名列表)
+    (后三者在迭代 scan() 的线程中调用)。
+    """
+
+    def __init__(self, include=None, exclude=None, max_depth=None, workers=DEFAULT_WORKERS, snapshot=None):
+        self.include = compile_patterns(include)
+        self.exclude = compile_patterns(exclude)
+        self.max_depth = max_depth
+        self.workers = max(1, workers)
+        self.snapshot = snapshot
+        self.errors = []
+        self.dir_count = 0
+        self.file_count = 0
+        self.reused_dir_count = 0 # 按快照跳过的目录数
+
+    def scan(self, roots, cancel_event=None):
+        """按目录完成的顺序逐个产出 FileEntry。roots 可以是一个目录或目录列表。"""
+        if isinstance(roots, (str, os.PathLike)):
+            roots = [roots]
+        todo = deque((os.fspath(root), "", 0) for root in roots)
+        max_in_flight = self.workers * 2
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            pending = {}
+            try:
+                while True:
+                    while todo and len(pending) < max_in_flight and not (cancel_event and cancel_event.is_set()):
+                        task = todo.popleft()
+                        pending[executor.submit(self._scan_directory, *task)] = task
+                    if not pending: break
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        path, relative, depth = pending.pop(future)
+                        files, subdir_names, dir_mtime = future.result()
+                        if files is None:
+                            # 目录未变化：文件和子目录取自快照
+                            files, subdir_names = self.snapshot.load_directory(path)
+                            self.reused_dir_count += 1
+                        elif files is _LIST_FAILED:
+                            # 暂时无法列出 (已记入 errors)：沿用快照中的记录，避免在变化报告中显示为删除
+                            files, subdir_names = self.snapshot.carry_directory(path)
+                        elif self.snapshot is not None and dir_mtime is not None:
+                            self.snapshot.record_directory(path, dir_mtime, files, subdir_names)
+                        self.dir_count += 1
+                        self.file_count += len(files)
+                        todo.extend((os.path.join(path, name), f"{relative}/{name}" if relative else name, depth + 1)
+                                    for name in subdir_names)
+                        yield from files
+            finally:
+                # 调用方提前停止迭代或取消时，不再执行尚未开始的目录任务
+                for future in pending: future.cancel()
+
+    @staticmethod
+    def _matches(regex, name, relative):
+        return regex.match(name) is not None or regex.match(relative) is not None
+
+    def _scan_directory(self, path, relative, depth):
+        """
+        扫描单个目录 (在线程池中执行)，返回 (FileEntry 列表, 待扫描的子目录名列表, 目录的 mtime_ns)。
+        目录与快照中的记录相同时返回 (None, None, mtime_ns)；使用快照时，目录仍存在但无法列出则返回 (_LIST_FAILED, [], None)。
+        """
+        files, subdirs = [], []
+        dir_mtime = None
+        descend = self.max_depth is None or depth < self.max_depth
+        if self.snapshot is not None:
+            # 先取目录的修改时间再列出内容：列出期间发生的变化在下次扫描时仍会被发现
+            try:
+                dir_mtime = os.stat(path).st_mtime_ns
+            except OSError as e:
+                self.errors.append((path, str(e)))
+                return ([], [], None) if isinstance(e, FileNotFoundError) else (_LIST_FAILED, [], None)
+            if self.snapshot.is_unchanged(path, dir_mtime):
+                return None, None, dir_mtime
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    entry_relative = f"{relative}/{entry.name}" if relative else entry.name
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if descend and not (self.exclude and self._matches(self.exclude, entry.name, entry_relative)):
+                                subdirs.append(entry.name)
+                        elif entry.is_file():
+                            if self.include and not self._matches(self.include, entry.name, entry_relative): continue
+                            if self.exclude and self._matches(self.exclude, entry.name, entry_relative): continue
+                            stat = entry.stat()
+                            files.append(FileEntry(entry.path, path, entry.name, stat.st_size, stat.st_mtime))
+                    except OSError as e:
+                        self.errors.append((entry.path, str(e)))
+        except OSError as e:
+            self.errors.append((path, str(e)))
+            if self.snapshot is not None and not isinstance(e, FileNotFoundError):
+                return _LIST_FAILED, [], None # 已列出的部分不完整，改用快照中的记录
+            dir_mtime = None
+        return files, subdirs, dir_mtime
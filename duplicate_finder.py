@@ -0,0 +1,132 @@
+# duplicate_finder.py
+# 查找内容相同的文件 (无界面)，供 导出目录下文件信息.py 使用
+#
+# 逐步缩小候选范围，尽量少读文件内容：
+#   1. 按文件大小分组，大小唯一的文件不可能重复，不读取；
+#   2. 同大小的文件计算“部分哈希” (文件头尾各 PARTIAL_BYTES 字节)；不超过 2*PARTIAL_BYTES 的小文件此时已读完全部内容，
+#      直接得到完整哈希；
+#   3. 部分哈希仍相同的文件才计算完整哈希，每个文件最多完整读取一次。
+# 快照中已有完整哈希 (大小和修改时间未变) 的文件在第 2 步之前取出，不再读取；同大小的组中有这样的文件时，
+# 组内其余文件跳过部分哈希，直接计算完整哈希与之比较。
+# 哈希在线程池中并行计算；完整哈希与 inventory_snapshot.hash_file 相同，可互相复用。
+import hashlib
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from dir_scanner import DEFAULT_WORKERS, format_size_kb, format_mtime
+from inventory_snapshot import hash_file
+
+PARTIAL_BYTES = 64 * 1024
+HASH_BATCH = 256 # 每批提交给线程池的文件数
+DUPLICATE_COLUMNS = ['重复组', '文件数', '目录名', '文件名', '文件大小(KB)', '修改日期', '内容哈希', '可释放空间(KB)']
+DUPLICATE_COLUMN_TYPES = {'文件大小(KB)': float, '可释放空间(KB)': float} # 可释放空间只在每组第一行给出
+
+
+def partial_hash(path, size):
+    """文件头尾各 PARTIAL_BYTES 字节的哈希。"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        digest.update(f.read(PARTIAL_BYTES))
+        f.seek(max(PARTIAL_BYTES, size - PARTIAL_BYTES))
+        digest.update(f.read(PARTIAL_BYTES))
+    return digest.hexdigest()
+
+
+def _first_pass_key(entry):
+    """第 2 步的分组键：小文件为 ("full", 完整哈希)，其余为 ("partial", 部分哈希)；无法读取时为 None。"""
+    try:
+        if entry.size <= 2 * PARTIAL_BYTES:
+            return "full", hash_file(entry.path)
+        return "partial", partial_hash(entry.path, entry.size)
+    except OSError:
+        return None
+
+
+def _full_key(entry):
+    try:
+        return hash_file(entry.path)
+    except OSError:
+        return None
+
+
+class DuplicateFinder:
+    """
+    用法:
+        finder = DuplicateFinder()
+        for entry in scanner.scan(root):
+            finder.add(entry)
+        groups = finder.find()   # [(完整哈希, [FileEntry, ...]), ...]，按可释放空间从大到小排列
+    """
+
+    def __init__(self, min_size=1):
+        self.min_size = min_size # 默认忽略空文件
+        self._by_size = defaultdict(list)
+        self.hashed_count = 0 # 读取过内容的文件数 (部分哈希 + 完整哈希)
+
+    def add(self, entry):
+        if entry.size >= self.min_size:
+            self._by_size[entry.size].append(entry)
+
+    def find(self, workers=DEFAULT_WORKERS, known_hash=None, progress=None, cancel_event=None):
+        """
+        返回重复文件组。known_hash(entry) 可返回已知的完整哈希 (或 None)，在调用线程中执行，有结果的文件不再读取；
+        每完成一批哈希调用 progress(阶段说明, 已完成数, 总数)。cancel_event 置位时返回空列表。
+        """
+        candidates = [group for group in self._by_size.values() if len(group) > 1]
+        self._by_size = defaultdict(list)
+        known = {}
+        if known_hash:
+            for group in candidates:
+                for entry in group:
+                    digest = known_hash(entry)
+                    if digest is not None: known[entry] = digest
+        # 含已知哈希的组不能用部分哈希比较 (已知哈希的文件没有部分哈希)，直接进入第 3 步
+        unknown_groups, known_groups = [], []
+        for group in candidates:
+            (known_groups if any(entry in known for entry in group) else unknown_groups).append(group)
+        groups = []
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            # 第 2 步：部分哈希 (小文件为完整哈希)
+            first_pass = self._regroup(unknown_groups, _first_pass_key, executor, "部分哈希", progress, cancel_event)
+            remaining = []
+            for (kind, digest), group in first_pass:
+                if kind == "full":
+                    groups.append((digest, group))
+                else:
+                    remaining.append(group)
+            # 第 3 步：完整哈希，已知哈希的文件不再读取
+            full_pass = self._regroup(remaining + known_groups, _full_key, executor, "完整哈希", progress, cancel_event,
+                                      known.get)
+            groups.extend(full_pass)
+        if cancel_event and cancel_event.is_set():
+            return []
+        groups.sort(key=lambda item: item[1][0].size * (len(item[1]) - 1), reverse=True)
+        return groups
+
+    def _regroup(self, groups, key_function, executor, stage, progress, cancel_event, known_hash=None):
+        """对每组文件计算分组键，返回同组内键相同且不少于 2 个文件的新组 [(键, [FileEntry, ...])]。"""
+        entries = [(group_index, entry) for group_index, group in enumerate(groups) for entry in group]
+        keys = [known_hash(entry) for _, entry in entries] if known_hash else [None] * len(entries)
+        missing = [i for i, key in enumerate(keys) if key is None]
+        # 所有组的文件合并后分批提交，小组 (常见的 2 个文件) 也能用满线程池
+        for start in range(0, len(missing), HASH_BATCH):
+            if cancel_event and cancel_event.is_set(): return []
+            batch = missing[start:start + HASH_BATCH]
+            for i, key in zip(batch, executor.map(key_function, [entries[i][1] for i in batch])):
+                keys[i] = key
+            self.hashed_count += len(batch)
+            if progress: progress(stage, start + len(batch), len(missing))
+        by_key = defaultdict(list)
+        for (group_index, entry), key in zip(entries, keys):
+            if key is not None: by_key[group_index, key].append(entry) # 无法读取的文件不参与比较
+        return [(key, members) for (_, key), members in by_key.items() if len(members) > 1]
+
+
+def duplicate_rows(groups):
+    """逐行产出重复文件报告 (与 DUPLICATE_COLUMNS 顺序一致)，每组的第一行给出可释放的空间，其余行为 None。"""
+    for group_index, (digest, entries) in enumerate(groups, 1):
+        entries = sorted(entries, key=lambda entry: entry.path)
+        wasted = format_size_kb(entries[0].size * (len(entries) - 1))
+        for i, entry in enumerate(entries):
+            yield [group_index, len(entries), entry.directory, entry.name, format_size_kb(entry.size),
+                   format_mtime(entry.mtime), digest, wasted if i == 0 else None]
@@ -0,0 +1,278 @@
+# export_writer.py
+# 逐行写出的表格导出 (xlsx / csv / parquet)，内存占用与行数无关
+#
+# - xlsx 使用 openpyxl 的只写模式，超过 Excel 单个工作表的行数上限 (1,048,576 行，含表头) 时自动续写到新的工作表；
+# - csv 使用 utf-8-sig 编码 (带 BOM，Excel 直接打开中文不乱码)；
+# - parquet 需要 pyarrow，按 PARQUET_BATCH_ROWS 行一个 row group 写出；列类型可由 column_types 指定，
+#   其余列由第一批数据推断，None 和空字符串写为空值 (null)；
+# - 先写入 .part 临时文件，close() 时才替换为目标文件，出错或 abort() 时不会留下不完整的文件；
+# - add_table() 写出附加的表 (如变化报告)：xlsx 中为同一工作簿的新工作表，csv/parquet 为同目录下的附加文件。
+import csv
+import os
+
+from openpyxl import Workbook
+
+EXCEL_MAX_ROWS = 1048576 # Excel 单个工作表的最大行数 (含表头)
+PARQUET_BATCH_ROWS = 65536
+FORMATS = {".xlsx": "xlsx", ".csv": "csv", ".parquet": "parquet"}
+
+
+class ExportCancelled(Exception):
+    """write_table 在完成前被取消。"""
+
+
+def format_for_path(path):
+    """按扩展名判断导出格式，未知扩展名按 xlsx 处理。"""
+    return FORMATS.get(os.path.splitext(path)[1].lower(), "xlsx")
+
+
+def companion_path(path, title):
+    """附加表的文件名：文件信息.csv -> 文件信息_变化.csv"""
+    base, ext = os.path.splitext(path)
+    return f"{base}_{title}{ext}"
+
+
+def _create_part_file(output_path):
+    """
+    在目标目录中新建唯一的 .part 临时文件，返回 (文件描述符, 路径)。
+    不使用 tempfile.mkstemp：它创建的文件权限固定为 0600，替换为目标文件后其他用户无法读取；这里与直接创建文件一样按 umask 设置权限。
+    """
+    directory = os.path.dirname(os.path.abspath(output_path))
+    flags = os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0)
+    while True:
+        path = os.path.join(directory, f"{os.path.basename(output_path)}.{os.urandom(4).hex()}.part")
+        try:
+            return os.open(path, flags, 0o666), path
+        except FileExistsError:
+            continue
+
+
+class TableWriter:
+    """
+    用法:
+        with open_table_writer(path, columns) as writer:
+            for row in rows:
+                writer.write_row(row)
+    row 可以是与 columns 顺序一致的序列，也可以是以列名为键的字典 (缺少的列为 None)；None 写为空单元格/空值。
+    column_types 为 {列名: int/float/str}，只有 parquet 使用 (数值列中有空值时应指定，见 ParquetTableWriter)。
+    with 块内发生异常时删除临时文件，不生成目标文件。
+    """
+
+    def __init__(self, output_path, columns, column_types=None):
+        self.output_path = output_path
+        self.columns = list(columns)
+        self.column_types = dict(column_types or {})
+        self.row_count = 0
+        # 临时文件名唯一，多个导出同时写同名文件时互不干扰
+        fd, self._temp_path = _create_part_file(output_path)
+        os.close(fd)
+        self._closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+    def write_row(self, row):
+        if isinstance(row, dict):
+            row = [row.get(column) for column in self.columns]
+        self._write(row)
+        self.row_count += 1
+
+    def write_rows(self, rows):
+        for row in rows:
+            self.write_row(row)
+
+    def add_table(self, title, columns, rows, column_types=None):
+        """写出一个附加表，返回 (写入位置, 行数)。默认写为同格式的附加文件。"""
+        path = companion_path(self.output_path, title)
+        return path, write_table(path, columns, rows, self.format, column_types=column_types)
+
+    def close(self):
+        """写完剩余数据并替换为目标文件。"""
+        if self._closed: return
+        try:
+            self._finish()
+        except BaseException:
+            self.abort()
+            raise
+        self._closed = True
+        os.replace(self._temp_path, self.output_path)
+
+    def abort(self):
+        if self._closed: return
+        self._closed = True
+        try:
+            self._discard()
+        finally:
+            try:
+                os.remove(self._temp_path)
+            except OSError:
+                pass
+
+    def _write(self, row):
+        raise NotImplementedError
+
+    def _finish(self):
+        raise NotImplementedError
+
+    def _discard(self):
+        pass
+
+
+class XlsxTableWriter(TableWriter):
+    format = "xlsx"
+
+    def __init__(self, output_path, columns, sheet_name="Sheet1", max_rows_per_sheet=EXCEL_MAX_ROWS, column_types=None):
+        super().__init__(output_path, columns, column_types)
+        self.max_rows_per_sheet = max_rows_per_sheet
+        self.sheet_count = 0
+        self._workbook = Workbook(write_only=True)
+        self._start_table(sheet_name, self.columns)
+
+    def _start_table(self, title, columns):
+        self._table_title, self._table_columns, self._table_part = title, list(columns), 0
+        self._new_sheet()
+
+    def _new_sheet(self):
+        self._table_part += 1
+        self.sheet_count += 1
+        title = self._table_title if self._table_part == 1 else f"{self._table_title} ({self._table_part})"
+        self._sheet = self._workbook.create_sheet(title[:31]) # 工作表名最长 31 个字符
+        self._sheet.append(self._table_columns)
+        self._sheet_rows = 1
+
+    def _write(self, row):
+        if self._sheet_rows >= self.max_rows_per_sheet:
+            self._new_sheet()
+        self._sheet.append(row)
+        self._sheet_rows += 1
+
+    def add_table(self, title, columns, rows, column_types=None):
+        """在同一工作簿中新建工作表写出附加表 (同样按行数上限分表)，须在主表写完之后调用。"""
+        self._start_table(title, columns)
+        count = 0
+        for row in rows:
+            if isinstance(row, dict):
+                row = [row.get(column) for column in self._table_columns]
+            self._write(row)
+            count += 1
+        return self.output_path, count
+
+    def _finish(self):
+        self._workbook.save(self._temp_path)
+
+    def _discard(self):
+        # 结束各工作表的写出流，并删除 openpyxl 为只写工作表创建的临时文件
+        for sheet in self._workbook.worksheets:
+            if not sheet.closed:
+                sheet.close()
+            writer = getattr(sheet, "_writer", None)
+            if writer is not None:
+                try:
+                    writer.cleanup()
+                except (OSError, ValueError):
+                    pass
+
+
+class CsvTableWriter(TableWriter):
+    format = "csv"
+
+    def __init__(self, output_path, columns, column_types=None):
+        super().__init__(output_path, columns, column_types)
+        self._file = open(self._temp_path, 'w', encoding='utf-8-sig', newline='')
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(self.columns)
+
+    def _write(self, row):
+        self._writer.writerow(row)
+
+    def _finish(self):
+        self._file.close()
+
+    def _discard(self):
+        self._file.close()
+
+
+class ParquetTableWriter(TableWriter):
+    """
+    parquet 的列类型在写出第一批数据时确定：column_types 中指定的列使用指定类型，其余列按第一批数据推断。
+    None 和空字符串写为空值；可能在第一批中全为空、或与其他值类型不同的列应在 column_types 中指定。
+    """
+    format = "parquet"
+
+    def __init__(self, output_path, columns, batch_rows=PARQUET_BATCH_ROWS, column_types=None):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError("导出 Parquet 文件需要安装 pyarrow (pip install pyarrow)")
+        self._pa, self._pq = pyarrow, pyarrow.parquet
+        super().__init__(output_path, columns, column_types)
+        arrow_types = {int: pyarrow.int64(), float: pyarrow.float64(), str: pyarrow.string()}
+        self._types = [arrow_types[self.column_types[column]] if column in self.column_types else None
+                       for column in self.columns]
+        self.batch_rows = batch_rows
+        self._batch = []
+        self._writer = None
+
+    def _write(self, row):
+        self._batch.append(row)
+        if len(self._batch) >= self.batch_rows:
+            self._flush()
+
+    def _flush(self):
+        if not self._batch and self._writer is not None: return
+        arrays = ([[None if value == "" else value for value in values] for values in zip(*self._batch)] if self._batch
+                  else [[] for _ in self.columns])
+        if self._writer is None:
+            table = self._pa.Table.from_arrays(
+                [self._pa.array(values, type=arrow_type) for values, arrow_type in zip(arrays, self._types)], names=self.columns)
+            self._writer = self._pq.ParquetWriter(self._temp_path, table.schema)
+        else:
+            schema = self._writer.schema
+            table = self._pa.Table.from_arrays(
+                [self._pa.array(values, type=schema.field(i).type) for i, values in enumerate(arrays)], schema=schema)
+        self._writer.write_table(table)
+        self._batch = []
+
+    def _finish(self):
+        self._flush()
+        self._writer.close()
+
+    def _discard(self):
+        if self._writer is not None:
+            self._writer.close()
+
+
+def open_table_writer(output_path, columns, fmt=None, sheet_name="Sheet1", column_types=None):
+    """按格式 (xlsx / csv / parquet，默认按扩展名判断) 创建逐行写出的 TableWriter。"""
+    fmt = fmt or format_for_path(output_path)
+    if fmt == "xlsx":
+        return XlsxTableWriter(output_path, columns, sheet_name, column_types=column_types)
+    if fmt == "csv":
+        return CsvTableWriter(output_path, columns, column_types)
+    if fmt == "parquet":
+        return ParquetTableWriter(output_path, columns, column_types=column_types)
+    raise ValueError(f"不支持的导出格式: {fmt}")
+
+
+def write_table(output_path, columns, rows, fmt=None, sheet_name="Sheet1", progress=None, cancel_event=None,
+                progress_every=1000, column_types=None):
+    """
+    把 rows (可以是生成器) 逐行写入 output_path，返回写出的行数。
+    每写出 progress_every 行调用 progress(已写行数)；cancel_event 置位后删除临时文件并抛出 ExportCancelled。
+    """
+    with open_table_writer(output_path, columns, fmt, sheet_name, column_types) as writer:
+        for row in rows:
+            if cancel_event is not None and cancel_event.is_set():
+                raise ExportCancelled(output_path)
+            writer.write_row(row)
+            if progress and writer.row_count % progress_every == 0:
+                progress(writer.row_count)
+    return writer.row_count
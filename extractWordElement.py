@@ -2,8 +2,8 @@ import win32com.client
 import os
 from PIL import ImageGrab
 import pythoncom
-import pandas as pd
 import re
+from export_writer import open_table_writer
 
 # (Constants and other helper functions remain the same)
 WD_OUTLINE_LEVEL_BODY_TEXT = 10
@@ -355,8 +355,9 @@ def parse_word_document(doc_path, image_output_dir="word_images"): # Same as bef
     return output_elements
 
 # --- save_elements_to_excel --- (No changes)
-def save_elements_to_excel(elements_list, excel_filepath, document_id): # Same as previous correct version
-    excel_data = []
+EXCEL_COLUMNS = ["file_record_id", "element_type", "content_id", "text_content", "level", "pageNo"]
+
+def _excel_rows(elements_list, document_id):
     content_item_id = 0
 
     for elem_idx, elem in enumerate(elements_list):
@@ -382,15 +383,13 @@ def save_elements_to_excel(elements_list, excel_filepath, document_id): # Same a
             "level": level_val if level_val is not None else "",
             "pageNo": page_no_val if page_no_val is not None else ""
         }
-        excel_data.append(row)
+        yield row
 
-    if not excel_data: print("No data to save to Excel."); return
-    df = pd.DataFrame(excel_data)
-    try:
-        df = df[["file_record_id", "element_type", "content_id", "text_content", "level", "pageNo"]]
-    except KeyError as e_key: print(f"[WARNING] Excel column reorder failed: {e_key}.")
+def save_elements_to_excel(elements_list, excel_filepath, document_id): # Rows are streamed to a write-only workbook
+    if not elements_list: print("No data to save to Excel."); return
     try:
-        df.to_excel(excel_filepath, index=False, engine='openpyxl')
+        with open_table_writer(excel_filepath, EXCEL_COLUMNS) as writer:
+            writer.write_rows(_excel_rows(elements_list, document_id))
         print(f"\n[SUCCESS] Extracted data saved to: {os.path.abspath(excel_filepath)}")
     except Exception as e: print(f"\n[ERROR] Could not save Excel: {e}"); import traceback; traceback.print_exc()
 
@@ -295,7 +295,8 @@ def run_extraction(doc_path, file_record_id, image_dir_unused):
         pythoncom.CoInitialize()
         coinitialized = True
         logging.debug("COM 已初始化。")
-        word_app = win32com.client.Dispatch("Word.Application")
+        # DispatchEx 启动独立的 Word 实例，并发任务之间 Quit() 不会互相影响
+        word_app = win32com.client.DispatchEx("Word.Application")
         word_app.Visible = False
         word_app.DisplayAlerts = 0
 
@@ -1,8 +1,18 @@
 import pandas as pd
+import numpy as np
 import json
-import win32com.client
-# import win32com.client.constants as wdConstants # REMOVED THIS LINE
 import os
+import argparse
+from collections import defaultdict
+from docx import Document
+from docx.shared import RGBColor
+from docx.oxml import OxmlElement
+from docx.oxml.ns import qn
+try:
+    import win32com.client
+    # import win32com.client.constants as wdConstants # REMOVED THIS LINE
+except ImportError: # Linux 等无 Word 的环境只能使用 --headless 渲染
+    win32com = None
 
 # --- LCS 和对齐函数 (保持不变) ---
 def _calculate_lcs_and_reconstruct(s1: str, s2: str) -> tuple[str, int]:
@@ -55,55 +65,145 @@ STATUS_TRANSLATION = {
     "accepted-edited": "已手动修改"
 }
 
-# --- 主逻辑 ---
-def main():
+# --- Excel 缓存 ---
+# 首次读取 Excel 后以 Parquet 形式缓存（保留列类型），源文件的大小和修改时间
+# 写入缓存文件名，源文件变化后自动失效，重复运行时不再经过 openpyxl 解析。
+EXCEL_CACHE_DIR = ".excel_cache"
+EXCEL_TEXT_COLUMNS = ("text_content",) # 混合类型的文本列，缓存前统一转换为 str
+
+def _excel_cache_path(excel_path, cache_dir):
+    stat = os.stat(excel_path)
+    stem = os.path.splitext(os.path.basename(excel_path))[0]
+    return os.path.join(cache_dir, f"{stem}.{stat.st_size}-{stat.st_mtime_ns}.parquet")
+
+def load_excel_cached(excel_path, cache_dir=EXCEL_CACHE_DIR):
+    """读取 Excel，优先使用 Parquet 缓存；缺少 pyarrow 等引擎时退回直接读取 Excel。"""
+    cache_path = _excel_cache_path(excel_path, cache_dir)
+    if os.path.exists(cache_path):
+        try:
+            return pd.read_parquet(cache_path)
+        except Exception as e:
+            print(f"警告：读取缓存 {cache_path} 失败，将重新解析 Excel - {e}")
+
+    df = pd.read_excel(excel_path)
+    for col in EXCEL_TEXT_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].fillna('').astype(str)
+
     try:
-        wca_df = pd.read_excel("word_content_analysis.xlsx")
-        dc_df = pd.read_excel("document_contents.xlsx")
-        dcc_df = pd.read_excel("document_content_chunks.xlsx")
-    except FileNotFoundError as e:
-        print(f"错误：找不到 Excel 文件 - {e}")
-        return
+        os.makedirs(cache_dir, exist_ok=True)
+        stem = os.path.splitext(os.path.basename(excel_path))[0]
+        for old_name in os.listdir(cache_dir): # 清理同一源文件的旧缓存
+            if old_name.startswith(f"{stem}.") and old_name.endswith(".parquet"):
+                os.remove(os.path.join(cache_dir, old_name))
+        df.to_parquet(cache_path, index=False)
     except Exception as e:
-        print(f"读取 Excel 文件时出错：{e}")
-        return
+        print(f"警告：无法写入 Parquet 缓存 ({excel_path}) - {e}")
+    return df
 
-    wca_paragraphs = wca_df[wca_df['element_type'] == 'paragraph'].copy()
-    dc_paragraphs = dc_df[dc_df['element_type'] == 'paragraph'].copy()
+def _parse_suggestions(dcc_df):
+    """解析 document_content_chunks 中的 ai_content，按 材料id 分组建立索引。"""
+    suggestions_by_material = defaultdict(list)
+    ai_contents = dcc_df['ai_content'].tolist()
+    chunk_ids = dcc_df['id'].tolist() if 'id' in dcc_df.columns else ['N/A'] * len(ai_contents)
 
-    wca_paragraphs['text_content'] = wca_paragraphs['text_content'].fillna('').astype(str)
-    dc_paragraphs['text_content'] = dc_paragraphs['text_content'].fillna('').astype(str)
-    
-    all_suggestions = []
-    for _, row in dcc_df.iterrows():
+    for chunk_id, suggestions_json in zip(chunk_ids, ai_contents):
         try:
-            if pd.notna(row['ai_content']):
-                suggestions_json = row['ai_content']
+            if pd.notna(suggestions_json):
                 # Sometimes the JSON might be a string representation of a list of strings,
                 # instead of a list of dicts. Add a check.
                 if isinstance(suggestions_json, str):
                     try:
                         suggestions = json.loads(suggestions_json)
                     except json.JSONDecodeError as e_inner:
-                        print(f"警告：内部 JSON 解析 'ai_content' 失败 (id: {row.get('id', 'N/A')}) - {e_inner}. 内容: {suggestions_json}")
+                        print(f"警告：内部 JSON 解析 'ai_content' 失败 (id: {chunk_id}) - {e_inner}. 内容: {suggestions_json}")
                         continue # Skip this row if inner parsing fails
                 elif isinstance(suggestions_json, (list, dict)): # Already parsed by pandas? Unlikely for complex JSON.
                     suggestions = suggestions_json
                 else:
-                    print(f"警告：'ai_content' 具有意外类型 (id: {row.get('id', 'N/A')}) - type: {type(suggestions_json)}. 内容: {suggestions_json}")
+                    print(f"警告：'ai_content' 具有意外类型 (id: {chunk_id}) - type: {type(suggestions_json)}. 内容: {suggestions_json}")
                     continue
 
                 if isinstance(suggestions, list):
                     for sugg in suggestions:
                         if isinstance(sugg, dict) and '材料id' in sugg:
-                             all_suggestions.append(sugg)
+                            suggestions_by_material[sugg['材料id']].append(sugg)
             else:
-                print(f"警告：在 document_content_chunks.xlsx 中发现空的 'ai_content' (id: {row.get('id', 'N/A')})")
-        except json.JSONDecodeError as e: # This handles if json.loads(row['ai_content']) fails directly
-            print(f"警告：解析 'ai_content' JSON 失败 (id: {row.get('id', 'N/A')}) - {e}. 内容: {row['ai_content']}")
+                print(f"警告：在 document_content_chunks.xlsx 中发现空的 'ai_content' (id: {chunk_id})")
         except TypeError as e:
-            print(f"警告：'ai_content' 类型错误 (id: {row.get('id', 'N/A')}) - {e}. 内容: {row['ai_content']}")
+            print(f"警告：'ai_content' 类型错误 (id: {chunk_id}) - {e}. 内容: {suggestions_json}")
+    return suggestions_by_material
+
+def _find_best_matches(source_texts, target_texts, target_ids, threshold=0.75):
+    """
+    为每个源段落找到相似度最高的目标段落，返回 (源下标, 目标下标) 列表。
+    相似度 2*LCS/(n+m) 不会超过 2*min(n,m)/(n+m)，先用长度数组向量化算出上界，
+    上界达不到阈值或当前最优值的候选直接跳过，结果与逐一比较完全一致。
+    """
+    target_lens = np.fromiter((len(t) for t in target_texts), dtype=np.int64, count=len(target_texts))
+    matches = []
+    for src_idx, source_text in enumerate(source_texts):
+        n = len(source_text)
+        total = n + target_lens
+        with np.errstate(divide='ignore', invalid='ignore'):
+            upper_bounds = np.where(total == 0, 1.0, 2.0 * np.minimum(n, target_lens) / total)
+        candidates = np.flatnonzero(upper_bounds >= threshold)
+
+        best_target_idx = None
+        max_similarity = 0.0
+        for tgt_idx in candidates:
+            if upper_bounds[tgt_idx] <= max_similarity:
+                continue
+            _, _, similarity = get_alignment_details(source_text, target_texts[tgt_idx])
+            if similarity >= threshold and similarity > max_similarity:
+                max_similarity = similarity
+                best_target_idx = tgt_idx
+
+        if best_target_idx is not None and target_ids[best_target_idx]:
+            matches.append((src_idx, best_target_idx))
+    return matches
+
+# --- 建议条目 ---
+def build_advice_entries():
+    """读取三个 Excel 并完成段落匹配，返回按输出顺序排列的建议条目列表；读取失败时返回 None。"""
+    try:
+        wca_df = load_excel_cached("word_content_analysis.xlsx")
+        dc_df = load_excel_cached("document_contents.xlsx")
+        dcc_df = load_excel_cached("document_content_chunks.xlsx")
+    except FileNotFoundError as e:
+        print(f"错误：找不到 Excel 文件 - {e}")
+        return None
+    except Exception as e:
+        print(f"读取 Excel 文件时出错：{e}")
+        return None
+
+    wca_paragraphs = wca_df[wca_df['element_type'] == 'paragraph']
+    dc_paragraphs = dc_df[dc_df['element_type'] == 'paragraph']
+
+    wca_texts = wca_paragraphs['text_content'].fillna('').astype(str).tolist()
+    wca_pages = wca_paragraphs['pageNo'].tolist()
+    dc_texts = dc_paragraphs['text_content'].fillna('').astype(str).tolist()
+    dc_content_ids = dc_paragraphs['content_id'].tolist()
 
+    suggestions_by_material = _parse_suggestions(dcc_df)
+    matches = _find_best_matches(wca_texts, dc_texts, dc_content_ids)
+
+    entries = []
+    for src_idx, tgt_idx in matches:
+        for sugg_data in suggestions_by_material.get(dc_content_ids[tgt_idx], []):
+            json_status_raw = str(sugg_data.get('status', 'N/A'))
+            entries.append({
+                "page_no": wca_pages[src_idx],
+                "doc_text": dc_texts[tgt_idx],
+                "original": str(sugg_data.get('原始内容', '')),
+                "modified": str(sugg_data.get('修改后内容', '')),
+                "status": STATUS_TRANSLATION.get(json_status_raw, json_status_raw),
+                "reason": str(sugg_data.get('出错原因', '无原因说明')),
+            })
+    return entries
+
+# --- 渲染：Word COM ---
+def render_advice_list_with_word(entries, full_output_path):
     try:
         word_app = win32com.client.Dispatch("Word.Application")
         word_app.Visible = False
@@ -114,131 +214,105 @@ def main():
 
     first_suggestion_written = False
 
-    for index, wca_row in wca_paragraphs.iterrows():
-        source_text = wca_row['text_content']
-        page_no = wca_row['pageNo']
-
-        best_match_content_id = None
-        best_match_dc_text = ""
-        max_similarity = 0.0
-
-        for _, dc_row in dc_paragraphs.iterrows():
-            target_text = dc_row['text_content']
-            _, _, similarity = get_alignment_details(source_text, target_text)
-            if similarity >= 0.75 and similarity > max_similarity:
-                max_similarity = similarity
-                best_match_content_id = dc_row['content_id']
-                best_match_dc_text = target_text
-
-        if not best_match_content_id:
-            continue
+    for entry in entries:
+        page_no = entry["page_no"]
+        best_match_dc_text = entry["doc_text"]
+        json_original_content = entry["original"]
+        json_modified_content = entry["modified"]
+        translated_status = entry["status"]
+        json_reason = entry["reason"]
+
+        if first_suggestion_written:
+            hr_para = doc.Paragraphs.Add()
+            try:
+                hr_para.Range.InsertHorizontalLine()
+            except:
+                hr_para.Range.Text = "------------------------------------------------------------\n"
+        else:
+            first_suggestion_written = True
         
-        relevant_suggestions = [sugg for sugg in all_suggestions if sugg.get('材料id') == best_match_content_id]
-
-        if not relevant_suggestions:
-            continue
+        para_page = doc.Paragraphs.Add().Range
+        para_page.Text = f"页码：{page_no}\n"
         
-        for sugg_data in relevant_suggestions:
-            json_original_content = str(sugg_data.get('原始内容', ''))
-            json_modified_content = str(sugg_data.get('修改后内容', ''))
-            json_status_raw = str(sugg_data.get('status', 'N/A'))
-            json_reason = str(sugg_data.get('出错原因', '无原因说明'))
-
-            translated_status = STATUS_TRANSLATION.get(json_status_raw, json_status_raw)
-
-            if first_suggestion_written:
-                hr_para = doc.Paragraphs.Add()
-                try:
-                    hr_para.Range.InsertHorizontalLine()
-                except:
-                    hr_para.Range.Text = "------------------------------------------------------------\n"
-            else:
-                first_suggestion_written = True
-            
-            para_page = doc.Paragraphs.Add().Range
-            para_page.Text = f"页码：{page_no}\n"
-            
-            para_content_header = doc.Paragraphs.Add().Range
-            para_content_header.Text = "原始内容：" 
-            
-            current_inline_range = doc.Paragraphs.Last.Range
-            current_inline_range.Collapse(WD_COLLAPSE_END) # Use defined constant
-
-            original_doc_content_str = str(best_match_dc_text) if pd.notna(best_match_dc_text) else ""
-
-            if json_original_content and json_original_content in original_doc_content_str:
-                start_index = original_doc_content_str.find(json_original_content)
-                end_index = start_index + len(json_original_content)
-
-                part_before = original_doc_content_str[:start_index]
-                part_to_mark = original_doc_content_str[start_index:end_index]
-                part_after = original_doc_content_str[end_index:]
-
-                current_inline_range.InsertAfter(part_before)
-                current_inline_range.Collapse(WD_COLLAPSE_END)
-
-                current_inline_range.InsertAfter(part_to_mark)
-                rng_delete = doc.Range(current_inline_range.End - len(part_to_mark), current_inline_range.End)
-                rng_delete.Font.Color = WD_COLOR_RED
-                rng_delete.Font.StrikeThrough = True
-                current_inline_range.Collapse(WD_COLLAPSE_END)
-
-                current_inline_range.InsertAfter(json_modified_content)
-                rng_add = doc.Range(current_inline_range.End - len(json_modified_content), current_inline_range.End)
-                rng_add.Font.Color = WD_COLOR_DARK_GREEN
-                rng_add.Shading.BackgroundPatternColor = WD_COLOR_LIGHT_GREEN_BG
-                rng_add.Font.StrikeThrough = False
-                current_inline_range.Collapse(WD_COLLAPSE_END)
-
-                status_text_formatted = f"【{translated_status}】"
-                current_inline_range.InsertAfter(status_text_formatted)
-                rng_status = doc.Range(current_inline_range.End - len(status_text_formatted), current_inline_range.End)
-                rng_status.Font.ColorIndex = WD_COLOR_INDEX_AUTO # Use defined constant
-                rng_status.Shading.BackgroundPatternColorIndex = WD_NO_HIGHLIGHT # Use defined constant
-                rng_status.Font.StrikeThrough = False
-                current_inline_range.Collapse(WD_COLLAPSE_END)
-                
-                current_inline_range.InsertAfter(part_after)
-                # Only apply default formatting if part_after is not empty
-                if part_after:
-                    rng_part_after = doc.Range(current_inline_range.End - len(part_after), current_inline_range.End)
-                    rng_part_after.Font.ColorIndex = WD_COLOR_INDEX_AUTO
-                    rng_part_after.Shading.BackgroundPatternColorIndex = WD_NO_HIGHLIGHT
-                    rng_part_after.Font.StrikeThrough = False
-                current_inline_range.Collapse(WD_COLLAPSE_END)
-
-            else: 
-                print(f"警告：JSON中的“原始内容” ('{json_original_content}') 未在文档原始内容 ('{original_doc_content_str[:50]}...') 中找到。将仅附加建议。")
-                current_inline_range.InsertAfter(original_doc_content_str)
-                current_inline_range.Collapse(WD_COLLAPSE_END)
-
-                current_inline_range.InsertAfter(" （建议修改为：") 
-                current_inline_range.Collapse(WD_COLLAPSE_END)
-                current_inline_range.InsertAfter(json_modified_content)
-                rng_add_fallback = doc.Range(current_inline_range.End - len(json_modified_content), current_inline_range.End)
-                rng_add_fallback.Font.Color = WD_COLOR_DARK_GREEN
-                rng_add_fallback.Shading.BackgroundPatternColor = WD_COLOR_LIGHT_GREEN_BG
-                rng_add_fallback.Font.StrikeThrough = False
-                current_inline_range.Collapse(WD_COLLAPSE_END)
-                current_inline_range.InsertAfter("）")
-                current_inline_range.Collapse(WD_COLLAPSE_END)
-
-                status_text_formatted = f"【{translated_status}】"
-                current_inline_range.InsertAfter(status_text_formatted)
-                rng_status_fallback = doc.Range(current_inline_range.End - len(status_text_formatted), current_inline_range.End)
-                rng_status_fallback.Font.ColorIndex = WD_COLOR_INDEX_AUTO
-                rng_status_fallback.Shading.BackgroundPatternColorIndex = WD_NO_HIGHLIGHT
-                rng_status_fallback.Font.StrikeThrough = False
-                current_inline_range.Collapse(WD_COLLAPSE_END)
+        para_content_header = doc.Paragraphs.Add().Range
+        para_content_header.Text = "原始内容：" 
+        
+        current_inline_range = doc.Paragraphs.Last.Range
+        current_inline_range.Collapse(WD_COLLAPSE_END) # Use defined constant
+
+        original_doc_content_str = str(best_match_dc_text) if pd.notna(best_match_dc_text) else ""
+
+        if json_original_content and json_original_content in original_doc_content_str:
+            start_index = original_doc_content_str.find(json_original_content)
+            end_index = start_index + len(json_original_content)
+
+            part_before = original_doc_content_str[:start_index]
+            part_to_mark = original_doc_content_str[start_index:end_index]
+            part_after = original_doc_content_str[end_index:]
+
+            current_inline_range.InsertAfter(part_before)
+            current_inline_range.Collapse(WD_COLLAPSE_END)
+
+            current_inline_range.InsertAfter(part_to_mark)
+            rng_delete = doc.Range(current_inline_range.End - len(part_to_mark), current_inline_range.End)
+            rng_delete.Font.Color = WD_COLOR_RED
+            rng_delete.Font.StrikeThrough = True
+            current_inline_range.Collapse(WD_COLLAPSE_END)
+
+            current_inline_range.InsertAfter(json_modified_content)
+            rng_add = doc.Range(current_inline_range.End - len(json_modified_content), current_inline_range.End)
+            rng_add.Font.Color = WD_COLOR_DARK_GREEN
+            rng_add.Shading.BackgroundPatternColor = WD_COLOR_LIGHT_GREEN_BG
+            rng_add.Font.StrikeThrough = False
+            current_inline_range.Collapse(WD_COLLAPSE_END)
+
+            status_text_formatted = f"【{translated_status}】"
+            current_inline_range.InsertAfter(status_text_formatted)
+            rng_status = doc.Range(current_inline_range.End - len(status_text_formatted), current_inline_range.End)
+            rng_status.Font.ColorIndex = WD_COLOR_INDEX_AUTO # Use defined constant
+            rng_status.Shading.BackgroundPatternColorIndex = WD_NO_HIGHLIGHT # Use defined constant
+            rng_status.Font.StrikeThrough = False
+            current_inline_range.Collapse(WD_COLLAPSE_END)
             
-            current_inline_range.InsertAfter("\n")
+            current_inline_range.InsertAfter(part_after)
+            # Only apply default formatting if part_after is not empty
+            if part_after:
+                rng_part_after = doc.Range(current_inline_range.End - len(part_after), current_inline_range.End)
+                rng_part_after.Font.ColorIndex = WD_COLOR_INDEX_AUTO
+                rng_part_after.Shading.BackgroundPatternColorIndex = WD_NO_HIGHLIGHT
+                rng_part_after.Font.StrikeThrough = False
+            current_inline_range.Collapse(WD_COLLAPSE_END)
+
+        else: 
+            print(f"警告：JSON中的“原始内容” ('{json_original_content}') 未在文档原始内容 ('{original_doc_content_str[:50]}...') 中找到。将仅附加建议。")
+            current_inline_range.InsertAfter(original_doc_content_str)
+            current_inline_range.Collapse(WD_COLLAPSE_END)
+
+            current_inline_range.InsertAfter(" （建议修改为：") 
+            current_inline_range.Collapse(WD_COLLAPSE_END)
+            current_inline_range.InsertAfter(json_modified_content)
+            rng_add_fallback = doc.Range(current_inline_range.End - len(json_modified_content), current_inline_range.End)
+            rng_add_fallback.Font.Color = WD_COLOR_DARK_GREEN
+            rng_add_fallback.Shading.BackgroundPatternColor = WD_COLOR_LIGHT_GREEN_BG
+            rng_add_fallback.Font.StrikeThrough = False
+            current_inline_range.Collapse(WD_COLLAPSE_END)
+            current_inline_range.InsertAfter("）")
+            current_inline_range.Collapse(WD_COLLAPSE_END)
+
+            status_text_formatted = f"【{translated_status}】"
+            current_inline_range.InsertAfter(status_text_formatted)
+            rng_status_fallback = doc.Range(current_inline_range.End - len(status_text_formatted), current_inline_range.End)
+            rng_status_fallback.Font.ColorIndex = WD_COLOR_INDEX_AUTO
+            rng_status_fallback.Shading.BackgroundPatternColorIndex = WD_NO_HIGHLIGHT
+            rng_status_fallback.Font.StrikeThrough = False
+            current_inline_range.Collapse(WD_COLLAPSE_END)
+        
+        current_inline_range.InsertAfter("\n")
 
-            para_reason = doc.Paragraphs.Add().Range 
-            para_reason.Text = f"原因：{json_reason}\n"
+        para_reason = doc.Paragraphs.Add().Range 
+        para_reason.Text = f"原因：{json_reason}\n"
 
 
-    output_filename = "审校建议清单_v3.docx" 
-    full_output_path = os.path.abspath(output_filename)
     try:
         doc.SaveAs(full_output_path)
         print(f"审校建议清单已保存到: {full_output_path}")
@@ -254,5 +328,91 @@ def main():
         if 'doc' in locals(): del doc
         if 'word_app' in locals(): del word_app
 
+# --- 渲染：python-docx (无需 Word，可在 Linux 上批量生成) ---
+def _word_color_to_hex(word_color):
+    """Word 的颜色值按 BGR 排列 (R + G*256 + B*65536)，转换为 docx 使用的 RRGGBB。"""
+    r, g, b = word_color & 0xFF, (word_color >> 8) & 0xFF, (word_color >> 16) & 0xFF
+    return f"{r:02X}{g:02X}{b:02X}"
+
+def _add_run(paragraph, text, color=None, strike=False, shading=None):
+    if not text:
+        return None
+    run = paragraph.add_run(text)
+    if color is not None:
+        run.font.color.rgb = RGBColor.from_string(_word_color_to_hex(color))
+    if strike:
+        run.font.strike = True
+    if shading is not None:
+        shd = OxmlElement('w:shd')
+        shd.set(qn('w:val'), 'clear')
+        shd.set(qn('w:color'), 'auto')
+        shd.set(qn('w:fill'), _word_color_to_hex(shading))
+        run._r.get_or_add_rPr().append(shd)
+    return run
+
+def _add_horizontal_rule(document):
+    paragraph = document.add_paragraph()
+    p_bdr = OxmlElement('w:pBdr')
+    bottom = OxmlElement('w:bottom')
+    bottom.set(qn('w:val'), 'single')
+    bottom.set(qn('w:sz'), '6')
+    bottom.set(qn('w:space'), '1')
+    bottom.set(qn('w:color'), 'auto')
+    p_bdr.append(bottom)
+    paragraph._p.get_or_add_pPr().append(p_bdr)
+
+def render_advice_list_with_docx(entries, full_output_path):
+    """与 Word COM 版本相同的版式，直接用 python-docx 一次性写出 docx。"""
+    document = Document()
+    for idx, entry in enumerate(entries):
+        if idx > 0:
+            _add_horizontal_rule(document)
+
+        document.add_paragraph(f"页码：{entry['page_no']}")
+
+        content_para = document.add_paragraph("原始内容：")
+        doc_text = entry["doc_text"]
+        json_original_content = entry["original"]
+        status_text_formatted = f"【{entry['status']}】"
+
+        if json_original_content and json_original_content in doc_text:
+            start_index = doc_text.find(json_original_content)
+            end_index = start_index + len(json_original_content)
+            _add_run(content_para, doc_text[:start_index])
+            _add_run(content_para, doc_text[start_index:end_index], color=WD_COLOR_RED, strike=True)
+            _add_run(content_para, entry["modified"], color=WD_COLOR_DARK_GREEN, shading=WD_COLOR_LIGHT_GREEN_BG)
+            _add_run(content_para, status_text_formatted)
+            _add_run(content_para, doc_text[end_index:])
+        else:
+            print(f"警告：JSON中的“原始内容” ('{json_original_content}') 未在文档原始内容 ('{doc_text[:50]}...') 中找到。将仅附加建议。")
+            _add_run(content_para, doc_text)
+            _add_run(content_para, " （建议修改为：")
+            _add_run(content_para, entry["modified"], color=WD_COLOR_DARK_GREEN, shading=WD_COLOR_LIGHT_GREEN_BG)
+            _add_run(content_para, "）")
+            _add_run(content_para, status_text_formatted)
+
+        document.add_paragraph(f"原因：{entry['reason']}")
+
+    try:
+        document.save(full_output_path)
+        print(f"审校建议清单已保存到: {full_output_path}")
+    except Exception as e:
+        print(f"保存 Word 文档失败: {e}")
+
+# --- 主逻辑 ---
+def main(headless=False):
+    entries = build_advice_entries()
+    if entries is None:
+        return
+
+    output_filename = "审校建议清单_v3.docx" 
+    full_output_path = os.path.abspath(output_filename)
+    if headless or win32com is None:
+        render_advice_list_with_docx(entries, full_output_path)
+    else:
+        render_advice_list_with_word(entries, full_output_path)
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="根据 Excel 中的 AI 审校结果生成审校建议清单")
+    parser.add_argument("--headless", action="store_true", help="不调用 Word，直接用 python-docx 生成文档")
+    main(headless=parser.parse_args().headless)
\ No newline at end of file
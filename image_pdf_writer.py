@@ -0,0 +1,204 @@
+# image_pdf_writer.py
+# 逐页写出的图片 PDF 生成器：每添加一张图片就把该页写入文件，内存中最多只保留一页
+#
+# - JPEG 图片 (灰度/RGB) 直接以 DCTDecode 数据流嵌入，不解码也不重新压缩；
+# - 其他图片解码后按与 PIL 保存 PDF 相同的方式编码 (灰度/彩色为 JPEG，黑白为 Flate)；
+# - 页面尺寸 = 像素 * 72 / resolution (点)，与 PIL 的 save(..., "PDF", resolution=...) 一致；
+# - 先写入 .part 临时文件，close() 时才替换为目标文件，出错时不会留下不完整的 PDF；
+# - build_pdf() 可把页面的缩放和编码交给进程池，由调用线程按顺序写入。
+import io
+import os
+import shutil
+import zlib
+from collections import deque
+
+from PIL import Image
+
+PDF_RESOLUTION = 100.0
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+class BuildCancelled(Exception):
+    """build_pdf 在完成前被取消。"""
+
+
+def encode_page(image_path, target_size=None):
+    """
+    读取图片并生成一页的图像数据描述 (可在子进程中执行)，交给 StreamingPdfWriter.add_page 写入。
+    JPEG (灰度/RGB) 且不需要缩放时只读取文件头，写入时直接复制原文件。
+    """
+    with Image.open(image_path) as img:
+        size = img.size
+        if img.format == "JPEG" and img.mode in ("L", "RGB") and (target_size is None or tuple(target_size) == size):
+            return {"path": image_path, "data": None, "length": os.path.getsize(image_path), "size": size,
+                    "color_space": "/DeviceGray" if img.mode == "L" else "/DeviceRGB", "bits": 8, "filter": "/DCTDecode"}
+        data, color_space, bits, filter_name, size = _encode_image(img, target_size)
+    return {"path": image_path, "data": data, "length": len(data), "size": size,
+            "color_space": color_space, "bits": bits, "filter": filter_name}
+
+
+def _encode_image(img, target_size):
+    """返回 (编码后的数据, 色彩空间, 位深, 过滤器, 尺寸)。"""
+    if img.mode not in ("1", "L", "RGB"):
+        # PDF 不支持透明度和调色板等模式，统一转换为 RGB
+        img = img.convert("L" if img.mode in ("LA", "I", "I;16", "F") else "RGB")
+    if target_size:
+        img = img.resize(tuple(target_size), Image.Resampling.LANCZOS)
+    if img.mode == "1":
+        # 黑白图：每行按字节对齐的 1 位数据，PDF 中 0 为黑色
+        data = zlib.compress(img.tobytes(), 6)
+        return data, "/DeviceGray", 1, "/FlateDecode", img.size
+    buffer = io.BytesIO()
+    img.save(buffer, "JPEG")
+    return buffer.getvalue(), "/DeviceGray" if img.mode == "L" else "/DeviceRGB", 8, "/DCTDecode", img.size
+
+
+def _create_part_file(output_path):
+    """
+    在目标目录中新建唯一的 .part 临时文件，返回 (文件描述符, 路径)。
+    不使用 tempfile.mkstemp：它创建的文件权限固定为 0600，替换为目标文件后其他用户无法读取；这里与直接创建文件一样按 umask 设置权限。
+    """
+    directory = os.path.dirname(os.path.abspath(output_path))
+    flags = os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0)
+    while True:
+        path = os.path.join(directory, f"{os.path.basename(output_path)}.{os.urandom(4).hex()}.part")
+        try:
+            return os.open(path, flags, 0o666), path
+        except FileExistsError:
+            continue
+
+
+class StreamingPdfWriter:
+    """
+    用法:
+        with StreamingPdfWriter(pdf_path) as writer:
+            for path in image_paths:
+                writer.add_image(path, target_size)
+    with 块内发生异常时删除临时文件，不生成目标 PDF。
+    """
+
+    def __init__(self, output_path, resolution=PDF_RESOLUTION):
+        self.output_path = output_path
+        self.resolution = resolution
+        self.page_count = 0
+        # 临时文件名唯一，多个写入线程输出同名 PDF 时互不干扰
+        fd, self._temp_path = _create_part_file(output_path)
+        self._file = os.fdopen(fd, 'wb')
+        self._offsets = {} # 对象编号 -> 文件偏移
+        self._page_ids = []
+        self._next_id = 3 # 1: Catalog，2: Pages (在 close 时写出)
+        self._file.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+    def add_image(self, image_path, target_size=None):
+        """把一张图片作为新的一页写入 PDF，返回 True 表示 JPEG 数据被直接嵌入。"""
+        page = encode_page(image_path, target_size)
+        self.add_page(page)
+        return page["data"] is None
+
+    def add_page(self, page):
+        """写入 encode_page() 生成的一页。"""
+        size = page["size"]
+        image_id = self._begin_object()
+        self._file.write((f"<< /Type /XObject /Subtype /Image /Width {size[0]} /Height {size[1]} "
+                          f"/ColorSpace {page['color_space']} /BitsPerComponent {page['bits']} "
+                          f"/Filter {page['filter']} /Length {page['length']} >>\nstream\n").encode('ascii'))
+        if page["data"] is None:
+            with open(page["path"], 'rb') as source:
+                shutil.copyfileobj(source, self._file, COPY_CHUNK_SIZE)
+        else:
+            self._file.write(page["data"])
+        self._file.write(b"\nendstream\nendobj\n")
+
+        width_pt, height_pt = size[0] * 72.0 / self.resolution, size[1] * 72.0 / self.resolution
+        content = f"q {width_pt:.4f} 0 0 {height_pt:.4f} 0 0 cm /Im0 Do Q".encode('ascii')
+        content_id = self._begin_object()
+        self._file.write(b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream\nendobj\n")
+
+        page_id = self._begin_object()
+        self._file.write((f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {width_pt:.4f} {height_pt:.4f}] "
+                          f"/Resources << /XObject << /Im0 {image_id} 0 R >> >> /Contents {content_id} 0 R >>\nendobj\n").encode('ascii'))
+        self._page_ids.append(page_id)
+        self.page_count += 1
+
+    def close(self):
+        """写出页面树、交叉引用表和文件尾，并替换为目标文件。"""
+        if self._file is None: return
+        if not self._page_ids:
+            self.abort()
+            raise ValueError("PDF 中没有任何页面")
+        kids = " ".join(f"{page_id} 0 R" for page_id in self._page_ids)
+        self._begin_object(2)
+        self._file.write(f"<< /Type /Pages /Kids [{kids}] /Count {len(self._page_ids)} >>\nendobj\n".encode('ascii'))
+        self._begin_object(1)
+        self._file.write(b"<< /Type /Catalog /Pages 2 0 R >>\nendobj\n")
+
+        xref_offset = self._file.tell()
+        object_count = self._next_id
+        lines = [f"xref\n0 {object_count}\n", "0000000000 65535 f \n"]
+        lines.extend(f"{self._offsets[object_id]:010d} 00000 n \n" for object_id in range(1, object_count))
+        lines.append(f"trailer\n<< /Size {object_count} /Root 1 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n")
+        self._file.write("".join(lines).encode('ascii'))
+        self._file.close()
+        self._file = None
+        os.replace(self._temp_path, self.output_path)
+
+    def abort(self):
+        if self._file is None: return
+        self._file.close()
+        self._file = None
+        try:
+            os.remove(self._temp_path)
+        except OSError:
+            pass
+
+    def _begin_object(self, object_id=None):
+        if object_id is None:
+            object_id = self._next_id
+            self._next_id += 1
+        self._offsets[object_id] = self._file.tell()
+        self._file.write(b"%d 0 obj\n" % object_id)
+        return object_id
+
+
+def build_pdf(image_paths, pdf_path, target_size=None, resolution=PDF_RESOLUTION, executor=None,
+              max_in_flight=4, progress=None, cancel_event=None):
+    """
+    按顺序把 image_paths 写成一个 PDF，返回 (页数, 直接嵌入的 JPEG 页数)。
+    executor 为进程池时，页面在子进程中缩放/编码，同时在途的页面不超过 max_in_flight 个 (限制内存)；
+    每写完一页调用 progress(已写页数, 总页数)。cancel_event 置位后删除临时文件并抛出 BuildCancelled。
+    """
+    direct_count = 0
+    pending = deque()
+    path_iter = iter(image_paths)
+    with StreamingPdfWriter(pdf_path, resolution) as writer:
+        try:
+            while True:
+                if cancel_event is not None and cancel_event.is_set():
+                    raise BuildCancelled(pdf_path)
+                if executor is None:
+                    path = next(path_iter, None)
+                    if path is None: break
+                    page = encode_page(path, target_size)
+                else:
+                    while len(pending) < max(1, max_in_flight):
+                        path = next(path_iter, None)
+                        if path is None: break
+                        pending.append(executor.submit(encode_page, path, target_size))
+                    if not pending: break
+                    page = pending.popleft().result()
+                direct_count += page["data"] is None
+                writer.add_page(page)
+                if progress: progress(writer.page_count, len(image_paths))
+        finally:
+            for future in pending: future.cancel()
+    return writer.page_count, direct_count
@@ -0,0 +1,197 @@
+# inventory_snapshot.py
+# 目录文件清单的增量快照 (SQLite)，供 导出目录下文件信息.py 使用
+#
+# - 快照记录每个文件的路径、大小、修改时间和可选的内容哈希，以及每个目录的修改时间和子目录列表；
+# - 再次扫描时，修改时间未变的目录不再列出和 stat 其中的文件 (见 DirectoryScanner 的 snapshot 参数)。
+#   目录的修改时间只在其中的条目增删或改名时变化，原位改写文件内容不会改变它，
+#   因此“跳过未变化的目录”模式下这类修改不会被发现；需要完整比对时关闭该选项 (仍比对全部文件，只是不跳过)；
+# - 本次扫描写入 files_new/dirs_new 两张表，与上次快照比较得到新增、删除、修改的文件，
+#   完成后替换旧表；取消或出错时回滚，旧快照保持不变。
+import hashlib
+import json
+import os
+import sqlite3
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from dir_scanner import FileEntry, DEFAULT_WORKERS, format_size_kb, format_mtime
+
+HASH_CHUNK_SIZE = 1024 * 1024
+HASH_BATCH_ROWS = 1000 # 计算哈希时每批读取/写回的行数
+DELTA_COLUMNS = ['变化', '目录名', '文件名', '文件大小(KB)', '修改日期', '原文件大小(KB)', '原修改日期']
+DELTA_COLUMN_TYPES = {'文件大小(KB)': float, '修改日期': str, '原文件大小(KB)': float, '原修改日期': str} # 新增/删除的行有空值
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, directory TEXT, name TEXT, size INTEGER, mtime REAL, hash TEXT);
+CREATE INDEX IF NOT EXISTS files_directory ON files (directory);
+CREATE TABLE IF NOT EXISTS dirs (path TEXT PRIMARY KEY, mtime_ns INTEGER, subdirs TEXT);
+DROP TABLE IF EXISTS files_new;
+DROP TABLE IF EXISTS dirs_new;
+CREATE TABLE files_new (path TEXT PRIMARY KEY, directory TEXT, name TEXT, size INTEGER, mtime REAL, hash TEXT);
+CREATE TABLE dirs_new (path TEXT PRIMARY KEY, mtime_ns INTEGER, subdirs TEXT);
+"""
+
+
+def hash_file(path):
+    """文件内容的哈希 (blake2b，128 位，十六进制)。"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(HASH_CHUNK_SIZE)
+            if not chunk: break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _try_hash(path):
+    try:
+        return hash_file(path)
+    except OSError:
+        return None # 无法读取的文件不记录哈希，下次再试
+
+
+class InventorySnapshot:
+    """
+    用法 (均在同一线程中调用，is_unchanged 除外):
+        snapshot = InventorySnapshot(db_path)
+        has_previous = snapshot.begin(root, options, reuse=True)
+        scanner = DirectoryScanner(..., snapshot=snapshot)
+        for entry in scanner.scan(root): ...
+        snapshot.fill_hashes()          # 可选
+        for row in snapshot.delta_rows(): ...   # snapshot.delta_counts 为各类变化的数量
+        snapshot.commit()               # 或 rollback()
+        snapshot.close()
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._conn = sqlite3.connect(db_path)
+        self._known_dirs = {}
+        self._can_carry = False
+        self.root = None
+        self.delta_counts = Counter()
+
+    def begin(self, root, options, reuse=True):
+        """
+        开始一次扫描，返回是否存在同一根目录的上次快照 (可比较变化)。
+        options 为影响扫描结果的选项 (包含/排除/深度)，与上次不同时不跳过任何目录。
+        扫描须使用 self.root 作为根目录：同一目录的不同写法 (相对路径、/ 与 \、大小写) 统一为上次快照的写法，
+        扫描得到的路径才能与快照中的记录对应。
+        """
+        self._conn.executescript(_SCHEMA)
+        meta = dict(self._conn.execute("SELECT key, value FROM meta"))
+        root_path = os.path.normpath(os.path.abspath(root))
+        root_key = os.path.normcase(root_path)
+        options = json.dumps(options, ensure_ascii=False, sort_keys=True)
+        has_previous = meta.get("root") == root_key
+        if not has_previous:
+            # 快照属于其他目录 (或是新建的)，按首次扫描处理
+            self._conn.execute("DELETE FROM files")
+            self._conn.execute("DELETE FROM dirs")
+        self.root = meta.get("root_path", root_path) if has_previous else root_path
+        self._can_carry = has_previous and meta.get("options") == options
+        if reuse and self._can_carry:
+            self._known_dirs = dict(self._conn.execute("SELECT path, mtime_ns FROM dirs"))
+        self._conn.executemany("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                               [("root", root_key), ("root_path", self.root), ("options", options)])
+        return has_previous
+
+    def is_unchanged(self, path, mtime_ns):
+        """目录的修改时间与快照相同 (可在线程池中调用，只读内存中的字典)。"""
+        return self._known_dirs.get(path) == mtime_ns
+
+    def load_directory(self, path):
+        """取出未变化目录在快照中的文件和子目录，并原样写入本次快照。"""
+        self._conn.execute("INSERT INTO dirs_new SELECT * FROM dirs WHERE path = ?", (path,))
+        self._conn.execute("INSERT INTO files_new SELECT * FROM files WHERE directory = ?", (path,))
+        subdirs, = self._conn.execute("SELECT subdirs FROM dirs WHERE path = ?", (path,)).fetchone()
+        files = [FileEntry(*row) for row in
+                 self._conn.execute("SELECT path, directory, name, size, mtime FROM files WHERE directory = ?", (path,))]
+        return files, json.loads(subdirs)
+
+    def carry_directory(self, path):
+        """
+        本次无法列出的目录：沿用快照中的文件和子目录 (写入本次快照)，不当作删除；
+        快照中没有该目录或扫描选项已改变时返回空列表。
+        """
+        if not self._can_carry or self._conn.execute("SELECT 1 FROM dirs WHERE path = ?", (path,)).fetchone() is None:
+            return [], []
+        return self.load_directory(path)
+
+    def record_directory(self, path, mtime_ns, files, subdir_names):
+        self._conn.execute("INSERT OR REPLACE INTO dirs_new VALUES (?, ?, ?)",
+                           (path, mtime_ns, json.dumps(subdir_names, ensure_ascii=False)))
+        self._conn.executemany("INSERT OR REPLACE INTO files_new VALUES (?, ?, ?, ?, ?, NULL)", files)
+
+    def fill_hashes(self, workers=DEFAULT_WORKERS, progress=None, cancel_event=None):
+        """
+        为本次快照中没有哈希的文件计算内容哈希：大小和修改时间与上次相同的文件沿用上次的哈希，
+        其余文件在线程池中读取计算。每批完成后调用 progress(已计算数)。
+        """
+        self._carry_hashes()
+        done, last_rowid = 0, 0
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            while not (cancel_event and cancel_event.is_set()):
+                batch = self._conn.execute(
+                    "SELECT rowid, path FROM files_new WHERE hash IS NULL AND rowid > ? ORDER BY rowid LIMIT ?",
+                    (last_rowid, HASH_BATCH_ROWS)).fetchall()
+                if not batch: break
+                hashes = executor.map(_try_hash, [path for _, path in batch])
+                self._conn.executemany("UPDATE files_new SET hash = ? WHERE rowid = ?",
+                                       [(digest, rowid) for (rowid, _), digest in zip(batch, hashes)])
+                last_rowid = batch[-1][0]
+                done += len(batch)
+                if progress: progress(done)
+
+    def lookup_hash(self, path):
+        """本次快照中文件的内容哈希 (未计算时为 None)，可作为 DuplicateFinder.find 的 known_hash。"""
+        row = self._conn.execute("SELECT hash FROM files_new WHERE path = ?", (path,)).fetchone()
+        return row[0] if row else None
+
+    def _carry_hashes(self):
+        self._conn.execute("""
+            UPDATE files_new SET hash = (
+                SELECT f.hash FROM files f
+                WHERE f.path = files_new.path AND f.size = files_new.size AND f.mtime = files_new.mtime)
+            WHERE hash IS NULL""")
+
+    def delta_rows(self):
+        """逐行产出与上次快照相比的变化 (与 DELTA_COLUMNS 顺序一致，没有的值为 None)，同时统计到 delta_counts。"""
+        self._carry_hashes()
+        queries = (
+            ("新增", """SELECT n.directory, n.name, n.size, n.mtime, NULL, NULL FROM files_new n
+                        WHERE NOT EXISTS (SELECT 1 FROM files o WHERE o.path = n.path)"""),
+            ("删除", """SELECT o.directory, o.name, NULL, NULL, o.size, o.mtime FROM files o
+                        WHERE NOT EXISTS (SELECT 1 FROM files_new n WHERE n.path = o.path)"""),
+            ("修改", """SELECT n.directory, n.name, n.size, n.mtime, o.size, o.mtime FROM files_new n
+                        JOIN files o ON o.path = n.path
+                        WHERE n.size != o.size OR n.mtime != o.mtime
+                           OR (n.hash IS NOT NULL AND o.hash IS NOT NULL AND n.hash != o.hash)"""),
+        )
+        self.delta_counts = Counter()
+        for change, query in queries:
+            for directory, name, size, mtime, old_size, old_mtime in self._conn.execute(query):
+                self.delta_counts[change] += 1
+                yield [change, directory, name,
+                       format_size_kb(size) if size is not None else None, format_mtime(mtime) if mtime is not None else None,
+                       format_size_kb(old_size) if old_size is not None else None,
+                       format_mtime(old_mtime) if old_mtime is not None else None]
+
+    def commit(self):
+        """用本次扫描结果替换旧快照 (表的替换在一个事务中完成，中途失败时旧快照不受影响)。"""
+        self._conn.executescript("""
+            BEGIN;
+            DROP TABLE files;
+            DROP TABLE dirs;
+            ALTER TABLE files_new RENAME TO files;
+            ALTER TABLE dirs_new RENAME TO dirs;
+            CREATE INDEX files_directory ON files (directory);
+            COMMIT;
+        """)
+
+    def rollback(self):
+        self._conn.rollback()
+
+    def close(self):
+        self._conn.close()
@@ -7,8 +7,8 @@ import re
 import tkinter as tk
 from tkinter import ttk, filedialog, scrolledtext
 import threading
-import pandas as pd
 import win32com.client as win32
+from export_writer import write_table
 
 # --- 核心提取逻辑 (已修改为包含自动编号) ---
 
@@ -164,14 +164,12 @@ def extract_word_to_excel(file_list, output_dir, num_levels_to_extract, status_c
         final_columns.append(f'第{i}层标题')
     final_columns.append('内容')
     
-    df = pd.DataFrame(all_data_from_docs)
-    df = df.reindex(columns=final_columns).fillna('')
-    
     output_filename = f"教材内容提取结果_前{num_levels_to_extract}级标题.xlsx"
     output_excel_path = os.path.join(output_dir, output_filename)
     
     try:
-        df.to_excel(output_excel_path, index=False, engine='openpyxl')
+        # 逐行写出 (只写模式)，缺少的列写为空字符串
+        write_table(output_excel_path, final_columns, all_data_from_docs)
         result_summary["success"] = True
         result_summary["message"] = f"处理完成！共处理 {result_summary['files_processed']} / {result_summary['total_files']} 个文件。"
         result_summary["output_path"] = os.path.abspath(output_excel_path)
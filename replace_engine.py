@@ -0,0 +1,631 @@
+# replace_engine.py
+# 批量文件内容替换的处理引擎 (无界面)，供 文件内容批量替换.py 使用
+#
+# - 多个文件在线程池中并行处理 (读写文件为 I/O 型任务，线程即可)；
+# - 可一次应用多条规则 (规则文件)，所有规则编译为一个表达式，每个文件只扫描一遍，并统计每条规则的命中次数；
+# - 只有普通文本规则时，超过 STREAM_THRESHOLD 的文件分块流式处理，内存占用与文件大小无关，
+#   每块末尾保留 最长查找内容-1 个字符与下一块拼接，跨块的匹配不会遗漏；
+# - 正则表达式可能跨越任意长度，仍整体读入后替换；
+# - 只有普通文本规则时，先用 mmap 在原始字节中查找各候选编码下的查找内容，不含任何匹配的文件不解码直接跳过；
+# - 编码可自动检测 (BOM，否则依次尝试 utf-8、gb18030)，写回时使用相同的编码和 BOM；
+# - 原位置修改时先写临时文件再 os.replace，中途出错不会破坏原文件；
+# - 预览 (run_scan) 只建立匹配索引 (文件、行、列、上下文)，随后可按索引执行替换，不再重新检测和扫描未匹配的文件；
+# - 替换时可写入撤销日志 (UndoJournal)：被修改文件的原内容以 gzip 保存，undo_batch 可整批恢复。
+import codecs
+import gzip
+import io
+import json
+import mmap
+import os
+import re
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime
+
+STREAM_THRESHOLD = 8 * 1024 * 1024 # 超过此大小 (字节) 的文件使用分块替换
+CHUNK_CHARS = 1024 * 1024 # 分块替换时每次读取的字符数
+TEMP_SUFFIX = ".tmpreplace"
+DEFAULT_WORKERS = min(32, (os.cpu_count() or 1) + 4) # 与 ThreadPoolExecutor 的默认值一致
+UNDO_ROOT = os.path.join(os.path.expanduser("~"), ".batch_replace_undo") # 每批替换一个子目录
+MAX_INDEXED_MATCHES = 1000 # 预览索引中每个文件最多记录的匹配数 (匹配总数仍完整统计)
+CONTEXT_CHARS = 30 # 预览上下文在匹配前后各保留的字符数 (不跨行)
+AUTO_ENCODING = "auto"
+AUTO_CANDIDATES = ("utf-8", "gb18030") # 无 BOM 时依次尝试；gb18030 兼容 gbk/gb2312，且能写回任意字符
+# BOM -> 编码。utf-8 用 utf-8-sig 读写 (读时去掉、写时加回)；utf-16/32 使用指定字节序的编码，
+# BOM 作为 U+FEFF 字符原样保留，写回的字节序与原文件相同
+BOM_ENCODINGS = (
+    (codecs.BOM_UTF32_LE, "utf-32-le"), (codecs.BOM_UTF32_BE, "utf-32-be"),
+    (codecs.BOM_UTF8, "utf-8-sig"), (codecs.BOM_UTF16_LE, "utf-16-le"), (codecs.BOM_UTF16_BE, "utf-16-be"),
+)
+# 编码时在开头加 BOM 的编码 -> 正文所用的无 BOM 编码 (utf-16/32 按 BOM 决定字节序，两种都要查找)
+BOM_FREE_ENCODINGS = {
+    "utf-8-sig": ("utf-8",), "utf-16": ("utf-16-le", "utf-16-be"), "utf-32": ("utf-32-le", "utf-32-be"),
+}
+
+
+class RuleSet:
+    """
+    一组替换规则 [{"find", "replace", "regex"}]，编译后对每个文件只扫描一遍。
+    - 单条普通文本规则直接使用 str.find / str.replace；
+    - 单条正则规则直接使用其编译结果 (与原先 re.subn(..., flags=re.MULTILINE) 一致)；
+    - 多条规则合并为一个表达式：所有普通文本规则按字典树 (trie) 合并为一个分组，每条正则规则各占一个分组，
+      匹配后按所在分组查表得到规则。同一位置优先匹配普通文本规则中最长的一条，其次按顺序匹配正则规则。
+      正则规则替换模板中的 \\1、\\g<1> 会换算为组合表达式中的分组号。
+    只包含普通文本规则时可以分块流式替换 (streamable)。
+    """
+
+    def __init__(self, rules):
+        if not rules:
+            raise ValueError("规则集为空")
+        self.rules = rules
+        self.streamable = not any(rule["regex"] for rule in rules)
+        self.max_find_length = max(len(rule["find"]) for rule in rules)
+        self._single_literal = rules[0]["find"] if len(rules) == 1 and self.streamable else None
+        if len(rules) == 1:
+            self.pattern = re.compile(rules[0]["find"] if rules[0]["regex"] else re.escape(rules[0]["find"]), re.MULTILINE)
+            self._replacements, self._literals = None, {}
+            return
+
+        self._literals = {} # 查找内容 -> (规则序号, 替换为)，重复的查找内容以第一条为准
+        parts = []
+        for index, rule in enumerate(rules):
+            if not rule["regex"]:
+                self._literals.setdefault(rule["find"], (index, rule["replace"]))
+        if self._literals:
+            parts.append(f"(?P<lit>{_trie_pattern(self._literals)})")
+        for index, rule in enumerate(rules):
+            if not rule["regex"]: continue
+            if _BACKREFERENCE.search(rule["find"]):
+                raise ValueError(f"第 {index + 1} 条规则: 多条规则合并匹配时不支持表达式内的反向引用 ({rule['find']})")
+            parts.append(f"(?P<r{index}>{rule['find']})")
+        try:
+            self.pattern = re.compile("|".join(parts), re.MULTILINE)
+        except re.error as e:
+            raise ValueError(f"规则无法合并编译: {e}")
+        # 分组号 -> (规则序号, 已换算分组号的替换模板)；普通文本规则的分组为 None
+        self._replacements = {self.pattern.groupindex["lit"]: None} if self._literals else {}
+        for index, rule in enumerate(rules):
+            if rule["regex"]:
+                base = self.pattern.groupindex[f"r{index}"]
+                self._replacements[base] = (index, _shift_template(rule["replace"], base))
+
+    def byte_prefilter(self, encodings):
+        """
+        返回在原始字节中查找任一规则的编译表达式 (查找内容在各编码下的字节序列)，不适用时返回 None:
+        含正则规则 (无法转换为字节查找)，或查找内容含换行符 (文本模式读取会转换换行符)。
+        """
+        if not self.streamable or any("\n" in rule["find"] or "\r" in rule["find"] for rule in self.rules):
+            return None
+        body_encodings = []
+        for encoding in encodings:
+            name = codecs.lookup(encoding).name
+            if name in BOM_FREE_ENCODINGS:
+                body_encodings.extend(BOM_FREE_ENCODINGS[name])
+            elif "".encode(encoding):
+                return None # 其他编码时带前缀的编码，无法得到正文中的字节序列
+            else:
+                body_encodings.append(encoding)
+        needles = set()
+        for rule in self.rules:
+            for encoding in body_encodings:
+                try:
+                    needles.add(rule["find"].encode(encoding))
+                except UnicodeError:
+                    pass # 该编码无法表示查找内容，此编码的文件中不可能出现
+        return re.compile(_trie_pattern(needles)) if needles else None
+
+    def sub(self, text):
+        """返回 (替换后的文本, 每条规则的命中次数列表)。"""
+        counts = [0] * len(self.rules)
+        if self._single_literal is not None:
+            counts[0] = text.count(self._single_literal)
+            return (text.replace(self._single_literal, self.rules[0]["replace"]) if counts[0] else text), counts
+        if self._replacements is None:
+            text, counts[0] = self.pattern.subn(self.rules[0]["replace"], text)
+            return text, counts
+        return self.pattern.sub(self._dispatcher(counts), text), counts
+
+    def stream(self, source, target, chunk_chars=CHUNK_CHARS):
+        """
+        从文本流 source 分块读取，替换后写入 target，返回每条规则的命中次数列表 (仅限 streamable 的规则集)。
+        每块末尾保留 最长查找内容-1 个字符与下一块拼接，结果与整体替换相同。
+        """
+        keep = self.max_find_length - 1
+        counts = [0] * len(self.rules)
+        replace = self._dispatcher(counts) if self._replacements else None
+        pending = ""
+        while True:
+            chunk = source.read(chunk_chars)
+            buffer = pending + chunk
+            # 起点在 safe 之前的匹配必然完整地落在 buffer 内；之后的字符留到下一块再判断
+            safe = len(buffer) if not chunk else max(0, len(buffer) - keep)
+            pos = 0
+            for match in self.pattern.finditer(buffer):
+                if match.start() >= safe: break
+                target.write(buffer[pos:match.start()])
+                if replace is None:
+                    counts[0] += 1
+                    target.write(self.rules[0]["replace"])
+                else:
+                    target.write(replace(match))
+                pos = match.end()
+            flush_to = max(pos, safe)
+            target.write(buffer[pos:flush_to])
+            pending = buffer[flush_to:]
+            if not chunk:
+                return counts
+
+    def _dispatcher(self, counts):
+        replacements, literals = self._replacements, self._literals
+
+        def replace(match):
+            entry = replacements[match.lastindex]
+            if entry is None:
+                index, replacement = literals[match.group()]
+                counts[index] += 1
+                return replacement
+            counts[entry[0]] += 1
+            return match.expand(entry[1])
+        return replace
+
+
+def _match_rule_index(rule_set, match):
+    """匹配对应的规则序号。"""
+    if not rule_set._replacements:
+        return 0
+    entry = rule_set._replacements[match.lastindex]
+    return rule_set._literals[match.group()][0] if entry is None else entry[0]
+
+
+def _trie_pattern(words):
+    """把一组普通文本 (str 或 bytes) 合并为按字典树组织的正则表达式，同一位置匹配其中最长的一个。"""
+    words = list(words)
+    empty = words[0][:0]
+    trie = {}
+    for word in words:
+        node = trie
+        for i in range(len(word)):
+            node = node.setdefault(word[i:i + 1], {})
+        node[empty] = True
+
+    def text(value):
+        return value.encode('ascii') if isinstance(empty, bytes) else value
+
+    def build(node):
+        branches, single_chars = [], []
+        for char, child in sorted((char, child) for char, child in node.items() if char):
+            if list(child) == [empty]:
+                single_chars.append(re.escape(char))
+            else:
+                branches.append(re.escape(char) + build(child))
+        if single_chars:
+            branches.append(single_chars[0] if len(single_chars) == 1 else text("[") + empty.join(single_chars) + text("]"))
+        result = branches[0] if len(branches) == 1 else text("(?:") + text("|").join(branches) + text(")")
+        return text("(?:") + result + text(")?") if empty in node else result
+    return build(trie)
+
+
+# 表达式内的反向引用：\1..\99 或 (?P=name)
+_BACKREFERENCE = re.compile(r"\\[1-9]|\(\?P=")
+_TEMPLATE_TOKEN = re.compile(r"\\(?:g<(\w+)>|(\d{1,2})|.)", re.DOTALL)
+
+
+def _shift_template(template, base):
+    """把替换模板中的分组引用换算为组合表达式中的分组号 (base 为该规则外层分组号)。"""
+    def shift(match):
+        group = match.group(1) if match.group(1) is not None else match.group(2)
+        if group is None or not group.isdigit():
+            return match.group(0) # 其他转义和命名分组保持不变
+        return f"\\g<{base + int(group)}>"
+    return _TEMPLATE_TOKEN.sub(shift, template)
+
+
+def make_rule(find_what, replace_with, use_regex=False):
+    return {"find": find_what, "replace": replace_with, "regex": bool(use_regex)}
+
+
+def load_rules(path):
+    """
+    从文件读取规则列表，出错时抛出 ValueError。
+    - .json: [{"find": ..., "replace": ..., "regex": false}, ...]
+    - 其他 (制表符分隔的文本): 每行 “查找内容<Tab>替换为[<Tab>regex]”，空行和以 # 开头的行忽略。
+    """
+    try:
+        with open(path, 'r', encoding='utf-8-sig') as f:
+            if path.lower().endswith(".json"):
+                entries = json.load(f)
+                if isinstance(entries, dict): entries = entries.get("rules", [])
+                rules = [make_rule(str(entry["find"]), str(entry.get("replace", "")), entry.get("regex", False)) for entry in entries]
+            else:
+                rules = []
+                for line_number, line in enumerate(f, 1):
+                    line = line.rstrip("\r\n")
+                    if not line.strip() or line.startswith("#"): continue
+                    fields = line.split("\t")
+                    if len(fields) < 2:
+                        raise ValueError(f"第 {line_number} 行缺少制表符分隔的“替换为”")
+                    use_regex = len(fields) > 2 and fields[2].strip().lower() in ("regex", "1", "true", "正则")
+                    rules.append(make_rule(fields[0], fields[1], use_regex))
+    except (OSError, UnicodeError, json.JSONDecodeError, KeyError, TypeError) as e:
+        raise ValueError(f"无法读取规则文件: {e}")
+    for index, rule in enumerate(rules, 1):
+        if not rule["find"]:
+            raise ValueError(f"第 {index} 条规则的查找内容为空")
+        if rule["regex"]:
+            try:
+                re.compile(rule["find"])
+            except re.error as e:
+                raise ValueError(f"第 {index} 条规则的正则表达式无效 ({rule['find']}): {e}")
+    return rules
+
+
+def _exclusive_copy(source_path, dest_path):
+    # 'xb' 模式在目标已存在时失败，多个线程写同名目标时不会互相覆盖
+    with open(source_path, 'rb') as src, open(dest_path, 'xb') as dst:
+        shutil.copyfileobj(src, dst, CHUNK_CHARS)
+    shutil.copystat(source_path, dest_path)
+
+
+def candidate_encodings(encoding):
+    """prefilter 需要考虑的编码：自动检测时包括各候选编码和带 BOM 的 utf-16/32。"""
+    if encoding != AUTO_ENCODING:
+        return (encoding,)
+    return AUTO_CANDIDATES + tuple(name for _, name in BOM_ENCODINGS if name != "utf-8-sig")
+
+
+def _may_contain(path, prefilter):
+    """用 mmap 在原始字节中查找，不解码文件。"""
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return False
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return prefilter.search(mapped) is not None
+
+
+def _file_encodings(path, encoding):
+    """依次尝试的编码：指定编码时只有它；自动检测时有 BOM 则由 BOM 决定，否则为 AUTO_CANDIDATES。"""
+    if encoding != AUTO_ENCODING:
+        return (encoding,)
+    with open(path, 'rb') as f:
+        head = f.read(4)
+    for bom, name in BOM_ENCODINGS:
+        if head.startswith(bom):
+            return (name,)
+    return AUTO_CANDIDATES
+
+
+def _decode_text(raw, encoding):
+    # 与 open(..., 'r') 相同的换行符转换
+    return io.TextIOWrapper(io.BytesIO(raw), encoding=encoding).read()
+
+
+def _read_text(path, encodings):
+    """整体读入文件并按 encodings 依次尝试解码，返回 (文本, 使用的编码)；原始字节只读取一次。"""
+    with open(path, 'rb') as f:
+        raw = f.read()
+    return _open_text(encodings, lambda file_encoding: _decode_text(raw, file_encoding))
+
+
+def file_fingerprint(path):
+    """(大小, 修改时间 ns)，用于判断预览之后文件是否被修改过。"""
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def _open_text(encodings, opener):
+    """按 encodings 依次尝试，返回 (opener 的结果, 使用的编码)；opener 遇到 UnicodeDecodeError 时尝试下一个。"""
+    for index, file_encoding in enumerate(encodings):
+        try:
+            return opener(file_encoding), file_encoding
+        except UnicodeDecodeError:
+            if index == len(encodings) - 1: raise
+
+
+def process_file(path, dest_path, rule_set, encoding, prefilter=None, journal=None, index_entry=None,
+                 stream_threshold=STREAM_THRESHOLD):
+    """
+    用 RuleSet 处理单个文件。dest_path 为 None 表示在原位置修改，否则写到 dest_path (已存在时不覆盖)。
+    encoding 为 AUTO_ENCODING 时逐个文件检测编码；prefilter 为 RuleSet.byte_prefilter 的结果，原始字节中
+    找不到时不解码直接视为无匹配。journal 为 UndoJournal 时记录修改前的内容和新建的文件。
+    index_entry 为 scan_file 的结果时按预览索引处理：文件在预览后被修改过则不处理 (modified)，
+    预览中无匹配的文件不再解码，有匹配的文件直接使用预览时检测到的编码。
+    返回 {"path", "status", "count", "hits", "encoding", "error"}，hits 为每条规则的命中次数，status 为:
+      changed (已修改/写出), copied (无匹配，已复制到目标目录), unchanged (无匹配，跳过),
+      exists (目标文件已存在), modified (预览后文件被修改), failed (读写或解码失败)
+    """
+    result = {"path": path, "status": "unchanged", "count": 0, "hits": None, "encoding": None, "error": None}
+    try:
+        if dest_path is not None and os.path.exists(dest_path): # 包括源和目标相同的情况
+            result["status"] = "exists"
+            return result
+        if index_entry is not None:
+            if file_fingerprint(path) != index_entry["fingerprint"]:
+                result["status"] = "modified"
+                return result
+            if not index_entry["count"]:
+                prefilter = _NEVER_MATCHES
+            else:
+                encoding, prefilter = index_entry["encoding"], None
+        if prefilter is not None and (prefilter is _NEVER_MATCHES or not _may_contain(path, prefilter)):
+            if dest_path is not None:
+                _exclusive_copy(path, dest_path)
+                _record_created(journal, dest_path)
+                result["status"] = "copied"
+            return result
+        encodings = _file_encodings(path, encoding)
+        if rule_set.streamable and os.path.getsize(path) > stream_threshold:
+            streamed, result["encoding"] = _open_text(
+                encodings, lambda file_encoding: _process_streaming(path, dest_path, rule_set, file_encoding, result, journal))
+            return streamed
+
+        content, encoding = _read_text(path, encodings)
+        result["encoding"] = encoding
+        new_content, hits = rule_set.sub(content)
+        del content
+        _set_hits(result, hits)
+        if not result["count"]:
+            if dest_path is not None:
+                # 保存到新目录模式：即使内容未变也复制原文件
+                _exclusive_copy(path, dest_path)
+                _record_created(journal, dest_path)
+                result["status"] = "copied"
+            return result
+        if dest_path is None:
+            temp_path = path + TEMP_SUFFIX
+            with open(temp_path, 'w', encoding=encoding) as f:
+                f.write(new_content)
+            _replace_with_backup(temp_path, path, journal) # 原子操作
+        else:
+            with open(dest_path, 'x', encoding=encoding) as f:
+                f.write(new_content)
+            _record_created(journal, dest_path)
+        result["status"] = "changed"
+    except FileExistsError:
+        result["status"] = "exists"
+    except (UnicodeError, OSError) as e:
+        result["status"], result["error"] = "failed", str(e)
+    return result
+
+
+_NEVER_MATCHES = object() # 预览中无匹配的文件：与 prefilter 未命中的处理相同
+
+
+def _set_hits(result, hits):
+    result["count"] = sum(hits)
+    result["hits"] = hits if result["count"] else None
+
+
+def _replace_with_backup(temp_path, path, journal):
+    backup = journal.backup(path) if journal is not None else None
+    os.replace(temp_path, path)
+    if journal is not None:
+        journal.record(path, backup=backup)
+
+
+def _record_created(journal, dest_path):
+    if journal is not None:
+        journal.record(dest_path, created=True)
+
+
+def _process_streaming(path, dest_path, rule_set, encoding, result, journal=None):
+    if dest_path is not None:
+        with open(path, 'r', encoding=encoding) as source:
+            target = open(dest_path, 'x', encoding=encoding)
+            try:
+                with target:
+                    hits = rule_set.stream(source, target)
+            except (UnicodeError, OSError):
+                os.remove(dest_path) # 不留下写了一半的目标文件
+                raise
+        _set_hits(result, hits)
+        if result["count"]:
+            result["status"] = "changed"
+        else:
+            # 无匹配时与小文件一致，目标为原文件的逐字节副本
+            with open(path, 'rb') as src, open(dest_path, 'wb') as dst:
+                shutil.copyfileobj(src, dst, CHUNK_CHARS)
+            shutil.copystat(path, dest_path)
+            result["status"] = "copied"
+        _record_created(journal, dest_path)
+        return result
+
+    # 原位置修改：先写到临时文件，无匹配时丢弃，有匹配时替换原文件
+    temp_path = path + TEMP_SUFFIX
+    try:
+        with open(path, 'r', encoding=encoding) as source, open(temp_path, 'w', encoding=encoding) as target:
+            hits = rule_set.stream(source, target)
+        _set_hits(result, hits)
+        if result["count"]:
+            _replace_with_backup(temp_path, path, journal)
+            result["status"] = "changed"
+        return result
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def scan_file(path, rule_set, encoding, prefilter=None, max_matches=MAX_INDEXED_MATCHES):
+    """
+    预览：只查找不修改。返回 {"path", "status", "count", "hits", "encoding", "fingerprint", "matches", "error"}，
+    status 为 matched / unchanged / failed；matches 为 (规则序号, 行号, 列号, 字符偏移, 匹配内容, 上下文) 列表，
+    行号和列号从 1 开始。只有普通文本规则时分块读取，不会把大文件整体读入内存。
+    """
+    result = {"path": path, "status": "unchanged", "count": 0, "hits": None, "encoding": None,
+              "fingerprint": None, "matches": [], "error": None}
+    try:
+        result["fingerprint"] = file_fingerprint(path)
+        if prefilter is not None and not _may_contain(path, prefilter):
+            return result
+
+        def scan(file_encoding):
+            with open(path, 'r', encoding=file_encoding) as source:
+                return _scan_stream(source, rule_set, max_matches)
+        (hits, matches), result["encoding"] = _open_text(_file_encodings(path, encoding), scan)
+        _set_hits(result, hits)
+        result["matches"] = matches
+        if result["count"]:
+            result["status"] = "matched"
+    except (UnicodeError, OSError) as e:
+        result["status"], result["error"] = "failed", str(e)
+    return result
+
+
+def _scan_stream(source, rule_set, max_matches):
+    # 与 RuleSet.stream 相同的分块方式；正则规则一次读入全部内容
+    chunk_chars = CHUNK_CHARS if rule_set.streamable else -1
+    keep = rule_set.max_find_length - 1
+    hits, matches = [0] * len(rule_set.rules), []
+    pending, offset, line, column = "", 0, 1, 1 # pending[0] 在文件中的位置
+    while True:
+        chunk = source.read(chunk_chars)
+        buffer = pending + chunk
+        safe = len(buffer) if not chunk or chunk_chars < 0 else max(0, len(buffer) - keep)
+        pos = 0
+        for match in rule_set.pattern.finditer(buffer):
+            start, end = match.span()
+            if start >= safe: break
+            rule_index = _match_rule_index(rule_set, match)
+            hits[rule_index] += 1
+            pos = end
+            if len(matches) >= max_matches: continue
+            line_start = buffer.rfind("\n", 0, start) + 1
+            line_end = buffer.find("\n", end)
+            if line_end == -1: line_end = len(buffer)
+            match_line = line + buffer.count("\n", 0, start)
+            match_column = start - line_start + (column if line_start == 0 else 1)
+            context = buffer[max(line_start, start - CONTEXT_CHARS):min(line_end, end + CONTEXT_CHARS)]
+            matches.append((rule_index, match_line, match_column, offset + start, match.group(), context))
+        consumed = max(pos, safe)
+        newlines = buffer.count("\n", 0, consumed)
+        if newlines:
+            line += newlines
+            column = consumed - buffer.rfind("\n", 0, consumed)
+        else:
+            column += consumed
+        offset += consumed
+        pending = buffer[consumed:]
+        if not chunk or chunk_chars < 0:
+            return hits, matches
+
+
+def _run_in_pool(function, arg_tuples, workers, cancel_event):
+    """
+    在线程池中执行 function(*args)，同时在途的任务不超过 workers * 2 个，按完成顺序逐个产出结果。
+    cancel_event 置位后不再提交新任务。
+    """
+    max_in_flight = workers * 2
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = set()
+        args_iter = iter(arg_tuples)
+        while True:
+            while len(pending) < max_in_flight and not (cancel_event and cancel_event.is_set()):
+                args = next(args_iter, None)
+                if args is None: break
+                pending.add(executor.submit(function, *args))
+            if not pending: break
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+
+
+def run_scan(paths, rule_set, encoding, workers=DEFAULT_WORKERS, cancel_event=None):
+    """并行预览 paths 中的文件，按完成顺序产出 scan_file 的结果。"""
+    prefilter = rule_set.byte_prefilter(candidate_encodings(encoding))
+    return _run_in_pool(scan_file, ((path, rule_set, encoding, prefilter) for path in paths), workers, cancel_event)
+
+
+def run_replace(jobs, rule_set, encoding, workers=DEFAULT_WORKERS, cancel_event=None, journal=None):
+    """
+    在线程池中处理 (源路径, 目标路径或 None[, 预览结果]) 列表，按完成顺序逐个产出 process_file 的结果。
+    带预览结果的任务按预览索引处理 (见 process_file 的 index_entry)。
+    """
+    prefilter = rule_set.byte_prefilter(candidate_encodings(encoding))
+    return _run_in_pool(process_file, ((job[0], job[1], rule_set, encoding, prefilter, journal, job[2] if len(job) > 2 else None)
+                                       for job in jobs), workers, cancel_event)
+
+
+class UndoJournal:
+    """
+    一批替换的撤销日志，保存在 directory 中:
+      journal.jsonl  每个被修改或新建的文件一行 {"path", "backup", "created", "after"}，写完一行立即刷新；
+      NNNNNN.gz      被修改文件修改前的原始字节 (gzip 压缩)。
+    after 为修改后的 (大小, 修改时间 ns)，撤销时据此判断文件之后是否又被改动过。可被多个线程同时使用。
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._next_id = 0
+        self._file = open(os.path.join(directory, "journal.jsonl"), 'a', encoding='utf-8')
+
+    @classmethod
+    def create(cls, root=UNDO_ROOT):
+        name = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+        return cls(os.path.join(root, name))
+
+    def backup(self, path):
+        """压缩保存 path 当前的内容，返回备份文件名。"""
+        with self._lock:
+            self._next_id += 1
+            backup_name = f"{self._next_id:06d}.gz"
+        with open(path, 'rb') as src, gzip.open(os.path.join(self.directory, backup_name), 'wb', compresslevel=6) as dst:
+            shutil.copyfileobj(src, dst, CHUNK_CHARS)
+        return backup_name
+
+    def record(self, path, backup=None, created=False):
+        entry = {"path": os.path.abspath(path), "backup": backup, "created": created, "after": list(file_fingerprint(path))}
+        with self._lock:
+            self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+def list_undo_batches(root=UNDO_ROOT):
+    """返回尚未撤销的批次目录 (新的在前)。"""
+    if not os.path.isdir(root):
+        return []
+    batches = [os.path.join(root, name) for name in os.listdir(root)
+               if os.path.isfile(os.path.join(root, name, "journal.jsonl")) and not os.path.exists(os.path.join(root, name, "undone"))]
+    return sorted(batches, reverse=True)
+
+
+def undo_batch(directory, workers=DEFAULT_WORKERS, force=False):
+    """
+    撤销一批替换：恢复被修改文件的原内容，删除新建的文件。按完成顺序产出
+    {"path", "status", "error"}，status 为 restored / deleted / modified (之后又被改动，未恢复) / failed。
+    全部成功后在目录中写入 undone 标记。force=True 时忽略之后的改动强制恢复。
+    """
+    with open(os.path.join(directory, "journal.jsonl"), 'r', encoding='utf-8') as f:
+        entries = [json.loads(line) for line in f if line.strip()]
+    all_done = True
+    for result in _run_in_pool(_undo_entry, ((directory, entry, force) for entry in reversed(entries)), workers, None):
+        all_done &= result["status"] in ("restored", "deleted")
+        yield result
+    if all_done:
+        with open(os.path.join(directory, "undone"), 'w', encoding='utf-8'):
+            pass
+
+
+def _undo_entry(directory, entry, force):
+    path = entry["path"]
+    result = {"path": path, "status": "restored", "error": None}
+    try:
+        if not force and (not os.path.exists(path) or list(file_fingerprint(path)) != entry["after"]):
+            result["status"] = "modified"
+            return result
+        if entry["created"]:
+            os.remove(path)
+            result["status"] = "deleted"
+            return result
+        temp_path = path + TEMP_SUFFIX
+        with gzip.open(os.path.join(directory, entry["backup"]), 'rb') as src, open(temp_path, 'wb') as dst:
+            shutil.copyfileobj(src, dst, CHUNK_CHARS)
+        os.replace(temp_path, path)
+    except OSError as e:
+        result["status"], result["error"] = "failed", str(e)
+    return result
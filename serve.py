@@ -0,0 +1,146 @@
+# serve.py
+# 生产环境入口：python serve.py [--host 0.0.0.0] [--port 7777] [--threads 16] [--com-workers 2]
+#
+# - waitress 多线程 WSGI 服务器 (可在运行 Word 的 Windows 上使用)，I/O 型接口直接在其线程池中执行；
+# - Word COM 解析、审校清单生成等重任务提交到 app.py 中的有界进程池 (COM_WORKER_PROCESSES)；
+# - 各接口的并发上限见 db_config.ENDPOINT_CONCURRENCY_LIMITS；
+# - 收到 Ctrl+C / SIGTERM 后不再接收新请求 (返回 503)，等待进行中的请求和重任务完成后退出，
+#   再次发送信号则立即退出。
+import argparse
+import json
+import logging
+import signal
+import threading
+import time
+import _thread
+
+from waitress import create_server
+
+import app as app_module
+
+try:
+    from db_config import SERVE_THREADS, COM_WORKER_PROCESSES, SHUTDOWN_DRAIN_TIMEOUT
+except ImportError:
+    SERVE_THREADS, COM_WORKER_PROCESSES, SHUTDOWN_DRAIN_TIMEOUT = 16, 2, 300
+
+logger = logging.getLogger("serve")
+
+
+class GracefulDrainMiddleware:
+    """统计进行中的请求；进入排空状态后拒绝新请求，并可等待已有请求全部结束。"""
+
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+        self.draining = False
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._idle = threading.Event()
+        self._idle.set()
+
+    def __call__(self, environ, start_response):
+        if self.draining:
+            body = json.dumps({"code": 503, "message": "服务正在停止，请稍后重试"}, ensure_ascii=False).encode('utf-8')
+            start_response("503 Service Unavailable", [
+                ("Content-Type", "application/json; charset=utf-8"),
+                ("Content-Length", str(len(body))),
+                ("Connection", "close"),
+                ("Retry-After", "30"),
+            ])
+            return [body]
+
+        self._enter()
+        try:
+            app_iter = self.wsgi_app(environ, start_response)
+        except Exception:
+            self._leave()
+            raise
+        # 响应体 (包括 send_file 的文件流) 发送完毕、服务器调用 close() 时才算请求结束
+        return self._call_on_close(app_iter, self._leave)
+
+    @staticmethod
+    def _call_on_close(app_iter, callback):
+        original_close = getattr(app_iter, "close", None)
+        done = []
+
+        def close():
+            try:
+                if original_close:
+                    original_close()
+            finally:
+                if not done:
+                    done.append(True)
+                    callback()
+        try:
+            app_iter.close = close
+            return app_iter
+        except AttributeError: # list 等内置类型不能设置属性时，改用包装迭代器
+            return _ClosingIterable(app_iter, close)
+
+    def _enter(self):
+        with self._lock:
+            self._in_flight += 1
+            self._idle.clear()
+
+    def _leave(self):
+        with self._lock:
+            self._in_flight -= 1
+            if self._in_flight == 0:
+                self._idle.set()
+
+    def wait_idle(self, timeout):
+        return self._idle.wait(timeout)
+
+
+class _ClosingIterable:
+    def __init__(self, iterable, close):
+        self._iterable = iterable
+        self.close = close
+
+    def __iter__(self):
+        return iter(self._iterable)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ProofEase 生产环境 WSGI 服务")
+    parser.add_argument("--host", default=app_module.APP_HOST_BIND)
+    parser.add_argument("--port", type=int, default=app_module.APP_PORT)
+    parser.add_argument("--threads", type=int, default=SERVE_THREADS, help="处理请求的线程数")
+    parser.add_argument("--com-workers", type=int, default=COM_WORKER_PROCESSES, help="执行 Word COM 等重任务的进程数")
+    parser.add_argument("--drain-timeout", type=int, default=SHUTDOWN_DRAIN_TIMEOUT, help="停止时等待进行中请求的最长秒数")
+    args = parser.parse_args()
+
+    app_module.configure_heavy_task_executor(args.com_workers)
+    wsgi_app = GracefulDrainMiddleware(app_module.app)
+    server = create_server(wsgi_app, host=args.host, port=args.port, threads=args.threads)
+
+    def drain_and_stop():
+        logger.info("Shutdown requested, draining in-flight requests...")
+        deadline = time.monotonic() + args.drain_timeout
+        if not wsgi_app.wait_idle(args.drain_timeout):
+            logger.warning(f"Requests still running after {args.drain_timeout}s, stopping anyway.")
+        # 重任务进程的等待也计入排空时限，卡住的 COM 进程不会阻止退出
+        app_module.shutdown_heavy_task_executor(wait=True, timeout=max(0, deadline - time.monotonic()))
+        time.sleep(1) # 给 waitress 主循环留出时间把最后的响应写回客户端
+        _thread.interrupt_main()
+
+    def on_signal(signum, frame):
+        if wsgi_app.draining:
+            raise KeyboardInterrupt # 第二次信号 (或排空完成后的 interrupt_main) 立即退出
+        wsgi_app.draining = True
+        threading.Thread(target=drain_and_stop, name="drain", daemon=True).start()
+
+    signal.signal(signal.SIGINT, on_signal)
+    signal.signal(signal.SIGTERM, on_signal)
+    if hasattr(signal, "SIGBREAK"): # Windows 控制台的 Ctrl+Break
+        signal.signal(signal.SIGBREAK, on_signal)
+
+    logger.info(f"Serving on http://{args.host}:{args.port} with {args.threads} threads and {args.com_workers} COM worker processes.")
+    try:
+        server.run()
+    finally:
+        app_module.shutdown_heavy_task_executor(wait=False)
+        logger.info("Server stopped.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,169 @@
+# tiled_canvas.py
+# 可缩放预览画布的分块渲染：只缩放并转换当前可见区域的图块，图块按缩放比例缓存，平移时直接复用
+import math
+import tkinter as tk
+from collections import OrderedDict
+
+import cv2
+from PIL import Image, ImageTk
+
+TILE_SIZE = 512 # 显示分辨率下单个图块的边长 (像素)
+MAX_CACHED_TILES = 256 # 缓存的图块数上限，需大于一屏可见的图块数
+MAX_KNOWN_IMAGES = 3 # 保留分块状态的最近图片数 (预览窗口按下/抬起时在原图与效果图之间切换)
+
+
+class TiledImageView:
+    """
+    在 tk.Canvas 上按图块显示 OpenCV 图像 (BGR 或灰度)。
+    - 缩小显示时从逐级减半的低分辨率副本取像素，放大显示时只处理可见图块，不会生成整幅放大位图；
+    - 滚动条、拖动平移和窗口尺寸变化都会触发重绘，多次触发在空闲时合并为一次。
+    画布坐标与原图坐标的关系保持为 原图坐标 = 画布坐标 / zoom。
+    """
+
+    def __init__(self, canvas, tile_size=TILE_SIZE, max_cached_tiles=MAX_CACHED_TILES):
+        self.canvas = canvas
+        self.tile_size = tile_size
+        self.max_cached_tiles = max_cached_tiles
+        self.zoom = 1.0
+        self._state = None # 当前图片的 {"image", "generation", "sources"}
+        self._known = OrderedDict() # id(图片) -> 状态，最近使用的排在最后
+        self._generation = 0
+        self._tiles = OrderedDict() # 图块键 -> PhotoImage
+        self._items = {} # 图块键 -> (画布元素 id, PhotoImage)
+        self._refresh_pending = None
+        self._scrollregion = None
+
+        # 包装画布原有的滚动回调：滚动条照常更新，同时安排重绘可见图块
+        self._scroll_commands = {}
+        for option in ("xscrollcommand", "yscrollcommand"):
+            self._scroll_commands[option] = str(canvas.cget(option))
+            canvas.config(**{option: lambda first, last, option=option: self._on_scroll(option, first, last)})
+        canvas.bind("<Configure>", lambda event: self.schedule_refresh(), add="+")
+
+    def set_image(self, image, overview=None, zoom=None):
+        """
+        设置要显示的图片 (及缩放比例)。overview 为可选的 (低分辨率副本, 缩放比例)，缩小显示时优先使用。
+        最近显示过的图片会复用已缓存的图块。
+        """
+        if zoom is not None:
+            self.zoom = zoom
+        if image is None:
+            self.clear()
+            return
+        key = id(image)
+        state = self._known.get(key)
+        if state is None or state["image"] is not image:
+            self._generation += 1
+            state = {"image": image, "generation": self._generation, "sources": {1.0: image}}
+            self._known[key] = state
+            while len(self._known) > MAX_KNOWN_IMAGES:
+                _, dropped = self._known.popitem(last=False)
+                self._drop_tiles(dropped["generation"])
+        self._known.move_to_end(key)
+        if overview is not None:
+            small, scale = overview
+            if small is not None and scale < 1.0:
+                state["sources"].setdefault(small.shape[1] / image.shape[1], small)
+        self._state = state
+        self.refresh()
+
+    def set_zoom(self, zoom):
+        self.zoom = zoom
+        self.refresh()
+
+    def clear(self):
+        for item, _ in self._items.values():
+            self.canvas.delete(item)
+        self._items.clear()
+        self._tiles.clear()
+        self._known.clear()
+        self._state = None
+
+    def schedule_refresh(self):
+        if self._refresh_pending is None and self._state is not None:
+            self._refresh_pending = self.canvas.after_idle(self.refresh)
+
+    def refresh(self):
+        """重新计算可见图块：创建缺少的画布元素，删除已移出视口的元素。"""
+        if self._refresh_pending is not None:
+            self.canvas.after_cancel(self._refresh_pending)
+            self._refresh_pending = None
+        if self._state is None or self.zoom <= 0: return
+        image = self._state["image"]
+        full_h, full_w = image.shape[:2]
+        display_w, display_h = max(1, int(full_w * self.zoom)), max(1, int(full_h * self.zoom))
+        # 只在尺寸变化时设置：配置画布会让 Tk 再次调用滚动回调，每次都设置会不停地 刷新 -> 滚动回调 -> 刷新
+        scrollregion = (0, 0, display_w, display_h)
+        if scrollregion != self._scrollregion:
+            self._scrollregion = scrollregion
+            self.canvas.config(scrollregion=scrollregion)
+
+        scale, source = self._source_for(self.zoom)
+        effective_zoom = self.zoom / scale
+        source_h, source_w = source.shape[:2]
+        # 图块在源图上的边长 (整数像素)，显示时约为 tile_size
+        step = max(1, int(round(self.tile_size / effective_zoom)))
+        cols, rows = math.ceil(source_w / step), math.ceil(source_h / step)
+
+        view_x, view_y = self.canvas.canvasx(0), self.canvas.canvasy(0)
+        view_w, view_h = max(1, self.canvas.winfo_width()), max(1, self.canvas.winfo_height())
+        tile_span = step * effective_zoom
+        # 可见范围外多保留一圈图块，平移时减少空白
+        col_range = range(max(0, int(view_x // tile_span) - 1), min(cols, int((view_x + view_w) // tile_span) + 2))
+        row_range = range(max(0, int(view_y // tile_span) - 1), min(rows, int((view_y + view_h) // tile_span) + 2))
+
+        visible = set()
+        for row in row_range:
+            for col in col_range:
+                key = (self._state["generation"], scale, effective_zoom, step, col, row)
+                visible.add(key)
+                if key in self._items: continue
+                x0, y0 = col * step, row * step
+                x1, y1 = min(x0 + step, source_w), min(y0 + step, source_h)
+                # 相邻图块的显示边界由同一公式取整，拼接处不会出现缝隙
+                dx0, dy0 = int(round(x0 * effective_zoom)), int(round(y0 * effective_zoom))
+                dx1, dy1 = int(round(x1 * effective_zoom)), int(round(y1 * effective_zoom))
+                photo = self._tile_photo(key, source[y0:y1, x0:x1], dx1 - dx0, dy1 - dy0, effective_zoom)
+                if photo is None: continue
+                item = self.canvas.create_image(dx0, dy0, anchor=tk.NW, image=photo)
+                self._items[key] = (item, photo) # 保持引用，图块被移出缓存时仍可显示
+        for key in [key for key in self._items if key not in visible]:
+            self.canvas.delete(self._items.pop(key)[0])
+
+    def _on_scroll(self, option, first, last):
+        command = self._scroll_commands.get(option)
+        if command:
+            self.canvas.tk.eval(f"{command} {first} {last}")
+        self.schedule_refresh()
+
+    def _source_for(self, zoom):
+        """返回 (缩放比例, 图像)：不小于 zoom 的最小副本，需要时逐级减半生成。"""
+        sources = self._state["sources"]
+        scale = min((s for s in sources if s >= zoom), default=1.0)
+        source = sources[scale]
+        while scale / 2 >= zoom and min(source.shape[:2]) >= 2:
+            half = cv2.resize(source, (source.shape[1] // 2, source.shape[0] // 2), interpolation=cv2.INTER_AREA)
+            scale = half.shape[1] / self._state["image"].shape[1]
+            sources[scale] = source = half
+        return scale, source
+
+    def _tile_photo(self, key, roi, width, height, effective_zoom):
+        photo = self._tiles.get(key)
+        if photo is not None:
+            self._tiles.move_to_end(key)
+            return photo
+        if width <= 0 or height <= 0 or roi.size == 0: return None
+        inter_method = cv2.INTER_AREA if effective_zoom < 1 else cv2.INTER_LINEAR
+        resized = cv2.resize(roi, (width, height), interpolation=inter_method)
+        rgb = cv2.cvtColor(resized, cv2.COLOR_GRAY2RGB if resized.ndim == 2 else cv2.COLOR_BGR2RGB)
+        photo = ImageTk.PhotoImage(Image.fromarray(rgb))
+        self._tiles[key] = photo
+        while len(self._tiles) > self.max_cached_tiles:
+            self._tiles.popitem(last=False)
+        return photo
+
+    def _drop_tiles(self, generation):
+        for key in [key for key in self._tiles if key[0] == generation]:
+            del self._tiles[key]
+        for key in [key for key in self._items if key[0] == generation]:
+            self.canvas.delete(self._items.pop(key)[0])
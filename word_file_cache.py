@@ -0,0 +1,193 @@
+# word_file_cache.py
+# 源 Word 文件的本地下载缓存：连接池复用、ETag/Last-Modified 条件请求、按总大小做 LRU 淘汰
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from collections import defaultdict
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILENAME = "cache_index.json"
+
+
+class WordFileCache:
+    """
+    按 URL 缓存下载的源文件。
+
+    - acquire() 返回本地缓存文件路径；已有缓存时发送条件请求，服务器返回 304 则不再传输内容，
+      在 fresh_seconds 之内重复获取同一 URL 时连请求都不发送。
+    - 使用中的文件会被“钉住”，调用方处理完后必须 release()，被钉住的文件不会被淘汰。
+    - 缓存总大小超过 max_bytes 时，按最近访问时间淘汰最久未用的文件。
+    """
+
+    def __init__(self, cache_dir, max_bytes, fresh_seconds=0, timeout=180, pool_maxsize=16):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.fresh_seconds = fresh_seconds
+        self.timeout = timeout
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_maxsize)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._lock = threading.Lock()
+        self._url_locks = defaultdict(threading.Lock)
+        self._pins = defaultdict(int)
+        self._orphans = set() # 已被新版本替换、但仍被使用中的旧文件
+        self._index = self._load_index()
+
+    # --- 索引持久化 ---
+    def _index_path(self):
+        return os.path.join(self.cache_dir, INDEX_FILENAME)
+
+    def _load_index(self):
+        try:
+            with open(self._index_path(), 'r', encoding='utf-8') as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        # 丢弃文件已不存在的条目
+        return {url: entry for url, entry in index.items()
+                if os.path.exists(os.path.join(self.cache_dir, entry.get("file", "")))}
+
+    def _save_index_locked(self):
+        tmp_path = self._index_path() + ".tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self._index, f, ensure_ascii=False)
+            os.replace(tmp_path, self._index_path())
+        except OSError as e:
+            logger.warning(f"WordFileCache: 无法保存缓存索引: {e}")
+
+    # --- 获取与释放 ---
+    def acquire(self, url, suffix=".docx"):
+        """返回 url 对应的本地缓存路径（已钉住）。下载失败且无缓存可用时抛出 requests 异常。"""
+        with self._lock:
+            url_lock = self._url_locks[url]
+        with url_lock:
+            with self._lock:
+                entry = dict(self._index.get(url, {}))
+            cached_path = os.path.join(self.cache_dir, entry["file"]) if entry else None
+            if cached_path and not os.path.exists(cached_path):
+                entry, cached_path = {}, None
+
+            now = time.time()
+            if cached_path and self.fresh_seconds and now - entry.get("validated_at", 0) < self.fresh_seconds:
+                logger.info(f"WordFileCache: 命中缓存 (未过期，免请求): {url}")
+            else:
+                entry = self._download_or_revalidate(url, suffix, entry, cached_path)
+                cached_path = os.path.join(self.cache_dir, entry["file"])
+
+            with self._lock:
+                old_entry = self._index.get(url)
+                if old_entry and old_entry.get("file") != entry["file"]:
+                    self._discard_file_locked(os.path.join(self.cache_dir, old_entry["file"]))
+                entry["last_access"] = now
+                self._index[url] = entry
+                self._pins[cached_path] += 1
+                self._save_index_locked()
+
+        self._evict_if_needed()
+        return cached_path
+
+    def release(self, path):
+        """处理完毕后释放 acquire() 返回的路径。"""
+        with self._lock:
+            if self._pins.get(path, 0) > 1:
+                self._pins[path] -= 1
+                return
+            self._pins.pop(path, None)
+            if path in self._orphans:
+                self._orphans.discard(path)
+                self._discard_file_locked(path)
+
+    def _discard_file_locked(self, path):
+        if self._pins.get(path):
+            self._orphans.add(path)
+            return
+        try:
+            if os.path.exists(path): os.remove(path)
+        except OSError as e:
+            logger.warning(f"WordFileCache: 删除旧缓存文件 {path} 失败: {e}")
+
+    def _download_or_revalidate(self, url, suffix, entry, cached_path):
+        headers = {}
+        if cached_path:
+            if entry.get("etag"): headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"): headers["If-Modified-Since"] = entry["last_modified"]
+
+        try:
+            response = self.session.get(url, headers=headers, stream=True, timeout=self.timeout)
+            if cached_path and response.status_code == 304:
+                response.close()
+                logger.info(f"WordFileCache: 服务器返回 304，复用缓存: {url}")
+                entry["validated_at"] = time.time()
+                return entry
+            response.raise_for_status()
+
+            # 每个版本使用新文件名，避免覆盖其他请求正在使用（Word 已打开）的旧版本
+            url_hash = hashlib.sha1(url.encode('utf-8')).hexdigest()[:20]
+            filename = f"{url_hash}-{int(time.time() * 1000)}{suffix or ''}"
+            final_path = os.path.join(self.cache_dir, filename)
+            tmp_path = f"{final_path}.part"
+            size = 0
+            try:
+                with open(tmp_path, 'wb') as f:
+                    for chunk in response.iter_content(chunk_size=65536):
+                        f.write(chunk)
+                        size += len(chunk)
+                os.replace(tmp_path, final_path)
+            except BaseException:
+                # 下载中断 (连接断开、超时等) 时删除不完整的 .part 文件，它不在索引中，不会被淘汰
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+                raise
+            logger.info(f"WordFileCache: 已下载 {url} ({size} 字节)")
+            return {
+                "file": filename,
+                "size": size,
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+                "validated_at": time.time(),
+            }
+        except requests.exceptions.RequestException as e:
+            if cached_path:
+                logger.warning(f"WordFileCache: 校验 {url} 失败，使用已缓存的旧副本: {e}")
+                return entry
+            raise
+
+    # --- 淘汰 ---
+    def _evict_if_needed(self):
+        with self._lock:
+            total = sum(e.get("size", 0) for e in self._index.values())
+            if total <= self.max_bytes:
+                return
+            by_age = sorted(self._index.items(), key=lambda item: item[1].get("last_access", 0))
+            changed = False
+            for url, entry in by_age:
+                if total <= self.max_bytes:
+                    break
+                path = os.path.join(self.cache_dir, entry["file"])
+                if self._pins.get(path):
+                    continue
+                try:
+                    if os.path.exists(path): os.remove(path)
+                except OSError as e:
+                    logger.warning(f"WordFileCache: 淘汰 {path} 失败: {e}")
+                    continue
+                total -= entry.get("size", 0)
+                del self._index[url]
+                changed = True
+                logger.info(f"WordFileCache: 已淘汰缓存 {url}")
+            if changed:
+                self._save_index_locked()
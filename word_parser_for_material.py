@@ -38,7 +38,8 @@ def parse_word_to_db(doc_path, material_id, num_levels_to_extract, db_cursor):
         pythoncom.CoInitialize()
         coinitialized = True
         logging.info("Starting Word application for parsing...")
-        word_app = win32.Dispatch("Word.Application")
+        # Use a dedicated Word instance so concurrent jobs do not Quit() each other's Word
+        word_app = win32.DispatchEx("Word.Application")
         word_app.Visible = False
         word_app.DisplayAlerts = False
 
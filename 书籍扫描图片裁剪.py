@@ -7,9 +7,18 @@ import os
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, simpledialog
 import json
-from PIL import Image, ImageTk
 import tempfile
 import shutil
+import queue
+import threading
+import multiprocessing
+from tiled_canvas import TiledImageView
+
+from book_crop_core import (compute_crop_box, scale_contours, params_from_profile, build_job, run_batch,
+                            PipelineStageCache, compute_detection_stages, cached_decoded_image, cached_display_image)
+
+PREVIEW_CACHE_MAX_BYTES = 1024 * 1024 * 1024 # 预览中间结果缓存的内存上限 (所有图片合计)
+PREVIEW_DISPLAY_MAX_SIDE = 2000 # 预览显示用副本的最长边 (像素)
 
 class BookCropperApp(tk.Tk):
     def __init__(self):
@@ -45,10 +54,14 @@ class BookCropperApp(tk.Tk):
         self.clear_edges_var = tk.BooleanVar(value=True)
         self.edge_width_var = tk.StringVar(value="30")
         self.min_area_ratio_var = tk.StringVar(value="1.0")
+        self.proxy_scale_var = tk.StringVar(value="1.0") # 内容检测的缩放比例，<1 时在缩小的图像上检测
         
         # --- 状态与日志变量 ---
         self.preview_window = None
         self.log_messages = []
+        self.batch_events = queue.Queue() # 后台批处理线程 -> 界面的进度/日志事件
+        self.batch_cancel = threading.Event()
+        self.batch_workers = max(1, (os.cpu_count() or 2) - 1) # 留一个核心给界面
         
         # --- UI 控件与预览状态引用 ---
         self.main_swatch_buttons = []
@@ -56,10 +69,16 @@ class BookCropperApp(tk.Tk):
         self.zoom_level = 1.0
         self.zoom_var = tk.DoubleVar(value=1.0)
         self.zoom_label_var = tk.StringVar()
-        self.image_on_canvas = None
+        self.preview_view = None # 预览画布的分块渲染器
         self.current_preview_cv_image = None
         self.original_preview_image = None
         self.preview_current_index = 0 # 预览窗口内使用的索引
+        # 预览/处理过程窗口的分阶段缓存：只修改裁剪参数时不再重新解码和校正倾斜
+        self.stage_cache = PipelineStageCache(PREVIEW_CACHE_MAX_BYTES)
+        self.original_preview_display = None # (显示分辨率副本, 缩放比例)
+        # 后台预取线程：提前解码相邻图片、生成显示副本并计算倾斜角，切换图片时无需等待
+        self.prefetch_requests = queue.Queue()
+        threading.Thread(target=self._prefetch_worker, name="preview-prefetch", daemon=True).start()
 
         self._create_widgets()
         self._load_config()
@@ -115,6 +134,8 @@ class BookCropperApp(tk.Tk):
         ttk.Entry(other_params_frame, textvariable=self.min_area_ratio_var, width=8, state="readonly").grid(row=1, column=1, sticky=tk.EW)
         ttk.Checkbutton(other_params_frame, text="排除宽高比>", variable=self.exclude_aspect_ratio_var, state="disabled").grid(row=1, column=2, sticky=tk.E)
         ttk.Entry(other_params_frame, textvariable=self.aspect_ratio_threshold_var, width=8, state="readonly").grid(row=1, column=3, sticky=tk.EW, padx=5)
+        ttk.Label(other_params_frame, text="检测缩放(0-1]:").grid(row=2, column=0, sticky=tk.W)
+        ttk.Entry(other_params_frame, textvariable=self.proxy_scale_var, width=8, state="readonly").grid(row=2, column=1, sticky=tk.EW)
 
         crop_size_frame = ttk.LabelFrame(params_frame, text="最终裁剪参数 (单位: 像素)", padding="10")
         crop_size_frame.pack(fill=tk.X, pady=2)
@@ -150,139 +171,65 @@ class BookCropperApp(tk.Tk):
         status_label.pack(side=tk.BOTTOM, fill=tk.X)
 
     def start_processing(self):
-        # ... (此函数保持不变)
+        # 在主线程中校验参数，图片处理交给后台线程和进程池
         self.log_messages = []
         self._log("--- 开始新一轮处理任务 ---")
         files_to_process = self.file_listbox.get(0, tk.END)
         if not files_to_process:
             messagebox.showerror("错误", "待处理列表为空，请先添加图片！"); self._log("错误: 待处理列表为空。"); return
-        active_colors = []
-        for i in range(self.NUM_BG_COLORS):
-            if self.bg_colors[i] is not None and self.bg_enabled_vars[i].get():
-                active_colors.append({"color": self.bg_colors[i], "tolerance": self.bg_tolerance_vars[i].get()})
-        if not active_colors:
-            messagebox.showerror("错误", "请至少设置并启用一个有效的背景色！"); self._log("错误: 未设置或启用有效背景色。"); return
+        # 与命令行 (book_crop_cli.py) 使用相同的参数解析
         try:
-            params = {
-                "crop_w": int(self.crop_width_var.get()), "crop_h": int(self.crop_height_var.get()),
-                "offset_y": int(self.top_offset_var.get()), "left_margin": int(self.left_margin_var.get()),
-                "expansion": int(self.expansion_var.get()), "aspect_ratio_limit": float(self.aspect_ratio_threshold_var.get()),
-                "edge_width": int(self.edge_width_var.get()), "min_area_ratio": float(self.min_area_ratio_var.get())
-            }
-            if any(v < 0 for k, v in params.items() if k != "aspect_ratio_limit") or params["aspect_ratio_limit"] <= 0: raise ValueError
-        except ValueError:
-            messagebox.showerror("错误", "所有数值参数必须是有效的正数（部分可为0）！"); self._log("错误: 参数无效。"); return
+            params, active_colors, options = params_from_profile(self._get_parameters_as_dict())
+        except ValueError as e:
+            messagebox.showerror("错误", str(e)); self._log(f"错误: {e}"); return
         save_option, specific_output_dir = self.save_option_var.get(), self.output_dir_var.get()
         if save_option == "specific" and not os.path.isdir(specific_output_dir):
             messagebox.showerror("错误", "请选择一个有效的指定输出目录！"); self._log("错误: 指定输出目录无效。"); return
+        output_dir = specific_output_dir if save_option == "specific" else None
+        jobs = [build_job(image_path, output_dir, self.debug_mode_var.get()) for image_path in files_to_process]
         self.btn_process.config(state="disabled")
-        total_files, success_count = len(files_to_process), 0
-        for i, image_path in enumerate(files_to_process):
-            basename = os.path.basename(image_path)
-            self._log(f"({i+1}/{total_files}) 开始处理: {basename}")
-            try:
-                source_dir, filename = os.path.split(image_path); name, ext = os.path.splitext(filename)
-                final_output_dir = specific_output_dir if save_option == "specific" else source_dir
-                os.makedirs(final_output_dir, exist_ok=True)
-                final_cropped_path = os.path.join(final_output_dir, f"{name}_cropped{ext}")
-                debug_base_path = None
-                if self.debug_mode_var.get():
-                    debug_dir = os.path.join(final_output_dir, "debug_output"); os.makedirs(debug_dir, exist_ok=True)
-                    debug_base_path = os.path.join(debug_dir, name); self._log(f"  > 调试模式开启", to_status=False)
-                with open(image_path, 'rb') as f: image_data = np.frombuffer(f.read(), np.uint8)
-                original_image = cv2.imdecode(image_data, cv2.IMREAD_COLOR)
-                if original_image is None: self._log(f"  > 警告: 无法解码图片 {basename}"); continue
-                img_h, img_w = original_image.shape[:2]; self._log(f"  > 图片加载成功: {img_w}x{img_h}", to_status=False)
-                if debug_base_path: self._save_image_robust(f"{debug_base_path}_01_original.png", original_image)
-                working_image, angle = self._deskew_with_projection_profile(original_image)
-                if debug_base_path: self._save_image_robust(f"{debug_base_path}_02_rotated.png", working_image)
-                img_h, img_w = working_image.shape[:2]
-                if self.clear_edges_var.get() and params["edge_width"] > 0:
-                    ew = min(params["edge_width"], img_h // 2, img_w // 2); color_bgr = active_colors[0]['color'].tolist()
-                    cv2.rectangle(working_image, (0, 0), (img_w - 1, ew - 1), color_bgr, -1); cv2.rectangle(working_image, (0, img_h - ew), (img_w - 1, img_h - 1), color_bgr, -1); cv2.rectangle(working_image, (0, 0), (ew - 1, img_h - 1), color_bgr, -1); cv2.rectangle(working_image, (img_w - ew, 0), (img_w - 1, img_h - 1), color_bgr, -1)
-                    if debug_base_path: self._save_image_robust(f"{debug_base_path}_03_edges_cleared.png", working_image)
-                total_background_mask = np.zeros((img_h, img_w), dtype=np.uint8)
-                for ac in active_colors:
-                    lower = np.clip(ac["color"].astype(np.int16) - ac["tolerance"], 0, 255).astype(np.uint8)
-                    upper = np.clip(ac["color"].astype(np.int16) + ac["tolerance"], 0, 255).astype(np.uint8)
-                    total_background_mask = cv2.bitwise_or(total_background_mask, cv2.inRange(working_image, lower, upper))
-                content_mask = cv2.bitwise_not(total_background_mask)
-                if debug_base_path: self._save_image_robust(f"{debug_base_path}_04_content_mask.png", content_mask)
-                if params["expansion"] > 0:
-                    kernel = np.ones((params["expansion"], params["expansion"]), np.uint8)
-                    content_mask = cv2.dilate(content_mask, kernel, iterations=1)
-                    if debug_base_path: self._save_image_robust(f"{debug_base_path}_05_dilated_mask.png", content_mask)
-                contours, _ = cv2.findContours(content_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-                min_area = (img_h * img_w) * (params["min_area_ratio"] / 10000.0)
-                significant_contours = []
-                for c in contours:
-                    if cv2.contourArea(c) < min_area: continue
-                    if self.exclude_aspect_ratio_var.get():
-                        x, y, w, h = cv2.boundingRect(c)
-                        if w == 0 or h == 0 or max(w/h, h/w) > params["aspect_ratio_limit"]: continue
-                    significant_contours.append(c)
-                if debug_base_path:
-                    dbg_img_contours = working_image.copy()
-                    cv2.drawContours(dbg_img_contours, significant_contours, -1, (0, 0, 255), 3)
-                    self._save_image_robust(f"{debug_base_path}_06_filtered_contours.png", dbg_img_contours)
-                if not significant_contours: self._log(f"  > 警告: 未找到有效内容。"); continue
-                all_points = np.vstack(significant_contours)
-                content_box_x_min, _, content_width, _ = cv2.boundingRect(all_points)
-                if content_width >= params["crop_w"] * 0.9:
-                    self._log(f"  > 内容宽度({content_width}px)较大，采用居中策略。", to_status=False)
-                    content_center_x = content_box_x_min + content_width / 2
-                    x1 = content_center_x - (params["crop_w"] / 2)
-                else:
-                    self._log(f"  > 采用左边距策略 (边距: {params['left_margin']}px)。", to_status=False)
-                    x1 = all_points[:, :, 0].min() - params["left_margin"]
-                x1 = max(0, x1); y1 = max(0, params["offset_y"]); x2 = min(img_w, x1 + params["crop_w"]); y2 = min(img_h, y1 + params["crop_h"])
-                if debug_base_path:
-                    dbg_img_crop_box = working_image.copy()
-                    cv2.rectangle(dbg_img_crop_box, (int(x1), int(y1)), (int(x2), int(y2)), (0, 255, 0), 5)
-                    self._save_image_robust(f"{debug_base_path}_07_crop_area.png", dbg_img_crop_box)
-                cropped_image = working_image[int(y1):int(y2), int(x1):int(x2)]
-                if debug_base_path:
-                    self._save_image_robust(f"{debug_base_path}_08_final_cropped.png", cropped_image)
-                self._save_image_robust(final_cropped_path, cropped_image, ext)
-                self._log(f"  > 保存成功: {os.path.basename(final_cropped_path)}", to_status=False)
-                success_count += 1
-            except Exception as e:
-                import traceback; traceback.print_exc()
-                self._log(f"  > 错误: 处理文件 {basename} 时发生异常: {e}")
-        self._log(f"--- 处理完成！成功 {success_count}/{total_files}。 ---")
-        self.btn_process.config(state="normal")
-        messagebox.showinfo("完成", f"所有任务已处理完毕。\n\n成功: {success_count}\n失败: {total_files - success_count}\n\n详细信息请点击“查看处理日志”。")
-
-    def _deskew_with_projection_profile(self, img):
-        # ... (此函数保持不变)
-        self._log("  > 使用投影剖面法进行倾斜校正...", to_status=False)
-        img_gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        _, img_binary = cv2.threshold(img_gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
-        h, w = img_binary.shape[:2]
-        angle_range = 5; angle_step = 0.1
-        angles = np.arange(-angle_range, angle_range + angle_step, angle_step)
-        max_score = -1.0; best_angle = 0.0
-        for angle in angles:
-            center = (w // 2, h // 2)
-            M = cv2.getRotationMatrix2D(center, angle, 1.0)
-            rotated_binary = cv2.warpAffine(img_binary, M, (w, h), flags=cv2.INTER_CUBIC, borderMode=cv2.BORDER_CONSTANT, borderValue=0)
-            horizontal_projection = np.sum(rotated_binary, axis=1)
-            score = np.var(horizontal_projection)
-            if score > max_score:
-                max_score = score
-                best_angle = angle
-        self._log(f"  > 投影法检测到最佳倾斜角: {best_angle:.2f}°", to_status=False)
-        if abs(best_angle) < 0.1:
-             self._log(f"  > 倾斜角度 {best_angle:.2f}° 过小，跳过旋转。", to_status=False)
-             return img, 0.0
-        if abs(best_angle) >= angle_range:
-             self._log(f"  > 警告: 倾斜角度达到搜索边界 ({best_angle:.2f}°), 可能校正不准确。", to_status=False)
-        self._log(f"  > 进行校正...", to_status=False)
-        center = (img.shape[1] // 2, img.shape[0] // 2)
-        M_final = cv2.getRotationMatrix2D(center, best_angle, 1.0)
-        fill_color = self.bg_colors[0].tolist() if self.bg_colors[0] is not None and len(self.bg_colors) > 0 else [255, 255, 255]
-        rotated_img = cv2.warpAffine(img, M_final, (img.shape[1], img.shape[0]), flags=cv2.INTER_CUBIC, borderMode=cv2.BORDER_CONSTANT, borderValue=fill_color)
-        return rotated_img, best_angle
+        self.batch_cancel.clear()
+        self._log(f"共 {len(jobs)} 张图片，使用 {self.batch_workers} 个进程并行处理。")
+        threading.Thread(target=self._run_batch, args=(jobs, params, active_colors, options), daemon=True).start()
+        self.after(100, self._poll_batch_events)
+
+    def _run_batch(self, jobs, params, active_colors, options):
+        """后台线程：把图片提交到进程池，同时在途的任务数有上限，结果通过 batch_events 交给界面。"""
+        success_count, done_count = 0, 0
+        try:
+            for result in run_batch(jobs, params, active_colors, options, self.batch_workers, self.batch_cancel):
+                done_count += 1
+                success_count += result["success"]
+                self.batch_events.put(("result", done_count, len(jobs), result))
+        except Exception as e:
+            self.batch_events.put(("error", str(e)))
+        self.batch_events.put(("finished", success_count, len(jobs)))
+
+    def _poll_batch_events(self):
+        """在 Tk 主线程中处理批处理事件。"""
+        try:
+            while True:
+                event = self.batch_events.get_nowait()
+                if event[0] == "result":
+                    _, done_count, total_files, result = event
+                    self._log(f"({done_count}/{total_files}) 处理完毕: {os.path.basename(result['path'])}", to_status=False)
+                    for message, to_status in result["logs"]: self._log(message, to_status=to_status)
+                    self.update_status(f"正在处理... {done_count}/{total_files}")
+                elif event[0] == "error":
+                    self._log(f"错误: 批处理异常终止: {event[1]}")
+                elif event[0] == "finished":
+                    _, success_count, total_files = event
+                    self._log(f"--- 处理完成！成功 {success_count}/{total_files}。 ---")
+                    self.btn_process.config(state="normal")
+                    messagebox.showinfo("完成", f"所有任务已处理完毕。\n\n成功: {success_count}\n失败: {total_files - success_count}\n\n详细信息请点击“查看处理日志”。")
+                    return
+        except queue.Empty:
+            pass
+        self.after(100, self._poll_batch_events)
+
+    def _deskew_fill_color(self):
+        # 旋转后空出区域的填充色取第一个背景色槽
+        return self.bg_colors[0].tolist() if self.bg_colors[0] is not None and len(self.bg_colors) > 0 else [255, 255, 255]
 
     # --- 以下为UI、配置、预览窗口相关函数 (已重构) ---
 
@@ -350,6 +297,7 @@ class BookCropperApp(tk.Tk):
             "expansion": self.expansion_var.get(), "exclude_aspect_ratio": self.exclude_aspect_ratio_var.get(),
             "aspect_ratio_threshold": self.aspect_ratio_threshold_var.get(), "clear_edges": self.clear_edges_var.get(),
             "edge_width": self.edge_width_var.get(), "min_area_ratio": self.min_area_ratio_var.get(),
+            "proxy_scale": self.proxy_scale_var.get(),
         }
         return params
         
@@ -375,6 +323,7 @@ class BookCropperApp(tk.Tk):
         self.expansion_var.set(config.get("expansion", "6")); self.exclude_aspect_ratio_var.set(config.get("exclude_aspect_ratio", True))
         self.aspect_ratio_threshold_var.set(config.get("aspect_ratio_threshold", "6")); self.clear_edges_var.set(config.get("clear_edges", True))
         self.edge_width_var.set(config.get("edge_width", "30")); self.min_area_ratio_var.set(config.get("min_area_ratio", "1.0"))
+        self.proxy_scale_var.set(config.get("proxy_scale", "1.0"))
         self.toggle_output_path()
         self.update_status("已成功加载参数配置。")
 
@@ -444,17 +393,33 @@ class BookCropperApp(tk.Tk):
     def _load_image_for_preview(self, index):
         try:
             selected_path = self.file_listbox.get(index)
-            with open(selected_path, 'rb') as f:
-                image_data = np.frombuffer(f.read(), np.uint8)
-            self.original_preview_image = cv2.imdecode(image_data, cv2.IMREAD_COLOR)
-            if self.original_preview_image is None:
-                raise IOError("无法解码图像")
+            self.original_preview_image = cached_decoded_image(self.stage_cache, selected_path)
+            self.original_preview_display = cached_display_image(self.stage_cache, selected_path, PREVIEW_DISPLAY_MAX_SIDE)
+            self._schedule_prefetch(index)
             return True
         except Exception as e:
             messagebox.showerror("错误", f"无法打开图片: {e}")
             self._on_preview_close()
             return False
 
+    def _schedule_prefetch(self, index):
+        # 先预取下一张，再预取上一张；只取前后各一张，避免把当前图片的中间结果挤出缓存
+        size = self.file_listbox.size()
+        paths = [self.file_listbox.get(i) for i in (index + 1, index - 1) if 0 <= i < size]
+        self.prefetch_requests.put((paths, self._deskew_fill_color()))
+
+    def _prefetch_worker(self):
+        # 在后台线程中运行，只访问 stage_cache，不接触任何 Tk 控件
+        while True:
+            paths, fill_color = self.prefetch_requests.get()
+            for path in paths:
+                if not self.prefetch_requests.empty(): break # 用户已切换图片，改为预取新的相邻图片
+                try:
+                    cached_display_image(self.stage_cache, path, PREVIEW_DISPLAY_MAX_SIDE)
+                    compute_detection_stages(self.stage_cache, path, None, None, {"fill_color": fill_color}, until="deskewed")
+                except Exception as e: # 预取失败不影响正常打开，打开时会再次报告错误
+                    print(f"预取 {path} 失败: {e}")
+
     def _create_canvas_area(self, parent):
         canvas_frame = ttk.Frame(parent)
         canvas_frame.pack(fill=tk.BOTH, expand=True)
@@ -467,6 +432,7 @@ class BookCropperApp(tk.Tk):
         h_scroll.pack(side=tk.BOTTOM, fill=tk.X)
         v_scroll.pack(side=tk.RIGHT, fill=tk.Y)
         self.canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.preview_view = TiledImageView(self.canvas)
 
         self.canvas.bind("<MouseWheel>", self._on_zoom)
         self.canvas.bind("<Button-4>", self._on_zoom); self.canvas.bind("<Button-5>", self._on_zoom)
@@ -565,6 +531,7 @@ class BookCropperApp(tk.Tk):
         ttk.Label(other_params_frame, text="选区扩展(px):").grid(row=0, column=2, sticky=tk.E); ttk.Entry(other_params_frame, textvariable=self.expansion_var, width=8).grid(row=0, column=3, sticky=tk.EW, padx=5)
         ttk.Label(other_params_frame, text="最小面积(‱):").grid(row=1, column=0, sticky=tk.W); ttk.Entry(other_params_frame, textvariable=self.min_area_ratio_var, width=8).grid(row=1, column=1, sticky=tk.EW)
         ttk.Checkbutton(other_params_frame, text="排除宽高比>", variable=self.exclude_aspect_ratio_var).grid(row=1, column=2, sticky=tk.E); ttk.Entry(other_params_frame, textvariable=self.aspect_ratio_threshold_var, width=8).grid(row=1, column=3, sticky=tk.EW, padx=5)
+        ttk.Label(other_params_frame, text="检测缩放(0-1]:").grid(row=2, column=0, sticky=tk.W); ttk.Entry(other_params_frame, textvariable=self.proxy_scale_var, width=8).grid(row=2, column=1, sticky=tk.EW)
 
         output_frame = ttk.LabelFrame(parent_frame, text="输出与调试", padding="10")
         output_frame.pack(fill=tk.X, pady=5); output_frame.columnconfigure(1, weight=1)
@@ -695,16 +662,9 @@ class BookCropperApp(tk.Tk):
         if cv_image is None or not (self.preview_window and self.preview_window.winfo_exists()): return
         self.zoom_level = self.zoom_var.get()
         self._update_zoom_label()
-        
-        h, w = cv_image.shape[:2]
-        new_w, new_h = int(w * self.zoom_level), int(h * self.zoom_level)
-        inter_method = cv2.INTER_AREA if self.zoom_level < 1 else cv2.INTER_LINEAR
-        resized_view = cv2.resize(cv_image, (new_w, new_h), interpolation=inter_method)
-        img_rgb = cv2.cvtColor(resized_view, cv2.COLOR_BGR2RGB)
-        self.preview_photo_image = ImageTk.PhotoImage(Image.fromarray(img_rgb))
-        if self.image_on_canvas: self.canvas.delete(self.image_on_canvas)
-        self.image_on_canvas = self.canvas.create_image(0, 0, anchor=tk.NW, image=self.preview_photo_image)
-        self.canvas.config(scrollregion=self.canvas.bbox("all"))
+        # 只渲染可见图块；原图缩小显示时从预取的显示副本取像素，尺寸与坐标不变
+        overview = self.original_preview_display if cv_image is self.original_preview_image else None
+        self.preview_view.set_image(cv_image, overview, zoom=self.zoom_level)
 
     def _canvas_to_image_coords(self, canvas_x, canvas_y):
         img_x = (self.canvas.canvasx(0) + canvas_x) / self.zoom_level
@@ -752,11 +712,8 @@ class BookCropperApp(tk.Tk):
         self.preview_window.update_idletasks() # 强制UI更新
         
         try:
-            # 使用副本进行所有处理
-            preview_image = self.original_preview_image.copy()
-            
-            # 调用核心处理逻辑，但仅用于生成可视化结果
-            display_image, _ = self._generate_visual_steps(preview_image, return_final_preview=True)
+            # 调用核心处理逻辑，但仅用于生成可视化结果 (未变化的阶段直接取缓存)
+            display_image, _ = self._generate_visual_steps(self.file_listbox.get(self.preview_current_index), return_final_preview=True)
 
             if display_image is not None:
                 self.current_preview_cv_image = display_image
@@ -776,8 +733,10 @@ class BookCropperApp(tk.Tk):
                 "crop_w": int(self.crop_width_var.get()), "crop_h": int(self.crop_height_var.get()),
                 "offset_y": int(self.top_offset_var.get()), "left_margin": int(self.left_margin_var.get()),
                 "expansion": int(self.expansion_var.get()), "aspect_ratio_limit": float(self.aspect_ratio_threshold_var.get()),
-                "edge_width": int(self.edge_width_var.get()), "min_area_ratio": float(self.min_area_ratio_var.get())
+                "edge_width": int(self.edge_width_var.get()), "min_area_ratio": float(self.min_area_ratio_var.get()),
+                "proxy_scale": float(self.proxy_scale_var.get())
             }
+            if not 0 < params["proxy_scale"] <= 1: raise ValueError("检测缩放比例必须在 0 到 1 之间")
             active_colors = []
             for i in range(self.NUM_BG_COLORS):
                 if self.bg_colors[i] is not None and self.bg_enabled_vars[i].get():
@@ -790,66 +749,52 @@ class BookCropperApp(tk.Tk):
             messagebox.showerror("参数错误", f"处理失败，参数无效: {e}")
             return None, None
 
-    def _generate_visual_steps(self, original_image, return_final_preview=False):
-        # ... (此函数保持不变)
+    def _generate_visual_steps(self, image_path, return_final_preview=False):
         params, active_colors = self._get_processing_params()
         if params is None:
             return (None, None) if return_final_preview else []
 
-        steps = []
-        img_copy = original_image.copy()
-        steps.append(("01_Original", img_copy.copy()))
+        options = {"clear_edges_enabled": self.clear_edges_var.get(), "exclude_aspect_ratio": self.exclude_aspect_ratio_var.get(),
+                   "fill_color": self._deskew_fill_color()}
+        try:
+            stages = compute_detection_stages(self.stage_cache, image_path, params, active_colors, options,
+                                              log=lambda message: self._log(message, to_status=False))
+        except (OSError, IOError) as e:
+            messagebox.showerror("错误", f"无法打开图片: {e}")
+            return (None, None) if return_final_preview else []
 
-        working_image, _ = self._deskew_with_projection_profile(img_copy)
-        steps.append(("02_Rotated", working_image.copy()))
-        
-        display_image = working_image.copy()
+        # 缓存中的图像会被复用，以下只读取或在副本上绘制
+        steps = [("01_Original", stages["decoded"]), ("02_Rotated", stages["deskewed"])]
+        working_image = stages["edge_cleared"]
+        display_image = stages["deskewed"].copy()
         overlay = np.zeros_like(display_image, dtype=np.uint8)
         alpha = 0.3
         
         img_h, img_w = working_image.shape[:2]
-        significant_contours = []
 
         if self.clear_edges_var.get() and params["edge_width"] > 0:
-            ew = min(params["edge_width"], img_h // 2, img_w // 2)
-            color_bgr = active_colors[0]['color'].tolist()
-            cv2.rectangle(working_image, (0, 0), (img_w - 1, ew - 1), color_bgr, -1); cv2.rectangle(working_image, (0, img_h - ew), (img_w - 1, img_h - 1), color_bgr, -1)
-            cv2.rectangle(working_image, (0, 0), (ew - 1, img_h - 1), color_bgr, -1); cv2.rectangle(working_image, (img_w - ew, 0), (img_w - 1, img_h - 1), color_bgr, -1)
-            steps.append(("03_Edges_Cleared_Internal", working_image.copy()))
+            ew = stages["edge_width"]
+            steps.append(("03_Edges_Cleared_Internal", working_image))
             # For display
             cv2.rectangle(overlay, (0, 0), (img_w - 1, ew - 1), (255, 100, 0), -1) # Blue overlay
             cv2.rectangle(overlay, (0, img_h - ew), (img_w - 1, img_h - 1), (255, 100, 0), -1)
             cv2.rectangle(overlay, (0, 0), (ew - 1, img_h - 1), (255, 100, 0), -1)
             cv2.rectangle(overlay, (img_w - ew, 0), (img_w - 1, img_h - 1), (255, 100, 0), -1)
 
-        total_background_mask = np.zeros((img_h, img_w), dtype=np.uint8)
-        for ac in active_colors:
-            lower = np.clip(ac["color"].astype(np.int16) - ac["tolerance"], 0, 255).astype(np.uint8)
-            upper = np.clip(ac["color"].astype(np.int16) + ac["tolerance"], 0, 255).astype(np.uint8)
-            total_background_mask = cv2.bitwise_or(total_background_mask, cv2.inRange(working_image, lower, upper))
-        content_mask = cv2.bitwise_not(total_background_mask)
-        steps.append(("04_Content_Mask", cv2.cvtColor(content_mask, cv2.COLOR_GRAY2BGR)))
-
+        steps.append(("04_Content_Mask", cv2.cvtColor(stages["content_mask"], cv2.COLOR_GRAY2BGR)))
         if params["expansion"] > 0:
-            kernel = np.ones((params["expansion"], params["expansion"]), np.uint8)
-            content_mask = cv2.dilate(content_mask, kernel, iterations=1)
-            steps.append(("05_Dilated_Mask", cv2.cvtColor(content_mask, cv2.COLOR_GRAY2BGR)))
+            steps.append(("05_Dilated_Mask", cv2.cvtColor(stages["dilated_mask"], cv2.COLOR_GRAY2BGR)))
             
-        contours, _ = cv2.findContours(content_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        min_area = (img_h * img_w) * (params["min_area_ratio"] / 10000.0)
-        significant_contours = [c for c in contours if cv2.contourArea(c) >= min_area and not (self.exclude_aspect_ratio_var.get() and (w:=cv2.boundingRect(c)[2]) > 0 and (h:=cv2.boundingRect(c)[3]) > 0 and max(w/h, h/w) > params["aspect_ratio_limit"])]
+        significant_contours, scale = stages["contours"], stages["detect_scale"]
+        display_contours = scale_contours(significant_contours, 1 / scale) if scale != 1.0 else significant_contours
         
         contour_img = display_image.copy()
-        cv2.drawContours(contour_img, significant_contours, -1, (0, 0, 255), 3)
+        cv2.drawContours(contour_img, display_contours, -1, (0, 0, 255), 3)
         steps.append(("06_Filtered_Contours", contour_img))
 
         if significant_contours:
-            cv2.drawContours(overlay, significant_contours, -1, (0, 0, 255), -1) # Red overlay
-            all_points = np.vstack(significant_contours)
-            x_min, _, w, _ = cv2.boundingRect(all_points)
-            x1 = x_min + w / 2 - params["crop_w"] / 2 if w >= params["crop_w"] * 0.9 else all_points[:, :, 0].min() - params["left_margin"]
-            x1, y1 = max(0, x1), max(0, params["offset_y"])
-            x2, y2 = min(img_w, x1 + params["crop_w"]), min(img_h, y1 + params["crop_h"])
+            cv2.drawContours(overlay, display_contours, -1, (0, 0, 255), -1) # Red overlay
+            (x1, y1, x2, y2), _, _ = compute_crop_box(significant_contours, params, img_w, img_h, scale)
             
             crop_box_img = display_image.copy()
             cv2.rectangle(crop_box_img, (int(x1), int(y1)), (int(x2), int(y2)), (0, 255, 0), max(3, int(img_w / 300)))
@@ -871,17 +816,10 @@ class BookCropperApp(tk.Tk):
             return
 
         image_path = self.file_listbox.get(self.file_listbox.curselection())
-        try:
-            with open(image_path, 'rb') as f: image_data = np.frombuffer(f.read(), np.uint8)
-            original_image = cv2.imdecode(image_data, cv2.IMREAD_COLOR)
-            if original_image is None: raise IOError("无法解码图像")
-        except Exception as e:
-            messagebox.showerror("错误", f"无法打开图片: {e}"); return
-        
         self.update_status("正在生成处理步骤图...")
         self.update_idletasks()
         
-        steps_data = self._generate_visual_steps(original_image)
+        steps_data = self._generate_visual_steps(image_path)
         
         if not steps_data:
             self.update_status("生成处理步骤失败，请检查参数。")
@@ -901,11 +839,9 @@ class BookCropperApp(tk.Tk):
         viewer.state = {
             "current_index": 0,
             "steps_data": steps_data,
-            "photo_image": None,
             "zoom_level": 1.0,
             "zoom_var": tk.DoubleVar(value=1.0),
             "zoom_label_var": tk.StringVar(),
-            "image_on_canvas": None,
             "current_cv_img": None
         }
 
@@ -930,6 +866,7 @@ class BookCropperApp(tk.Tk):
         h_scroll.pack(side=tk.BOTTOM, fill=tk.X)
         v_scroll.pack(side=tk.RIGHT, fill=tk.Y)
         canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        view = TiledImageView(canvas)
 
         # 3. 缩放控制 (放置在右侧)
         zoom_frame = tk.Frame(viewer)
@@ -961,7 +898,7 @@ class BookCropperApp(tk.Tk):
             viewer.state["zoom_label_var"].set(f"{viewer.state['zoom_level']:.0%}")
 
         def apply_zoom():
-            if viewer.state['image_on_canvas'] is not None:
+            if viewer.state['current_cv_img'] is not None:
                 update_display(reload_image=False)
         
         def zoom_in():
@@ -1017,22 +954,7 @@ class BookCropperApp(tk.Tk):
 
             current_cv_img = viewer.state.get("current_cv_img")
             if current_cv_img is None: return
-
-            h, w = current_cv_img.shape[:2]
-            zoom = viewer.state["zoom_level"]
-            new_w, new_h = int(w * zoom), int(h * zoom)
-            
-            if new_w > 0 and new_h > 0:
-                inter_method = cv2.INTER_AREA if zoom < 1.0 else cv2.INTER_LINEAR
-                resized_img = cv2.resize(current_cv_img, (new_w, new_h), interpolation=inter_method)
-                img_rgb = cv2.cvtColor(resized_img, cv2.COLOR_BGR2RGB)
-                photo = ImageTk.PhotoImage(Image.fromarray(img_rgb))
-                
-                if viewer.state["image_on_canvas"]: canvas.delete(viewer.state["image_on_canvas"])
-                
-                viewer.state["image_on_canvas"] = canvas.create_image(0, 0, anchor=tk.NW, image=photo)
-                viewer.state["photo_image"] = photo # 保持引用
-                canvas.config(scrollregion=canvas.bbox("all"))
+            view.set_image(current_cv_img, zoom=viewer.state["zoom_level"])
 
         def navigate(direction):
             new_index = viewer.state["current_index"] + direction
@@ -1121,23 +1043,10 @@ class BookCropperApp(tk.Tk):
         self.status_var.set(message); self.update_idletasks()
 
     def _on_closing(self):
-        # ... (此函数保持不变)
+        self.batch_cancel.set() # 不再提交新的图片，已在处理中的图片完成后进程池退出
         self._on_preview_close()
         self._save_config(); self.destroy()
 
-    def _save_image_robust(self, file_path, image_data, extension=".png"):
-        # ... (此函数保持不变)
-        try:
-            if not file_path.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp', '.tiff')):
-                file_ext = extension
-            else:
-                file_ext = os.path.splitext(file_path)[1]
-            is_success, buffer = cv2.imencode(file_ext, image_data)
-            if is_success:
-                with open(file_path, "wb") as f: f.write(buffer)
-            else: self._log(f"  > 警告: 无法编码图片 {os.path.basename(file_path)}", to_status=False)
-        except Exception as e: self._log(f"  > 警告: 保存图片失败 {file_path}: {e}", to_status=False)
-
     def _on_listbox_select(self, event):
         # 绑定到双击事件
         if not self.file_listbox.curselection(): return
@@ -1151,5 +1060,6 @@ class BookCropperApp(tk.Tk):
             self.btn_settings.config(state=tk.DISABLED)
 
 if __name__ == '__main__':
+    multiprocessing.freeze_support() # 打包为 exe 时进程池需要
     app = BookCropperApp()
     app.mainloop()
\ No newline at end of file
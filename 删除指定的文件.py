@@ -1,16 +1,38 @@
 import tkinter as tk
-from tkinter import scrolledtext, filedialog, messagebox
+from tkinter import ttk, scrolledtext, filedialog, messagebox
 import os
+import queue
+import re
+import threading
+from collections import Counter
+from datetime import datetime
+from delete_engine import (expand_targets, run_delete, remove_empty_dirs, DeleteSummary, QuarantineBatch,
+                           list_quarantine_batches, restore_batch, purge_batch, QUARANTINE_ROOT)
+
+PREVIEW_COUNT = 5 # 确认对话框中列出的文件数
+JOB_PROGRESS_EVERY = 500 # 隔离区恢复/清除时每处理多少个文件报告一次进度
 
 class FileDeleterApp(tk.Tk):
     def __init__(self):
         super().__init__()
         self.title("文件批量删除工具")
-        self.geometry("600x500")
+        self.geometry("600x660")
         self.resizable(False, False) # 不允许调整窗口大小
 
+        self.events = queue.Queue() # 后台线程 -> 界面的进度和结果
+        self.cancel_event = threading.Event()
+        self.summary = None # 删除过程中的结果汇总 (DeleteSummary)
+        self.delete_total = 0
+        self.job_events = queue.Queue() # 隔离区的恢复/清除任务 (后台进行，可关闭隔离区窗口)
+        self.job_cancel = threading.Event()
+        self.job_running = False
+        self.manager_window = None
+        self.protocol("WM_DELETE_WINDOW", self.on_closing)
+
         # 1. 说明标签
-        self.label = tk.Label(self, text="请输入要删除的文件路径（每行一个，支持粘贴）：", font=("Helvetica", 10))
+        self.label = tk.Label(self, text="请输入要删除的文件、目录或通配符（每行一个，支持粘贴）：\n"
+                                         "目录会连同其中的全部文件删除；通配符如 D:\\扫描\\**\\*.tmp (** 表示任意层子目录)",
+                              font=("Helvetica", 10), justify=tk.LEFT)
         self.label.pack(pady=10)
 
         # 2. 文件列表输入框 (带滚动条的文本框)
@@ -18,6 +40,24 @@ class FileDeleterApp(tk.Tk):
         self.file_list_text.pack(pady=5)
         self.file_list_text.focus_set() # 启动时让输入框获得焦点
 
+        # 正则过滤 (可选)：只作用于由目录和通配符展开得到的文件
+        self.filter_frame = tk.Frame(self)
+        self.filter_frame.pack(fill=tk.X, padx=20)
+        tk.Label(self.filter_frame, text="仅删除完整路径匹配此正则的文件 (可选):", font=("Helvetica", 9)).pack(side=tk.LEFT)
+        self.regex_var = tk.StringVar()
+        tk.Entry(self.filter_frame, textvariable=self.regex_var, font=("Consolas", 9)).pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
+
+        # 隔离模式 (可选，默认关闭)：文件移到隔离目录 (同一磁盘内改名，速度快)，之后可恢复或彻底清除。
+        # 默认隔离目录在用户目录所在的磁盘上，其他磁盘 (D: 盘、网络盘) 的文件需先选择该磁盘上的隔离目录
+        self.quarantine_frame = tk.Frame(self)
+        self.quarantine_frame.pack(fill=tk.X, padx=20, pady=(5, 0))
+        self.quarantine_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(self.quarantine_frame, text="移到隔离区 (可恢复)，隔离目录:", variable=self.quarantine_var,
+                       font=("Helvetica", 9)).pack(side=tk.LEFT)
+        self.quarantine_dir_var = tk.StringVar(value=QUARANTINE_ROOT)
+        tk.Entry(self.quarantine_frame, textvariable=self.quarantine_dir_var, font=("Consolas", 9)).pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
+        tk.Button(self.quarantine_frame, text="选择...", command=self.browse_quarantine_dir, font=("Helvetica", 9)).pack(side=tk.LEFT)
+
         # 3. 按钮框架
         self.button_frame = tk.Frame(self)
         self.button_frame.pack(pady=10)
@@ -25,6 +65,9 @@ class FileDeleterApp(tk.Tk):
         self.browse_button = tk.Button(self.button_frame, text="浏览文件...", command=self.browse_files, font=("Helvetica", 9))
         self.browse_button.pack(side=tk.LEFT, padx=10)
 
+        self.browse_dir_button = tk.Button(self.button_frame, text="浏览目录...", command=self.browse_directory, font=("Helvetica", 9))
+        self.browse_dir_button.pack(side=tk.LEFT, padx=10)
+
         self.clear_button = tk.Button(self.button_frame, text="清空", command=self.clear_input, font=("Helvetica", 9))
         self.clear_button.pack(side=tk.LEFT, padx=10)
 
@@ -33,7 +76,12 @@ class FileDeleterApp(tk.Tk):
                                        activebackground="#CC0000", activeforeground="white")
         self.delete_button.pack(side=tk.LEFT, padx=20)
 
-        # 4. 状态信息标签
+        self.manager_button = tk.Button(self.button_frame, text="隔离区...", command=self.open_quarantine_manager, font=("Helvetica", 9))
+        self.manager_button.pack(side=tk.LEFT, padx=10)
+
+        # 4. 进度条和状态信息标签
+        self.progress_bar = ttk.Progressbar(self, orient="horizontal", mode="determinate", length=540)
+        self.progress_bar.pack(pady=(5, 0))
         self.status_label = tk.Label(self, text="等待操作...", fg="blue", font=("Helvetica", 10))
         self.status_label.pack(pady=10)
 
@@ -51,13 +99,31 @@ class FileDeleterApp(tk.Tk):
                     self.file_list_text.insert(tk.END, fp + "\n")
             self.status_label.config(text=f"已添加 {len(filepaths)} 个文件路径。")
 
+    def browse_directory(self):
+        """选择一个目录，整个目录将被删除"""
+        directory = filedialog.askdirectory(title="选择要删除的目录")
+        if directory:
+            self.file_list_text.insert(tk.END, os.path.normpath(directory) + "\n")
+            self.status_label.config(text=f"已添加目录: {directory}", fg="blue")
+
+    def browse_quarantine_dir(self):
+        """隔离目录须与要删除的文件在同一磁盘上"""
+        directory = filedialog.askdirectory(title="选择隔离目录 (须与要删除的文件在同一磁盘)")
+        if directory:
+            self.quarantine_dir_var.set(os.path.normpath(directory))
+
     def clear_input(self):
         """清空文件列表输入框的内容"""
         self.file_list_text.delete(1.0, tk.END) # 1.0表示第一行第一个字符到末尾
         self.status_label.config(text="输入框已清空。")
 
+    def set_busy(self, busy):
+        state = "disabled" if busy else "normal"
+        for button in (self.browse_button, self.browse_dir_button, self.clear_button, self.delete_button):
+            button.config(state=state)
+
     def confirm_deletion(self):
-        """获取文件列表，弹出确认对话框，然后执行删除操作"""
+        """获取输入的路径，在后台展开目录和通配符，确认后在后台并行删除"""
         # 获取文本框内容，去除首尾空白，并按行分割
         file_paths_raw = self.file_list_text.get(1.0, tk.END).strip()
 
@@ -66,66 +132,272 @@ class FileDeleterApp(tk.Tk):
             self.status_label.config(text="文件列表为空。", fg="orange")
             return
 
-        # 清理路径：去除空行和每行首尾空白
-        file_paths = [p.strip() for p in file_paths_raw.split('\n') if p.strip()]
+        # 清理路径：去除空行和每行首尾空白 (以及从资源管理器复制路径时带的引号)
+        targets = [p.strip().strip('"') for p in file_paths_raw.split('\n') if p.strip().strip('"')]
 
-        if not file_paths:
+        if not targets:
             messagebox.showwarning("警告", "无效的文件路径，请检查输入。")
             self.status_label.config(text="无效的文件路径。", fg="orange")
             return
 
+        path_regex = None
+        if self.regex_var.get():
+            try:
+                path_regex = re.compile(self.regex_var.get(), re.IGNORECASE if os.name == "nt" else 0)
+            except re.error as e:
+                messagebox.showerror("正则表达式错误", f"过滤条件中的正则表达式无效：\n{e}")
+                return
+
+        self.set_busy(True)
+        self.cancel_event.clear()
+        self.status_label.config(text="正在查找要删除的文件...", fg="blue")
+        self.progress_bar.config(mode="determinate", maximum=len(targets), value=0)
+        threading.Thread(target=self._expand_thread, args=(targets, path_regex), daemon=True).start()
+        self.after(100, self._poll_events)
+
+    def _expand_thread(self, targets, path_regex):
+        try:
+            plan = expand_targets(targets, path_regex, cancel_event=self.cancel_event,
+                                  progress=lambda done, total, found: self.events.put(("expand_progress", done, found)))
+            self.events.put(("expanded", plan))
+        except Exception as e:
+            self.events.put(("error", str(e)))
+
+    def _ask_confirmation(self, plan):
+        """展开完成后弹出确认对话框，确认后开始删除，返回是否已开始删除"""
+        for path, message in plan.scan_errors[:20]:
+            print(f"无法访问 {path}: {message}")
+        if not plan.files:
+            self.set_busy(False)
+            self.progress_bar.config(value=0)
+            messagebox.showwarning("警告", "没有找到任何要删除的文件。" +
+                                   ("\n\n以下路径不存在或没有匹配的文件：\n" + "\n".join(plan.missing[:10]) if plan.missing else ""))
+            self.status_label.config(text="没有找到要删除的文件。", fg="orange")
+            return False
+
         # 构建确认消息
-        msg_files_preview = "\n".join(file_paths[:min(5, len(file_paths))]) # 最多显示前5个文件
-        if len(file_paths) > 5:
+        msg_files_preview = "\n".join(plan.files[:PREVIEW_COUNT]) # 最多显示前5个文件
+        if len(plan.files) > PREVIEW_COUNT:
             msg_files_preview += "\n..."
-        
-        confirmation_msg = (
-            f"您确定要删除以下 {len(file_paths)} 个文件吗？\n\n"
-            f"{msg_files_preview}\n\n"
-            "此操作不可逆！请谨慎确认！"
-        )
+        confirmation_msg = f"您确定要删除以下 {len(plan.files)} 个文件吗？\n\n{msg_files_preview}\n\n"
+        if plan.dirs:
+            confirmation_msg += f"删除后还将删除 {len(plan.dirs)} 个目录中的空文件夹。\n"
+        if plan.missing:
+            confirmation_msg += f"另有 {len(plan.missing)} 项不存在或没有匹配的文件，将被跳过。\n"
+        if plan.scan_errors:
+            confirmation_msg += f"查找时有 {len(plan.scan_errors)} 个目录或文件无法访问 (详见控制台)。\n"
+        quarantine_root = (self.quarantine_dir_var.get().strip() or QUARANTINE_ROOT) if self.quarantine_var.get() else None
+        if quarantine_root:
+            confirmation_msg += (f"\n文件将被移到隔离目录 {quarantine_root}，可在“隔离区...”中恢复或彻底清除。"
+                                 "\n(与隔离目录不在同一磁盘的文件不会被移动)")
+        else:
+            confirmation_msg += "\n此操作不可逆！请谨慎确认！"
 
         # 弹出确认对话框
-        if not messagebox.askyesno("确认删除", confirmation_msg):
+        if not messagebox.askyesno("确认删除", confirmation_msg, icon="question" if quarantine_root else "warning"):
+            self.set_busy(False)
+            self.progress_bar.config(value=0)
             self.status_label.config(text="删除操作已取消。", fg="red")
-            return
+            return False
 
-        # 执行删除
+        self.summary = DeleteSummary()
+        for path in plan.missing:
+            self.summary.add_failure(path, "文件或目录不存在 / 无匹配")
+        self.delete_total = len(plan.files)
+        self.progress_bar.config(maximum=self.delete_total, value=0)
         self.status_label.config(text="正在删除文件，请稍候...", fg="blue")
-        self.update_idletasks() # 强制更新UI，让用户看到“正在删除”
+        threading.Thread(target=self._delete_thread, args=(plan, quarantine_root), daemon=True).start()
+        return True
 
-        deleted_count = 0
-        failed_deletions = []
+    def _delete_thread(self, plan, quarantine_root=None):
+        batch = None
+        try:
+            if quarantine_root:
+                batch = QuarantineBatch.create(quarantine_root)
+            remove = batch.move if batch is not None else os.remove
+            for result in run_delete(plan.files, cancel_event=self.cancel_event, remove=remove):
+                self.events.put(("result", result))
+            removed_dirs = remove_empty_dirs(plan.dirs) if not self.cancel_event.is_set() else 0
+            self.events.put(("finished", removed_dirs, batch.directory if batch is not None else None))
+        except Exception as e:
+            self.events.put(("error", str(e)))
+        finally:
+            if batch is not None: batch.close()
 
-        for path in file_paths:
-            if not path: # 再次确认路径非空
-                continue
-            
-            try:
-                if os.path.exists(path):
-                    os.remove(path)
-                    deleted_count += 1
-                else:
-                    failed_deletions.append(f"'{path}' (文件或目录不存在)")
-            except FileNotFoundError: # 理论上被 os.path.exists 捕获，但作为备用
-                failed_deletions.append(f"'{path}' (未找到文件)")
-            except PermissionError:
-                failed_deletions.append(f"'{path}' (权限不足，无法删除)")
-            except OSError as e: # 其他OS错误，如目录不是空的，或者路径太长等
-                failed_deletions.append(f"'{path}' (删除失败: {e})")
+    def _poll_events(self):
+        """在界面线程中定时处理后台线程的消息，每次最多处理一批，避免界面卡顿"""
+        try:
+            for _ in range(5000):
+                event = self.events.get_nowait()
+                if event[0] == "expand_progress":
+                    self.progress_bar.config(value=event[1])
+                    self.status_label.config(text=f"正在查找要删除的文件... 已找到 {event[2]} 个", fg="blue")
+                elif event[0] == "expanded":
+                    if not self._ask_confirmation(event[1]): return
+                elif event[0] == "result":
+                    self.summary.add(event[1])
+                elif event[0] == "finished":
+                    self._on_deletion_complete(event[1], event[2])
+                    return
+                elif event[0] == "error":
+                    self.set_busy(False)
+                    self.status_label.config(text=f"操作异常终止: {event[1]}", fg="red")
+                    messagebox.showerror("错误", f"发生错误:\n{event[1]}")
+                    return
+        except queue.Empty:
+            pass
+        if self.summary is not None:
+            done = self.summary.deleted + len(self.summary.failed_paths)
+            self.progress_bar.config(value=done)
+            self.status_label.config(text=f"正在删除文件... 已删除 {self.summary.deleted} / {self.delete_total}", fg="blue")
+        self.after(100, self._poll_events)
 
+    def _on_deletion_complete(self, removed_dirs, batch_dir=None):
+        summary = self.summary
+        self.summary = None
+        self.set_busy(False)
+        self.progress_bar.config(value=0)
+        dirs_msg = f"，并删除 {removed_dirs} 个空文件夹" if removed_dirs else ""
+        action = "移到隔离区" if batch_dir else "删除"
+        if batch_dir and summary.deleted:
+            dirs_msg += f"\n隔离批次: {batch_dir}"
         # 结果反馈
-        if not failed_deletions:
-            final_status_msg = f"成功删除 {deleted_count} 个文件！"
+        if not summary.errors:
+            final_status_msg = f"成功{action} {summary.deleted} 个文件{dirs_msg}！"
             self.status_label.config(text=final_status_msg, fg="green")
             messagebox.showinfo("删除完成", final_status_msg)
             self.clear_input() # 成功删除后清空输入框
         else:
-            final_status_msg = f"删除完成。成功删除 {deleted_count} 个文件。\n\n"
-            final_status_msg += "以下文件删除失败：\n" + "\n".join(failed_deletions)
+            failed_count = sum(summary.errors.values())
+            final_status_msg = f"删除完成。成功{action} {summary.deleted} 个文件{dirs_msg}\n{failed_count} 项失败。\n\n"
+            final_status_msg += "失败原因汇总：\n" + summary.format()
+            final_status_msg += "\n\n失败的路径已保留在输入框中，可处理后重试。"
+            # 输入框中只保留失败的路径
+            self.file_list_text.delete(1.0, tk.END)
+            self.file_list_text.insert(tk.END, "\n".join(summary.failed_paths) + "\n")
             self.status_label.config(text=f"部分文件删除失败，请查看详情。", fg="red")
             messagebox.showerror("删除失败", final_status_msg)
 
+    # --- 隔离区管理 ---
+    def open_quarantine_manager(self):
+        """列出隔离目录中的批次，可整批恢复或彻底清除"""
+        if self.manager_window is not None and self.manager_window.winfo_exists():
+            self.manager_window.lift()
+            self.refresh_quarantine_list()
+            return
+        window = tk.Toplevel(self)
+        window.title("隔离区")
+        window.geometry("560x380")
+        self.manager_window = window
+        self.manager_root = self.quarantine_dir_var.get().strip() or QUARANTINE_ROOT
+        tk.Label(window, text=f"隔离目录: {self.manager_root}", font=("Helvetica", 9), anchor='w').pack(fill=tk.X, padx=10, pady=(10, 5))
+
+        list_frame = tk.Frame(window)
+        list_frame.pack(fill=tk.BOTH, expand=True, padx=10)
+        self.manager_list = tk.Listbox(list_frame, selectmode=tk.EXTENDED, font=("Consolas", 9))
+        scrollbar = tk.Scrollbar(list_frame, command=self.manager_list.yview)
+        self.manager_list.config(yscrollcommand=scrollbar.set)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.manager_list.pack(fill=tk.BOTH, expand=True)
+
+        button_frame = tk.Frame(window)
+        button_frame.pack(pady=10)
+        tk.Button(button_frame, text="恢复所选批次", command=lambda: self.start_quarantine_job("restore"),
+                  font=("Helvetica", 9)).pack(side=tk.LEFT, padx=10)
+        tk.Button(button_frame, text="彻底清除所选批次", command=lambda: self.start_quarantine_job("purge"),
+                  bg="red", fg="white", font=("Helvetica", 9, "bold")).pack(side=tk.LEFT, padx=10)
+        tk.Button(button_frame, text="刷新", command=self.refresh_quarantine_list, font=("Helvetica", 9)).pack(side=tk.LEFT, padx=10)
+        self.refresh_quarantine_list()
+
+    def refresh_quarantine_list(self):
+        if self.manager_window is None or not self.manager_window.winfo_exists(): return
+        self.manager_batches = list_quarantine_batches(self.manager_root)
+        self.manager_list.delete(0, tk.END)
+        for batch in self.manager_batches:
+            try:
+                label = datetime.strptime(batch["name"], "%Y%m%d_%H%M%S_%f").strftime('%Y-%m-%d %H:%M:%S')
+            except ValueError:
+                label = batch["name"]
+            self.manager_list.insert(tk.END, f"{label}    {batch['count']} 个文件    {batch['directory']}")
+        if not self.manager_batches:
+            self.manager_list.insert(tk.END, "(隔离区为空)")
+
+    def start_quarantine_job(self, kind):
+        if self.job_running:
+            messagebox.showinfo("提示", "已有隔离区任务在后台进行，请稍后再试。", parent=self.manager_window)
+            return
+        selected = [self.manager_batches[i] for i in self.manager_list.curselection() if i < len(self.manager_batches)]
+        if not selected:
+            messagebox.showwarning("警告", "请先选择要处理的批次。", parent=self.manager_window)
+            return
+        count = sum(batch["count"] for batch in selected)
+        if kind == "restore":
+            prompt = f"将所选 {len(selected)} 个批次中的 {count} 个文件移回原位置？\n(原位置已有同名文件的将保留在隔离区)"
+        else:
+            prompt = f"彻底删除所选 {len(selected)} 个批次中的 {count} 个文件？\n\n清除后无法恢复！"
+        if not messagebox.askyesno("确认", prompt, parent=self.manager_window, icon="question" if kind == "restore" else "warning"):
+            return
+        self.job_running = True
+        self.job_cancel.clear()
+        self.job_stats = Counter()
+        self.job_examples = []
+        threading.Thread(target=self._quarantine_job_thread, args=(kind, [batch["directory"] for batch in selected]),
+                         daemon=True).start()
+        self.after(100, self._poll_job)
+
+    def _quarantine_job_thread(self, kind, directories):
+        """后台任务：逐批恢复或清除，只把计数和少量失败示例传给界面"""
+        stats = Counter()
+        examples = []
+        try:
+            for directory in directories:
+                results = restore_batch(directory, cancel_event=self.job_cancel) if kind == "restore" else \
+                    purge_batch(directory, cancel_event=self.job_cancel)
+                for result in results:
+                    stats[result["status"]] += 1
+                    if result["status"] in ("conflict", "failed") and len(examples) < 10:
+                        examples.append(f"{result['path']} ({result['error']})")
+                    if sum(stats.values()) % JOB_PROGRESS_EVERY == 0:
+                        self.job_events.put(("job_progress", kind, sum(stats.values())))
+            self.job_events.put(("job_done", kind, stats, examples))
+        except Exception as e:
+            self.job_events.put(("job_error", str(e)))
+
+    def _poll_job(self):
+        try:
+            while True:
+                event = self.job_events.get_nowait()
+                if event[0] == "job_progress":
+                    verb = "恢复" if event[1] == "restore" else "清除"
+                    self.status_label.config(text=f"隔离区后台任务: 正在{verb}... 已处理 {event[2]} 个文件", fg="blue")
+                    continue
+                self.job_running = False
+                self.refresh_quarantine_list()
+                if event[0] == "job_error":
+                    self.status_label.config(text=f"隔离区任务异常终止: {event[1]}", fg="red")
+                    messagebox.showerror("错误", f"隔离区任务发生错误:\n{event[1]}")
+                    return
+                _, kind, stats, examples = event
+                if kind == "restore":
+                    message = (f"已恢复 {stats['restored']} 个文件。\n"
+                               f"原位置已有同名文件 (保留在隔离区): {stats['conflict']} 个\n"
+                               f"失败: {stats['failed']} 个")
+                else:
+                    message = f"已彻底清除 {stats['deleted']} 个文件。\n失败: {stats['failed']} 个"
+                if examples:
+                    message += "\n\n" + "\n".join(examples)
+                self.status_label.config(text="隔离区任务完成。", fg="green")
+                messagebox.showinfo("隔离区", message)
+                return
+        except queue.Empty:
+            pass
+        self.after(200, self._poll_job)
+
+    def on_closing(self):
+        self.cancel_event.set() # 不再提交新的删除任务
+        self.job_cancel.set() # 清除/恢复中断后可再次执行，未处理的文件仍在隔离区
+        self.destroy()
+
 if __name__ == "__main__":
     app = FileDeleterApp()
     app.mainloop()
\ No newline at end of file
@@ -3,10 +3,16 @@
 
 import os
 import json
+import queue
+import threading
+import multiprocessing
 import tkinter as tk
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from tkinter import ttk, filedialog, messagebox
 from PIL import Image
 
+from image_pdf_writer import build_pdf, BuildCancelled
+
 class ImageToPdfApp(tk.Tk):
     def __init__(self):
         super().__init__()
@@ -24,9 +30,13 @@ class ImageToPdfApp(tk.Tk):
         self.resize_option_var = tk.StringVar(value="original")
         self.image_width_var = tk.StringVar()
         self.image_height_var = tk.StringVar()
+        self.parallel_var = tk.BooleanVar(value=True) # 多进程编码页面，并同时生成多个目录的PDF
 
         # --- 状态与日志变量 ---
         self.log_messages = []
+        self.batch_events = queue.Queue() # 后台生成线程 -> 界面的日志/进度事件
+        self.batch_cancel = threading.Event()
+        self.batch_workers = max(1, (os.cpu_count() or 2) - 1) # 留一个核心给界面
 
         self._create_widgets()
         self._load_config()
@@ -73,6 +83,9 @@ class ImageToPdfApp(tk.Tk):
         self.height_entry = ttk.Entry(resize_frame, textvariable=self.image_height_var, width=8, state="disabled")
         self.height_entry.pack(side=tk.LEFT, padx=5)
 
+        ttk.Checkbutton(options_frame, text=f"并行处理 (使用 {self.batch_workers} 个进程编码页面，同时生成多个目录的PDF)",
+                        variable=self.parallel_var).pack(anchor=tk.W, pady=(5, 0))
+
         output_frame = ttk.LabelFrame(main_frame, text="4. 输出选项", padding="10")
         output_frame.pack(fill=tk.X, pady=5)
         output_frame.columnconfigure(1, weight=1)
@@ -135,65 +148,90 @@ class ImageToPdfApp(tk.Tk):
                 dirs_to_files[dir_path] = []
             dirs_to_files[dir_path].append(f_path)
         
+        tasks = []
+        for dir_path, image_paths in dirs_to_files.items():
+            output_dir = specific_output_dir if save_option == "specific" else dir_path
+            # 按文件名排序，确保图片顺序
+            tasks.append((dir_path, sorted(image_paths), os.path.join(output_dir, f"{os.path.basename(dir_path)}.pdf")))
+
         self.btn_process.config(state="disabled")
-        total_pdfs = len(dirs_to_files)
+        self.batch_cancel.clear()
+        workers = self.batch_workers if self.parallel_var.get() else 0
+        if workers:
+            self._log(f"并行模式: {workers} 个进程编码页面，最多同时生成 {min(len(tasks), workers)} 个PDF。")
+        threading.Thread(target=self._run_batch, args=(tasks, target_size, workers), daemon=True).start()
+        self.after(100, self._poll_batch_events)
+
+    def _run_batch(self, tasks, target_size, workers):
+        """
+        后台线程：每个目录由一个写入线程按顺序组装PDF；并行模式下页面的缩放和编码在进程池中进行，
+        多个目录的PDF同时生成。日志和进度通过 batch_events 交给界面。
+        """
+        total_pdfs = len(tasks)
         success_count = 0
+        try:
+            if workers:
+                dir_workers = min(total_pdfs, workers)
+                # 所有目录共享进程池；每个目录在途的页面数有上限，内存只与并发目录数有关
+                max_in_flight = max(2, (workers * 2 + dir_workers - 1) // dir_workers)
+                with ProcessPoolExecutor(max_workers=workers) as executor, ThreadPoolExecutor(max_workers=dir_workers) as writers:
+                    futures = [writers.submit(self._build_one_pdf, i, total_pdfs, task, target_size, executor, max_in_flight)
+                               for i, task in enumerate(tasks)]
+                    success_count = sum(future.result() for future in futures)
+            else:
+                for i, task in enumerate(tasks):
+                    success_count += self._build_one_pdf(i, total_pdfs, task, target_size, None, 1)
+        except Exception as e:
+            self.batch_events.put(("log", f"错误: 批处理异常终止: {e}", True))
+        self.batch_events.put(("finished", success_count, total_pdfs))
+
+    def _build_one_pdf(self, i, total_pdfs, task, target_size, executor, max_in_flight):
+        dir_path, image_paths, pdf_output_path = task
+        dir_name = os.path.basename(dir_path)
+        log = lambda message, to_status=True: self.batch_events.put(("log", message, to_status))
+        if self.batch_cancel.is_set(): return False
+        log(f"\n({i+1}/{total_pdfs}) 正在处理目录: {dir_name}")
+        log(f"  -> 找到了 {len(image_paths)} 张图片，准备合并...")
+        if not image_paths:
+            log(f"  -> 警告: 目录 '{dir_name}' 中没有可处理的图片，已跳过。")
+            return False
+
+        def progress(done, total):
+            self.batch_events.put(("progress", f"({i+1}/{total_pdfs}) {dir_name}: 第 {done}/{total} 页"))
 
-        for i, (dir_path, image_paths) in enumerate(dirs_to_files.items()):
-            dir_name = os.path.basename(dir_path)
-            self._log(f"\n({i+1}/{total_pdfs}) 正在处理目录: {dir_name}")
-            
-            # 按文件名排序，确保图片顺序
-            image_paths.sort()
-            
-            # 定义输出PDF的路径
-            if save_option == "specific":
-                output_dir = specific_output_dir
-            else: # save_option == "same"
-                output_dir = dir_path
-            
-            os.makedirs(output_dir, exist_ok=True)
-            pdf_output_path = os.path.join(output_dir, f"{dir_name}.pdf")
+        try:
+            os.makedirs(os.path.dirname(pdf_output_path), exist_ok=True)
+            # 逐页写入PDF，内存中只保留在途的几页；JPEG 图片不经解码直接嵌入
+            _, direct_count = build_pdf(image_paths, pdf_output_path, target_size, resolution=100.0, executor=executor,
+                                        max_in_flight=max_in_flight, progress=progress, cancel_event=self.batch_cancel)
+            if direct_count:
+                log(f"  -> {dir_name}: 其中 {direct_count} 张 JPEG 图片未经重新压缩直接嵌入。", to_status=False)
+            log(f"  -> 成功！PDF已保存至: {pdf_output_path}")
+            return True
+        except BuildCancelled:
+            log(f"  -> {dir_name}: 已取消。")
+        except Exception as e:
+            log(f"  -> {dir_name}: 创建PDF时发生错误: {e}")
+        return False
 
-            self._log(f"  -> 找到了 {len(image_paths)} 张图片，准备合并...")
-            
-            images_to_convert = []
-            try:
-                for path in image_paths:
-                    img = Image.open(path)
-                    # PDF不支持RGBA（带透明度）模式，需要转换为RGB
-                    if img.mode == 'RGBA':
-                        img = img.convert('RGB')
-                    
-                    # 如果需要，调整图片大小
-                    if target_size:
-                        img = img.resize(target_size, Image.Resampling.LANCZOS)
-
-                    images_to_convert.append(img)
-                
-                if not images_to_convert:
-                    self._log(f"  -> 警告: 目录 '{dir_name}' 中没有可处理的图片，已跳过。")
-                    continue
-
-                first_image = images_to_convert[0]
-                
-                # 使用第一张图片来保存，并附加其余图片
-                first_image.save(
-                    pdf_output_path, 
-                    "PDF", 
-                    resolution=100.0, 
-                    save_all=True, 
-                    append_images=images_to_convert[1:]
-                )
-                self._log(f"  -> 成功！PDF已保存至: {pdf_output_path}")
-                success_count += 1
-
-            except Exception as e:
-                self._log(f"  -> 创建PDF时发生错误: {e}")
-
-        self._log(f"\n--- 处理完成！成功生成 {success_count}/{total_pdfs} 个PDF文件。 ---")
-        self.btn_process.config(state="normal")
-        messagebox.showinfo("完成", f"所有任务已处理完毕。\n\n成功生成: {success_count} 个PDF\n处理目录数: {total_pdfs}\n\n详细信息请点击“查看处理日志”。")
+    def _poll_batch_events(self):
+        """在 Tk 主线程中处理后台生成线程的事件。"""
+        try:
+            while True:
+                event = self.batch_events.get_nowait()
+                if event[0] == "log":
+                    self._log(event[1], to_status=event[2])
+                elif event[0] == "progress":
+                    self.update_status(event[1])
+                elif event[0] == "finished":
+                    _, success_count, total_pdfs = event
+                    self._log(f"\n--- 处理完成！成功生成 {success_count}/{total_pdfs} 个PDF文件。 ---")
+                    self.btn_process.config(state="normal")
+                    messagebox.showinfo("完成", f"所有任务已处理完毕。\n\n成功生成: {success_count} 个PDF\n处理目录数: {total_pdfs}\n\n详细信息请点击“查看处理日志”。")
+                    return
+        except queue.Empty:
+            pass
+        self.after(100, self._poll_batch_events)
 
     def toggle_resize_entries(self):
         state = "normal" if self.resize_option_var.get() == "specific" else "disabled"
@@ -281,6 +319,7 @@ class ImageToPdfApp(tk.Tk):
             "resize_option": self.resize_option_var.get(),
             "image_width": self.image_width_var.get(),
             "image_height": self.image_height_var.get(),
+            "parallel": self.parallel_var.get(),
         }
         try:
             with open(self.CONFIG_FILE, 'w', encoding='utf-8') as f:
@@ -299,6 +338,7 @@ class ImageToPdfApp(tk.Tk):
             self.resize_option_var.set(config.get("resize_option", "original"))
             self.image_width_var.set(config.get("image_width", ""))
             self.image_height_var.set(config.get("image_height", ""))
+            self.parallel_var.set(config.get("parallel", True))
             
             self.toggle_output_path()
             self.toggle_resize_entries()
@@ -321,9 +361,11 @@ class ImageToPdfApp(tk.Tk):
         self.update_idletasks()
 
     def _on_closing(self):
+        self.batch_cancel.set() # 正在生成的PDF会删除临时文件并停止
         self._save_config()
         self.destroy()
 
 if __name__ == '__main__':
+    multiprocessing.freeze_support() # 打包为 exe 后进程池需要
     app = ImageToPdfApp()
     app.mainloop()
\ No newline at end of file
@@ -1,8 +1,14 @@
 import tkinter as tk
 from tkinter import filedialog, messagebox
 import os
-import pandas as pd
-from datetime import datetime
+import queue
+import threading
+from dir_scanner import DirectoryScanner, EXPORT_COLUMNS, EXPORT_COLUMN_TYPES, to_export_row, split_patterns
+from export_writer import open_table_writer
+from inventory_snapshot import InventorySnapshot, DELTA_COLUMNS, DELTA_COLUMN_TYPES
+from duplicate_finder import DuplicateFinder, DUPLICATE_COLUMNS, DUPLICATE_COLUMN_TYPES, duplicate_rows
+
+PROGRESS_EVERY = 1000 # 每写出多少行报告一次进度
 
 class FileInfoExporter:
     """
@@ -11,7 +17,11 @@ class FileInfoExporter:
     def __init__(self, master):
         self.master = master
         master.title("文件信息导出工具")
-        master.geometry("500x250") # 设置窗口初始大小
+        master.geometry("560x460") # 设置窗口初始大小
+        self.events = queue.Queue() # 后台导出线程 -> 界面的进度消息
+        self.cancel_event = threading.Event()
+        self.export_thread = None
+        master.protocol("WM_DELETE_WINDOW", self.on_closing)
 
         # --- GUI 控件 ---
 
@@ -37,15 +47,49 @@ class FileInfoExporter:
         self.browse_export_btn = tk.Button(master, text="另存为...", command=self.browse_export_file)
         self.browse_export_btn.grid(row=1, column=2, padx=10, pady=10)
 
-        # 3. 执行按钮
+        # 3. 扫描范围
+        tk.Label(master, text="包含文件:").grid(row=2, column=0, padx=10, pady=5, sticky='w')
+        self.include_var = tk.StringVar()
+        tk.Entry(master, textvariable=self.include_var, width=50).grid(row=2, column=1, padx=10, pady=5)
+        tk.Label(master, text="如 *.docx; *.pdf", fg="gray").grid(row=2, column=2, padx=5, sticky='w')
+
+        tk.Label(master, text="排除:").grid(row=3, column=0, padx=10, pady=5, sticky='w')
+        self.exclude_var = tk.StringVar(value="~$*")
+        tk.Entry(master, textvariable=self.exclude_var, width=50).grid(row=3, column=1, padx=10, pady=5)
+        tk.Label(master, text="文件或目录", fg="gray").grid(row=3, column=2, padx=5, sticky='w')
+
+        depth_frame = tk.Frame(master)
+        depth_frame.grid(row=4, column=1, padx=10, pady=5, sticky='w')
+        self.recursive_var = tk.BooleanVar(value=True)
+        tk.Checkbutton(depth_frame, text="包含子目录", variable=self.recursive_var).pack(side=tk.LEFT)
+        tk.Label(depth_frame, text="  最大深度 (0 表示不限):").pack(side=tk.LEFT)
+        self.max_depth_var = tk.IntVar(value=0)
+        tk.Spinbox(depth_frame, from_=0, to=100, textvariable=self.max_depth_var, width=5).pack(side=tk.LEFT)
+        self.duplicates_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(depth_frame, text="查找重复文件", variable=self.duplicates_var).pack(side=tk.LEFT, padx=(10, 0))
+
+        # 4. 增量快照 (可选)：记录本次结果，下次导出时跳过未变化的目录，并输出变化报告
+        tk.Label(master, text="快照数据库:").grid(row=5, column=0, padx=10, pady=5, sticky='w')
+        self.snapshot_var = tk.StringVar()
+        tk.Entry(master, textvariable=self.snapshot_var, width=50).grid(row=5, column=1, padx=10, pady=5)
+        tk.Button(master, text="选择...", command=self.browse_snapshot_file).grid(row=5, column=2, padx=10, pady=5)
+
+        snapshot_frame = tk.Frame(master)
+        snapshot_frame.grid(row=6, column=1, padx=10, pady=5, sticky='w')
+        self.skip_unchanged_var = tk.BooleanVar(value=True)
+        tk.Checkbutton(snapshot_frame, text="跳过未变化的目录 (按目录修改时间)", variable=self.skip_unchanged_var).pack(side=tk.LEFT)
+        self.hash_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(snapshot_frame, text="记录内容哈希", variable=self.hash_var).pack(side=tk.LEFT)
+
+        # 5. 执行按钮
         self.export_btn = tk.Button(master, text="开始导出", command=self.export_to_excel, font=("Arial", 12, "bold"), bg="lightblue")
-        self.export_btn.grid(row=2, column=1, pady=20)
+        self.export_btn.grid(row=7, column=1, pady=20)
 
-        # 4. 状态栏
+        # 6. 状态栏
         self.status_var = tk.StringVar()
         self.status_var.set("准备就绪")
         self.status_label = tk.Label(master, textvariable=self.status_var, fg="blue", anchor='w')
-        self.status_label.grid(row=3, column=0, columnspan=3, padx=10, pady=10, sticky='ew')
+        self.status_label.grid(row=8, column=0, columnspan=3, padx=10, pady=10, sticky='ew')
         
     def browse_source_dir(self):
         """打开对话框选择源目录"""
@@ -58,47 +102,41 @@ class FileInfoExporter:
         """打开“另存为”对话框选择导出文件路径"""
         filename = filedialog.asksaveasfilename(
             defaultextension=".xlsx",
-            filetypes=[("Excel 文件", "*.xlsx"), ("所有文件", "*.*")],
-            title="保存到 Excel 文件"
+            filetypes=[("Excel 文件", "*.xlsx"), ("CSV 文件 (UTF-8)", "*.csv"), ("Parquet 文件", "*.parquet"), ("所有文件", "*.*")],
+            title="导出到文件 (按扩展名选择格式)"
         )
         if filename:
             self.export_file_var.set(filename)
             self.status_var.set(f"将导出到: {filename}")
 
-    def get_file_info(self, directory):
-        """获取目录下所有文件的信息"""
-        file_data = []
-        for filename in os.listdir(directory):
-            full_path = os.path.join(directory, filename)
-            
-            # 确保只处理文件，忽略子目录
-            if os.path.isfile(full_path):
-                try:
-                    stats = os.stat(full_path)
-                    
-                    # 获取文件大小并转换为KB
-                    size_kb = round(stats.st_size / 1024, 2)
-                    
-                    # 获取文件修改日期
-                    mod_time = datetime.fromtimestamp(stats.st_mtime).strftime('%Y-%m-%d %H:%M:%S')
-                    
-                    # 获取文件名和扩展名
-                    _, file_extension = os.path.splitext(filename)
-                    
-                    file_info = {
-                        '目录名': directory,
-                        '文件名': filename,
-                        '文件大小(KB)': size_kb,
-                        '文件类型': file_extension,
-                        '修改日期': mod_time
-                    }
-                    file_data.append(file_info)
-                except Exception as e:
-                    print(f"无法访问文件 {full_path}: {e}") # 在控制台打印错误，避免中断
-        return file_data
+    def browse_snapshot_file(self):
+        """选择快照数据库，不存在时在首次导出时创建"""
+        filename = filedialog.asksaveasfilename(
+            defaultextension=".db",
+            filetypes=[("快照数据库", "*.db"), ("所有文件", "*.*")],
+            title="选择或新建快照数据库",
+            confirmoverwrite=False
+        )
+        if filename:
+            self.snapshot_var.set(filename)
+
+    def make_scanner(self):
+        """根据界面选项创建目录扫描器，深度无效时返回 None。"""
+        try:
+            max_depth = int(self.max_depth_var.get())
+        except (tk.TclError, ValueError):
+            return None
+        if max_depth < 0: return None
+        if not self.recursive_var.get():
+            max_depth = 0 # 只扫描所选目录本身
+        elif max_depth == 0:
+            max_depth = None
+        return DirectoryScanner(include=split_patterns(self.include_var.get()),
+                                exclude=split_patterns(self.exclude_var.get()),
+                                max_depth=max_depth)
 
     def export_to_excel(self):
-        """执行导出操作"""
+        """执行导出操作：扫描和写出在后台线程中进行，界面定时读取进度"""
         source_dir = self.source_dir_var.get()
         export_path = self.export_file_var.get()
 
@@ -111,33 +149,137 @@ class FileInfoExporter:
             messagebox.showerror("错误", "请指定要导出的文件名！")
             return
 
-        try:
-            self.status_var.set("正在处理，请稍候...")
-            self.master.update_idletasks() # 强制更新UI
+        scanner = self.make_scanner()
+        if scanner is None:
+            messagebox.showerror("错误", "最大深度必须是非负整数！")
+            return
 
-            # 2. 获取文件信息
-            file_list = self.get_file_info(source_dir)
+        snapshot_options = None
+        if self.snapshot_var.get():
+            # 影响扫描结果的选项，与上次快照不同时不跳过任何目录
+            snapshot_options = {"include": split_patterns(self.include_var.get()),
+                                "exclude": split_patterns(self.exclude_var.get()),
+                                "max_depth": scanner.max_depth,
+                                "skip_unchanged": self.skip_unchanged_var.get(),
+                                "hash": self.hash_var.get()}
 
-            if not file_list:
-                messagebox.showwarning("提示", "所选目录中没有找到任何文件。")
-                self.status_var.set("准备就绪")
+        self.export_btn.config(state="disabled")
+        self.status_var.set("正在扫描，请稍候...")
+        self.cancel_event.clear()
+        self.export_thread = threading.Thread(target=self._export_thread,
+                                              args=(scanner, source_dir, export_path, self.snapshot_var.get(), snapshot_options,
+                                                    self.duplicates_var.get()),
+                                              daemon=True)
+        self.export_thread.start()
+        self.master.after(100, self._poll_events)
+
+    def _export_thread(self, scanner, source_dir, export_path, snapshot_path=None, snapshot_options=None, find_duplicates=False):
+        """后台线程：扫描到的文件逐行写出 (xlsx/csv/parquet)，不在内存中保留全部文件信息 (查找重复文件时除外)"""
+        snapshot = None
+        finder = DuplicateFinder() if find_duplicates else None
+        summary = {"export_path": export_path, "delta_path": None, "delta_counts": None, "duplicates_path": None}
+        try:
+            if snapshot_path:
+                snapshot = InventorySnapshot(snapshot_path)
+                has_previous = snapshot.begin(source_dir, {key: snapshot_options[key] for key in ("include", "exclude", "max_depth")},
+                                              reuse=snapshot_options["skip_unchanged"])
+                source_dir = snapshot.root # 与快照中记录的路径写法一致
+                scanner.snapshot = snapshot
+            with open_table_writer(export_path, EXPORT_COLUMNS, sheet_name="文件信息",
+                                   column_types=EXPORT_COLUMN_TYPES) as writer:
+                for entry in scanner.scan(source_dir, self.cancel_event):
+                    writer.write_row(to_export_row(entry))
+                    if finder is not None: finder.add(entry)
+                    if writer.row_count % PROGRESS_EVERY == 0:
+                        self.events.put(("progress", f"正在扫描... 已写出 {writer.row_count} 个文件 (已扫描 {scanner.dir_count} 个目录)"))
+                count = writer.row_count
+                if snapshot is not None and not self.cancel_event.is_set():
+                    if snapshot_options["hash"]:
+                        snapshot.fill_hashes(progress=lambda done: self.events.put(("progress", f"正在计算内容哈希... {done}")),
+                                             cancel_event=self.cancel_event)
+                    if has_previous and not self.cancel_event.is_set():
+                        self.events.put(("progress", "正在比较与上次快照的变化..."))
+                        summary["delta_path"], _ = writer.add_table("变化", DELTA_COLUMNS, snapshot.delta_rows(), DELTA_COLUMN_TYPES)
+                        summary["delta_counts"] = snapshot.delta_counts
+                if finder is not None and not self.cancel_event.is_set():
+                    known_hash = None
+                    if snapshot is not None and snapshot_options["hash"]:
+                        known_hash = lambda entry: snapshot.lookup_hash(entry.path) # 快照中已有的完整哈希
+                    groups = finder.find(known_hash=known_hash, cancel_event=self.cancel_event,
+                                         progress=lambda stage, done, total: self.events.put(
+                                             ("progress", f"正在查找重复文件 ({stage})... {done}/{total}")))
+                    summary["duplicates_path"], _ = writer.add_table("重复文件", DUPLICATE_COLUMNS, duplicate_rows(groups),
+                                                                     DUPLICATE_COLUMN_TYPES)
+                    summary["duplicate_groups"] = len(groups)
+                    summary["duplicate_files"] = sum(len(entries) for _, entries in groups)
+                    summary["duplicate_wasted"] = sum(entries[0].size * (len(entries) - 1) for _, entries in groups)
+                    summary["hashed_count"] = finder.hashed_count
+                if self.cancel_event.is_set() or not count:
+                    writer.abort() # 不生成不完整或空的导出文件
+            if self.cancel_event.is_set():
+                if snapshot is not None: snapshot.rollback() # 保留上次的快照
+                self.events.put(("cancelled",))
                 return
+            if snapshot is not None:
+                snapshot.commit()
+            summary.update(count=count, dir_count=scanner.dir_count, reused_dir_count=scanner.reused_dir_count,
+                           errors=scanner.errors)
+            self.events.put(("done", summary))
+        except Exception as e:
+            if snapshot is not None: snapshot.rollback()
+            self.events.put(("error", str(e)))
+        finally:
+            if snapshot is not None: snapshot.close()
 
-            # 3. 创建DataFrame并导出到Excel
-            df = pd.DataFrame(file_list)
-            
-            # 重新排列列的顺序，以符合要求
-            df = df[['目录名', '文件名', '文件大小(KB)', '文件类型', '修改日期']]
-            
-            # 写入Excel文件，不包含索引列
-            df.to_excel(export_path, index=False, engine='openpyxl')
-            
-            self.status_var.set(f"成功！已导出 {len(file_list)} 个文件信息。")
-            messagebox.showinfo("成功", f"文件信息已成功导出到:\n{export_path}")
+    def _poll_events(self):
+        try:
+            while True:
+                event = self.events.get_nowait()
+                if event[0] == "progress":
+                    self.status_var.set(event[1])
+                    continue
+                self.export_btn.config(state="normal")
+                if event[0] == "done":
+                    summary = event[1]
+                    count, errors = summary["count"], summary["errors"]
+                    for path, message in errors[:20]:
+                        print(f"无法访问 {path}: {message}") # 在控制台打印错误，避免中断
+                    if not count:
+                        messagebox.showwarning("提示", "所选目录中没有找到任何文件。")
+                        self.status_var.set("准备就绪")
+                        return
+                    self.status_var.set(f"成功！已导出 {count} 个文件信息 (共 {summary['dir_count']} 个目录)。")
+                    message = f"文件信息已成功导出到:\n{summary['export_path']}"
+                    if summary["reused_dir_count"]:
+                        message += f"\n\n{summary['reused_dir_count']} 个目录未变化，直接使用了快照中的记录。"
+                    if summary["delta_counts"] is not None:
+                        delta = summary["delta_counts"]
+                        message += (f"\n\n与上次快照相比: 新增 {delta['新增']} 个，删除 {delta['删除']} 个，修改 {delta['修改']} 个"
+                                    f"\n变化报告: {summary['delta_path']}" +
+                                    (" (“变化”工作表)" if summary["delta_path"] == summary["export_path"] else ""))
+                    elif self.snapshot_var.get():
+                        message += "\n\n已建立快照，下次导出时将报告变化。"
+                    if summary["duplicates_path"] is not None:
+                        message += (f"\n\n重复文件: {summary['duplicate_groups']} 组共 {summary['duplicate_files']} 个文件，"
+                                    f"可释放 {summary['duplicate_wasted'] / 1024 / 1024:.1f} MB (读取了 {summary['hashed_count']} 个文件的内容)"
+                                    f"\n重复文件报告: {summary['duplicates_path']}" +
+                                    (" (“重复文件”工作表)" if summary["duplicates_path"] == summary["export_path"] else ""))
+                    if errors:
+                        message += f"\n\n有 {len(errors)} 个文件或目录无法访问，已跳过 (详见控制台)。"
+                    messagebox.showinfo("成功", message)
+                elif event[0] == "error":
+                    self.status_var.set(f"导出失败: {event[1]}")
+                    messagebox.showerror("导出失败", f"发生错误:\n{event[1]}")
+                else:
+                    self.status_var.set("已取消导出")
+                return
+        except queue.Empty:
+            pass
+        self.master.after(100, self._poll_events)
 
-        except Exception as e:
-            self.status_var.set(f"导出失败: {e}")
-            messagebox.showerror("导出失败", f"发生错误:\n{e}")
+    def on_closing(self):
+        self.cancel_event.set() # 后台线程在当前目录处理完后停止
+        self.master.destroy()
 
 # --- 主程序入口 ---
 if __name__ == "__main__":
@@ -1,11 +1,19 @@
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 import os
-import shutil
 import threading
+import queue
 import re
 from datetime import datetime
 import locale
+import codecs
+from collections import Counter
+
+from replace_engine import (RuleSet, make_rule, load_rules, run_replace, run_scan, UndoJournal, list_undo_batches,
+                            undo_batch, DEFAULT_WORKERS, AUTO_ENCODING, UNDO_ROOT)
+
+AUTO_ENCODING_LABEL = "自动检测" # 按 BOM 判断，否则依次尝试 utf-8、gbk
+MAX_PREVIEW_ROWS = 20000 # 预览窗口中最多列出的匹配行数，超出部分只显示每个文件的匹配数
 
 class BatchFileContentReplacerApp(tk.Tk):
     def __init__(self):
@@ -21,8 +29,13 @@ class BatchFileContentReplacerApp(tk.Tk):
         self.sort_column = "filename"
         self.sort_reverse = False
 
+        # 后台替换线程 -> 界面的结果队列，界面定时批量取出并刷新进度
+        self.result_events = queue.Queue()
+        self.cancel_event = threading.Event()
+
         self._create_widgets()
         self._update_treeview_headers() # 初始化标题排序标志
+        self.protocol("WM_DELETE_WINDOW", self._on_closing)
 
     def _create_widgets(self):
         # --- 顶部：文件操作区 ---
@@ -80,6 +93,15 @@ class BatchFileContentReplacerApp(tk.Tk):
         self.use_regex_var = tk.BooleanVar()
         ttk.Checkbutton(rule_frame, text="使用通配符/特殊字符 (Regex)", variable=self.use_regex_var).grid(row=2, column=1, sticky='w', pady=5)
         ttk.Button(rule_frame, text="通配符使用方法", command=self._show_help).grid(row=2, column=2, padx=10)
+        # 规则文件：一次应用多条规则，选择后忽略上面的单条规则
+        ttk.Label(rule_frame, text="规则文件:").grid(row=3, column=0, padx=5, pady=5, sticky="w")
+        self.rule_file_var = tk.StringVar()
+        ttk.Entry(rule_frame, textvariable=self.rule_file_var, width=40, state="readonly").grid(row=3, column=1, padx=5, pady=5, sticky="ew")
+        rule_file_buttons = ttk.Frame(rule_frame)
+        rule_file_buttons.grid(row=3, column=2, padx=10, sticky="w")
+        ttk.Button(rule_file_buttons, text="选择...", command=self._browse_rule_file).pack(side=tk.LEFT)
+        ttk.Button(rule_file_buttons, text="清除", command=lambda: self.rule_file_var.set("")).pack(side=tk.LEFT, padx=(5, 0))
+        ttk.Label(rule_frame, text="(每行: 待替换内容<Tab>替换为[<Tab>regex]，或 JSON 列表；选择后忽略上面的单条规则)").grid(row=4, column=1, columnspan=2, padx=5, sticky="w")
         rule_frame.columnconfigure(1, weight=1)
 
         # 输出选项
@@ -90,16 +112,16 @@ class BatchFileContentReplacerApp(tk.Tk):
         encoding_frame = ttk.Frame(output_frame)
         encoding_frame.pack(fill=tk.X, anchor="w", pady=(0, 10))
         ttk.Label(encoding_frame, text="文件编码:").pack(side=tk.LEFT, padx=(0, 5))
-        self.encoding_var = tk.StringVar(value="utf-8")
+        self.encoding_var = tk.StringVar(value=AUTO_ENCODING_LABEL)
         # 尝试获取系统默认编码
         try:
             default_encoding = locale.getpreferredencoding()
         except Exception:
             default_encoding = "utf-8"
         encodings = ["utf-8", "gbk", "gb2312", "latin-1", default_encoding]
-        self.encoding_combo = ttk.Combobox(encoding_frame, textvariable=self.encoding_var, values=list(set(encodings)), width=15)
+        self.encoding_combo = ttk.Combobox(encoding_frame, textvariable=self.encoding_var, values=[AUTO_ENCODING_LABEL] + sorted(set(encodings)), width=15)
         self.encoding_combo.pack(side=tk.LEFT)
-        ttk.Label(encoding_frame, text="(请选择正确的编码读取和保存文件)").pack(side=tk.LEFT, padx=10)
+        ttk.Label(encoding_frame, text="(自动检测: 按 BOM 或依次尝试 utf-8、gbk，并以原编码和 BOM 写回)").pack(side=tk.LEFT, padx=10)
 
         # Output options
         self.output_option = tk.StringVar(value="original")
@@ -121,8 +143,14 @@ class BatchFileContentReplacerApp(tk.Tk):
         self.status_label.pack(fill=tk.X, expand=True)
 
         # 执行按钮
-        self.start_button = ttk.Button(bottom_frame, text="开始替换内容", command=self._start_processing)
-        self.start_button.pack(pady=10)
+        action_frame = ttk.Frame(bottom_frame)
+        action_frame.pack(pady=10)
+        self.preview_button = ttk.Button(action_frame, text="预览匹配 (不修改文件)", command=self._start_preview)
+        self.preview_button.pack(side=tk.LEFT, padx=5)
+        self.start_button = ttk.Button(action_frame, text="开始替换内容", command=self._start_processing)
+        self.start_button.pack(side=tk.LEFT, padx=5)
+        self.undo_button = ttk.Button(action_frame, text="撤销替换...", command=self._start_undo)
+        self.undo_button.pack(side=tk.LEFT, padx=5)
 
     def _add_to_list(self, file_paths):
         existing_paths = {item['path'] for item in self.file_list_data}
@@ -283,161 +311,405 @@ class BatchFileContentReplacerApp(tk.Tk):
             self.output_dir_entry.delete(0, tk.END)
             self.output_dir_entry.insert(0, directory)
 
-    def _start_processing(self):
+    def _browse_rule_file(self):
+        path = filedialog.askopenfilename(title="选择规则文件", filetypes=[("规则文件", "*.tsv *.txt *.json"), ("All files", "*.*")])
+        if path:
+            self.rule_file_var.set(path)
+
+    def _collect_settings(self):
+        """读取并校验界面上的规则和输出选项，出错时提示并返回 None。"""
         if not self.file_list_data:
             messagebox.showerror("错误", "文件列表为空，请先添加文件。")
-            return
+            return None
+        rule_file = self.rule_file_var.get()
         find_what = self.find_entry.get()
-        if not find_what:
-            messagebox.showerror("错误", "“待替换内容”不能为空。")
-            return
-        
-        if self.use_regex_var.get():
-            try:
-                re.compile(find_what)
-            except re.error as e:
-                messagebox.showerror("正则表达式错误", f"“待替换内容”中的正则表达式无效：\n{e}")
-                return
-            
         replace_with = self.replace_entry.get()
+        if rule_file:
+            try:
+                rules = load_rules(rule_file)
+                rule_set = RuleSet(rules)
+            except ValueError as e:
+                messagebox.showerror("规则文件错误", f"无法使用规则文件 {rule_file}：\n{e}")
+                return None
+        else:
+            if not find_what:
+                messagebox.showerror("错误", "“待替换内容”不能为空。")
+                return None
+
+            if self.use_regex_var.get():
+                try:
+                    re.compile(find_what)
+                except re.error as e:
+                    messagebox.showerror("正则表达式错误", f"“待替换内容”中的正则表达式无效：\n{e}")
+                    return None
+            rule_set = RuleSet([make_rule(find_what, replace_with, self.use_regex_var.get())])
+
         output_mode = self.output_option.get()
         output_dir = self.output_dir_entry.get()
         encoding = self.encoding_var.get()
+        if encoding == AUTO_ENCODING_LABEL:
+            encoding = AUTO_ENCODING
+        else:
+            try:
+                codecs.lookup(encoding)
+            except LookupError:
+                messagebox.showerror("错误", f"未知的文件编码: {encoding}")
+                return None
 
         if output_mode == "specific" and not (output_dir and os.path.isdir(output_dir)):
             messagebox.showerror("错误", "请选择一个有效的目标目录。")
+            return None
+
+        if rule_file:
+            regex_count = sum(rule["regex"] for rule in rule_set.rules)
+            rule_desc = (f"应用规则文件中的 {len(rule_set.rules)} 条规则 (一次扫描)。\n"
+                         f"模式: 普通文本 {len(rule_set.rules) - regex_count} 条，正则表达式 {regex_count} 条\n")
+        else:
+            rule_desc = (f"查找 “{find_what}” 并替换为 “{replace_with}”。\n"
+                         f"模式: {'正则表达式' if self.use_regex_var.get() else '普通文本'}\n")
+        description = (
+            rule_desc +
+            f"文件编码: {self.encoding_var.get()}\n"
+            f"输出方式: {'在原位置修改' if output_mode == 'original' else f'保存到目录: {output_dir}'}\n"
+        )
+        return {"rule_set": rule_set, "encoding": encoding, "output_mode": output_mode, "output_dir": output_dir,
+                "description": description}
+
+    def _dest_path(self, settings, file_info):
+        return None if settings["output_mode"] == "original" else os.path.join(settings["output_dir"], file_info['filename'])
+
+    def _set_busy(self, busy):
+        state = "disabled" if busy else "normal"
+        for button in (self.preview_button, self.start_button, self.undo_button):
+            button.config(state=state)
+
+    def _start_processing(self):
+        settings = self._collect_settings()
+        if settings is None:
             return
-        
         confirm_msg = (
-            f"将在 {len(self.file_list_data)} 个文件的【内容】中查找 “{find_what}” 并替换为 “{replace_with}”。\n"
-            f"模式: {'正则表达式' if self.use_regex_var.get() else '普通文本'}\n"
-            f"文件编码: {encoding}\n"
-            f"输出方式: {'在原位置修改' if output_mode == 'original' else f'保存到目录: {output_dir}'}\n\n"
-            "此操作可能无法撤销，确定要继续吗？"
+            f"将在 {len(self.file_list_data)} 个文件的【内容】中" + settings["description"] +
+            "\n修改前的内容会保存到撤销日志，可通过“撤销替换...”整批恢复。确定要继续吗？"
         )
         if not messagebox.askyesno("请确认操作", confirm_msg):
             return
-            
-        self.start_button.config(state="disabled")
+        jobs = [(file_info['path'], self._dest_path(settings, file_info)) for file_info in self.file_list_data]
+        self._launch_replace(settings, jobs)
+
+    def _launch_replace(self, settings, jobs):
+        self._set_busy(True)
+        self.cancel_event.clear()
+        rule_set = settings["rule_set"]
+        self.progress_bar["maximum"] = len(jobs)
+        self.progress_bar["value"] = 0
+        self.processing_stats = {"success": 0, "fail": 0, "skipped": 0, "done": 0, "total": len(jobs),
+                                 "updated_ids": [], "hits": [0] * len(rule_set.rules), "rule_set": rule_set,
+                                 "encodings": Counter(), "output_mode": settings["output_mode"], "journal_dir": None}
         processing_thread = threading.Thread(
             target=self._process_files_thread,
-            args=(find_what, replace_with, output_mode, output_dir, self.use_regex_var.get(), encoding),
+            args=(jobs, rule_set, settings["encoding"]),
             daemon=True
         )
         processing_thread.start()
+        self.after(100, self._poll_results)
 
-    def _process_files_thread(self, find_what, replace_with, output_mode, output_dir, use_regex, encoding):
-        total_files = len(self.file_list_data)
-        self.progress_bar["maximum"] = total_files
-        self.progress_bar["value"] = 0
-        
-        success_count, fail_count, skipped_count = 0, 0, 0
-        files_to_process = list(self.file_list_data)
-        updated_file_ids = []
-
-        for i, file_info in enumerate(files_to_process):
-            original_path = file_info['path']
-            original_filename = file_info['filename']
-
-            self.status_label.config(text=f"正在处理: {original_filename} ({i+1}/{total_files})")
-            self.progress_bar["value"] = i + 1
-
-            try:
-                with open(original_path, 'r', encoding=encoding) as f:
-                    content = f.read()
-            except (UnicodeDecodeError, IOError) as e:
-                print(f"读取文件失败 (可能编码错误): {original_path}, 错误: {e}")
-                fail_count += 1
-                continue
-            
-            new_content = ""
-            content_changed = False
-            if use_regex:
-                new_content, num_subs = re.subn(find_what, replace_with, content, flags=re.MULTILINE)
-                if num_subs > 0:
-                    content_changed = True
-            else:
-                if find_what in content:
-                    new_content = content.replace(find_what, replace_with)
-                    content_changed = True
-
-            if not content_changed:
-                # 如果是“保存到新目录”模式，即使内容未变，也复制原文件
-                if output_mode == "specific":
-                    try:
-                        dest_path = os.path.join(output_dir, original_filename)
-                        if os.path.abspath(original_path) != os.path.abspath(dest_path):
-                            if os.path.exists(dest_path):
-                                fail_count += 1 # 目标文件已存在
-                            else:
-                                shutil.copy2(original_path, dest_path)
-                                success_count += 1
-                        else: # 源和目标相同
-                            skipped_count += 1
-                    except Exception as e:
-                        fail_count += 1
-                        print(f"复制文件失败: {original_path}, 错误: {e}")
-                else: # 原位置修改模式，无变化则跳过
-                    skipped_count += 1
-                continue
-
-            # --- 内容已改变，执行写入操作 ---
-            try:
-                if output_mode == "original":
-                    # 安全写入：先写临时文件，再替换原文件
-                    temp_path = original_path + ".tmpreplace"
-                    with open(temp_path, 'w', encoding=encoding) as f:
-                        f.write(new_content)
-                    os.replace(temp_path, original_path) # 原子操作
-                    updated_file_ids.append(file_info['id'])
-                else: # 保存到新目录
-                    dest_path = os.path.join(output_dir, original_filename)
-                    if os.path.exists(dest_path):
-                        fail_count += 1 # 目标文件已存在
-                        continue
-                    with open(dest_path, 'w', encoding=encoding) as f:
-                        f.write(new_content)
-                
-                success_count += 1
-            except Exception as e:
-                fail_count += 1
-                print(f"写入文件失败: {original_path}, 错误: {e}")
-        
-        self.after(0, self._on_processing_complete, success_count, fail_count, skipped_count, updated_file_ids)
-
+    def _process_files_thread(self, jobs, rule_set, encoding):
+        """后台线程：文件在线程池中并行处理，结果放入 result_events，不直接操作界面控件。"""
+        path_to_id = {file_info['path']: file_info['id'] for file_info in self.file_list_data}
+        journal = None
+        try:
+            journal = UndoJournal.create()
+            self.result_events.put(("journal", journal.directory))
+            for result in run_replace(jobs, rule_set, encoding, DEFAULT_WORKERS, self.cancel_event, journal):
+                result["id"] = path_to_id.get(result["path"])
+                self.result_events.put(("result", result))
+        except Exception as e:
+            self.result_events.put(("error", str(e)))
+        finally:
+            if journal is not None:
+                journal.close()
+        self.result_events.put(("finished",))
+
+    def _poll_results(self):
+        """在 Tk 主线程中批量处理已完成的结果，每次只刷新一次进度条和状态栏。"""
+        stats = self.processing_stats
+        last_path = None
+        try:
+            while True:
+                event = self.result_events.get_nowait()
+                if event[0] == "result":
+                    result = event[1]
+                    stats["done"] += 1
+                    last_path = result["path"]
+                    status = result["status"]
+                    if result["hits"]:
+                        stats["hits"] = [total + hits for total, hits in zip(stats["hits"], result["hits"])]
+                    if result["encoding"]:
+                        stats["encodings"][result["encoding"]] += 1
+                    if status in ("changed", "copied"):
+                        stats["success"] += 1
+                        if status == "changed" and stats["output_mode"] == "original":
+                            stats["updated_ids"].append(result["id"])
+                    elif status == "unchanged":
+                        stats["skipped"] += 1
+                    else:
+                        stats["fail"] += 1
+                        if status == "failed":
+                            print(f"处理文件失败 (可能编码错误): {result['path']}, 错误: {result['error']}")
+                        elif status == "modified":
+                            print(f"预览后文件已被修改，未处理: {result['path']}")
+                elif event[0] == "journal":
+                    stats["journal_dir"] = event[1]
+                elif event[0] == "error":
+                    print(f"批量替换异常终止: {event[1]}")
+                elif event[0] == "finished":
+                    self._on_processing_complete(stats["success"], stats["fail"], stats["skipped"], stats["updated_ids"],
+                                                 stats["rule_set"].rules, stats["hits"], stats["encodings"], stats["journal_dir"])
+                    return
+        except queue.Empty:
+            pass
+        if last_path:
+            self.progress_bar["value"] = stats["done"]
+            self.status_label.config(text=f"正在处理: {os.path.basename(last_path)} ({stats['done']}/{stats['total']})")
+        self.after(100, self._poll_results)
+
+    def _refresh_file_stats(self, updated_file_ids):
+        # 更新列表中被修改文件的信息（大小、修改时间）
+        self.status_label.config(text="正在更新文件信息...")
+        self.update_idletasks() # 强制UI更新
+
+        data_map = {item['id']: item for item in self.file_list_data}
+        for file_id in updated_file_ids:
+            if file_id in data_map:
+                file_info = data_map[file_id]
+                try:
+                    stat = os.stat(file_info['path'])
+                    file_info['mtime_ts'] = stat.st_mtime
+                    file_info['mtime_str'] = datetime.fromtimestamp(stat.st_mtime).strftime('%Y-%m-%d %H:%M:%S')
+                    file_info['size_kb'] = round(stat.st_size / 1024, 2)
+                except OSError as e:
+                    print(f"更新文件信息失败: {file_info['path']}, {e}")
+        self._sort_and_refresh_view() # 使用更新后的数据刷新视图
 
-    def _on_processing_complete(self, success, fail, skipped, updated_file_ids):
-        self.start_button.config(state="normal")
+    def _on_processing_complete(self, success, fail, skipped, updated_file_ids, rules=None, rule_hits=None, encodings=None,
+                                journal_dir=None):
+        self._set_busy(False)
         
         # 如果是原位置修改，则更新列表中的文件信息（大小、修改时间）
-        if self.output_option.get() == "original" and updated_file_ids:
-            self.status_label.config(text="正在更新文件信息...")
-            self.update_idletasks() # 强制UI更新
-            
-            data_map = {item['id']: item for item in self.file_list_data}
-            for file_id in updated_file_ids:
-                if file_id in data_map:
-                    file_info = data_map[file_id]
-                    try:
-                        stat = os.stat(file_info['path'])
-                        file_info['mtime_ts'] = stat.st_mtime
-                        file_info['mtime_str'] = datetime.fromtimestamp(stat.st_mtime).strftime('%Y-%m-%d %H:%M:%S')
-                        file_info['size_kb'] = round(stat.st_size / 1024, 2)
-                    except OSError as e:
-                        print(f"更新文件信息失败: {file_info['path']}, {e}")
-            self._sort_and_refresh_view() # 使用更新后的数据刷新视图
+        if updated_file_ids:
+            self._refresh_file_stats(updated_file_ids)
         
         self.status_label.config(text="处理完成！")
         summary_msg = (
             f"处理完成！\n\n"
             f"成功修改/复制: {success} 个\n"
-            f"失败/目标已存在/编码错误: {fail} 个\n"
+            f"失败/目标已存在/编码错误/预览后被修改: {fail} 个\n"
             f"跳过 (无内容匹配): {skipped} 个\n\n"
-            f"总计处理: {len(self.file_list_data)} 个文件"
+            f"总计处理: {self.processing_stats['total']} 个文件"
         )
+        if encodings:
+            summary_msg += "\n解码的文件编码: " + "，".join(f"{name} {count} 个" for name, count in encodings.most_common())
+        if rules and rule_hits:
+            summary_msg += f"\n\n替换总次数: {sum(rule_hits)}"
+            if len(rules) > 1:
+                summary_msg += "\n" + self._format_rule_hits(rules, rule_hits)
+        if journal_dir and success:
+            summary_msg += f"\n\n撤销日志: {journal_dir}"
         messagebox.showinfo("处理结果", summary_msg)
         self.progress_bar["value"] = 0
 
+    # --- 预览 (只建立匹配索引) ---
+    def _start_preview(self):
+        settings = self._collect_settings()
+        if settings is None:
+            return
+        self._set_busy(True)
+        self.cancel_event.clear()
+        paths = [file_info['path'] for file_info in self.file_list_data]
+        self.progress_bar["maximum"] = len(paths)
+        self.progress_bar["value"] = 0
+        self.preview_index = {"settings": settings, "results": {}}
+        threading.Thread(target=self._preview_thread, args=(paths, settings), daemon=True).start()
+        self.after(100, self._poll_preview)
+
+    def _preview_thread(self, paths, settings):
+        try:
+            for result in run_scan(paths, settings["rule_set"], settings["encoding"], DEFAULT_WORKERS, self.cancel_event):
+                self.result_events.put(("scan", result))
+        except Exception as e:
+            self.result_events.put(("error", str(e)))
+        self.result_events.put(("finished",))
+
+    def _poll_preview(self):
+        results = self.preview_index["results"]
+        try:
+            while True:
+                event = self.result_events.get_nowait()
+                if event[0] == "scan":
+                    results[event[1]["path"]] = event[1]
+                elif event[0] == "error":
+                    print(f"预览异常终止: {event[1]}")
+                elif event[0] == "finished":
+                    self._set_busy(False)
+                    self.progress_bar["value"] = 0
+                    self.status_label.config(text="预览完成。")
+                    self._show_preview_window()
+                    return
+        except queue.Empty:
+            pass
+        self.progress_bar["value"] = len(results)
+        self.status_label.config(text=f"正在预览: {len(results)}/{self.progress_bar['maximum']}")
+        self.after(100, self._poll_preview)
+
+    def _show_preview_window(self):
+        settings, results = self.preview_index["settings"], self.preview_index["results"]
+        rules = settings["rule_set"].rules
+        matched = [result for result in results.values() if result["status"] == "matched"]
+        failed = [result for result in results.values() if result["status"] == "failed"]
+        matched.sort(key=lambda result: result["path"])
+
+        window = tk.Toplevel(self)
+        window.title("预览匹配结果")
+        window.geometry("1000x600")
+        total_matches = sum(result["count"] for result in matched)
+        summary = f"{len(matched)} 个文件中共 {total_matches} 处匹配"
+        if failed:
+            summary += f"，{len(failed)} 个文件无法读取"
+        ttk.Label(window, text=summary, padding=10).pack(fill=tk.X)
+
+        tree_frame = ttk.Frame(window, padding="10 0")
+        tree_frame.pack(fill=tk.BOTH, expand=True)
+        columns = ("rule", "line", "column", "context")
+        tree = ttk.Treeview(tree_frame, columns=columns, show="tree headings")
+        tree.heading("#0", text="文件 / 匹配内容")
+        for col, text, width in (("rule", "规则", 200), ("line", "行", 60), ("column", "列", 60), ("context", "上下文", 400)):
+            tree.heading(col, text=text)
+            tree.column(col, width=width, anchor="w" if col in ("rule", "context") else "e")
+        tree.column("#0", width=280)
+        vsb = ttk.Scrollbar(tree_frame, orient="vertical", command=tree.yview)
+        tree.configure(yscrollcommand=vsb.set)
+        vsb.pack(side=tk.RIGHT, fill=tk.Y)
+        tree.pack(fill=tk.BOTH, expand=True)
+
+        rows = 0
+        for result in matched:
+            parent = tree.insert("", "end", text=result["path"], open=False,
+                                 values=("", "", "", f"{result['count']} 处匹配 ({result['encoding']})"))
+            for rule_index, line, column, _, text, context in result["matches"]:
+                if rows >= MAX_PREVIEW_ROWS: break
+                rule = rules[rule_index]
+                tree.insert(parent, "end", text=text.replace("\n", "\\n"),
+                            values=(f"{rule['find']} → {rule['replace']}", line, column, context.replace("\t", " ")))
+                rows += 1
+        for result in failed:
+            tree.insert("", "end", text=result["path"], values=("", "", "", f"读取失败: {result['error']}"))
+
+        button_frame = ttk.Frame(window, padding=10)
+        button_frame.pack(fill=tk.X)
+        apply_button = ttk.Button(button_frame, text="按预览结果执行替换",
+                                  command=lambda: self._apply_preview(window), state="normal" if matched else "disabled")
+        apply_button.pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="关闭", command=window.destroy).pack(side=tk.LEFT, padx=5)
+        if rows >= MAX_PREVIEW_ROWS:
+            ttk.Label(button_frame, text=f"(只列出前 {MAX_PREVIEW_ROWS} 处匹配)").pack(side=tk.LEFT, padx=10)
+
+    def _apply_preview(self, window):
+        """按预览索引执行替换：只重新读取有匹配的文件，预览后被修改过的文件不处理。"""
+        settings, results = self.preview_index["settings"], self.preview_index["results"]
+        matched_count = sum(1 for result in results.values() if result["status"] == "matched")
+        confirm_msg = (
+            f"将按预览结果修改 {matched_count} 个文件：" + settings["description"] +
+            "\n预览之后被修改过的文件将跳过。修改前的内容会保存到撤销日志。确定要继续吗？"
+        )
+        if not messagebox.askyesno("请确认操作", confirm_msg, parent=window):
+            return
+        window.destroy()
+        jobs = []
+        for file_info in self.file_list_data:
+            result = results.get(file_info['path'])
+            if result is None: continue # 预览之后新加入列表的文件
+            if result["status"] == "unchanged" and settings["output_mode"] == "original":
+                continue # 无匹配的文件无需处理
+            index_entry = result if result["status"] != "failed" else None
+            jobs.append((file_info['path'], self._dest_path(settings, file_info), index_entry))
+        self._launch_replace(settings, jobs)
+
+    # --- 撤销 ---
+    def _start_undo(self):
+        batches = list_undo_batches()
+        if not batches:
+            messagebox.showinfo("提示", f"没有可撤销的替换记录。\n(撤销日志目录: {UNDO_ROOT})")
+            return
+        choice = messagebox.askyesnocancel(
+            "撤销替换", f"撤销最近一批替换？\n{batches[0]}\n\n选择“否”可手动选择其他批次的撤销日志目录。")
+        if choice is None:
+            return
+        batch_dir = batches[0] if choice else filedialog.askdirectory(title="选择撤销日志目录", initialdir=UNDO_ROOT)
+        if not batch_dir:
+            return
+        if not os.path.isfile(os.path.join(batch_dir, "journal.jsonl")):
+            messagebox.showerror("错误", "所选目录不是撤销日志目录。")
+            return
+        self._set_busy(True)
+        self.progress_bar["value"] = 0
+        self.undo_stats = Counter()
+        threading.Thread(target=self._undo_thread, args=(batch_dir,), daemon=True).start()
+        self.after(100, self._poll_undo)
+
+    def _undo_thread(self, batch_dir):
+        try:
+            for result in undo_batch(batch_dir, DEFAULT_WORKERS):
+                self.result_events.put(("undo", result))
+        except Exception as e:
+            self.result_events.put(("error", str(e)))
+        self.result_events.put(("finished",))
+
+    def _poll_undo(self):
+        try:
+            while True:
+                event = self.result_events.get_nowait()
+                if event[0] == "undo":
+                    result = event[1]
+                    self.undo_stats[result["status"]] += 1
+                    if result["status"] in ("modified", "failed"):
+                        print(f"未能撤销: {result['path']} ({result['status']}) {result['error'] or ''}")
+                elif event[0] == "error":
+                    print(f"撤销异常终止: {event[1]}")
+                    self.undo_stats["failed"] += 1
+                elif event[0] == "finished":
+                    self._set_busy(False)
+                    self._refresh_file_stats([file_info['id'] for file_info in self.file_list_data])
+                    stats = self.undo_stats
+                    self.status_label.config(text="撤销完成。")
+                    messagebox.showinfo("撤销结果", (
+                        f"已恢复原内容: {stats['restored']} 个\n"
+                        f"已删除新建的文件: {stats['deleted']} 个\n"
+                        f"之后又被修改、未恢复: {stats['modified']} 个\n"
+                        f"失败: {stats['failed']} 个"))
+                    return
+        except queue.Empty:
+            pass
+        self.status_label.config(text=f"正在撤销... {sum(self.undo_stats.values())}")
+        self.after(100, self._poll_undo)
+
+    @staticmethod
+    def _format_rule_hits(rules, rule_hits, limit=15):
+        """按命中次数列出各规则 (对话框中最多 limit 条，完整列表输出到控制台)。"""
+        ranked = sorted(range(len(rules)), key=lambda index: rule_hits[index], reverse=True)
+        lines = [f"  {rule_hits[index]:>8} 次  {rules[index]['find']} → {rules[index]['replace']}" for index in ranked]
+        print("各规则命中次数:\n" + "\n".join(lines))
+        unmatched = sum(1 for hits in rule_hits if hits == 0)
+        text = "各规则命中次数:\n" + "\n".join(lines[:limit])
+        if len(lines) > limit:
+            text += f"\n  ... 其余 {len(lines) - limit} 条见控制台输出"
+        if unmatched:
+            text += f"\n未命中的规则: {unmatched} 条"
+        return text
+
+    def _on_closing(self):
+        self.cancel_event.set() # 后台替换不再提交新文件，进行中的文件写完后结束
+        self.destroy()
+
 if __name__ == "__main__":
     app = BatchFileContentReplacerApp()
     app.mainloop()
\ No newline at end of file